@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : api_client.py
+@Author  : Shawn
+@Date    : 2026/10/18 13:05
+@Info    : 长连接的接口客户端：进程内复用连接池，可重试错误按指数退避+随机抖动重试，接口持续异常时熔断快速失败；
+           可选对冲请求，慢请求超过p95时再发一个，先返回的为准
+"""
+
+import logging
+import random
+import threading
+import time
+
+from openai import OpenAI, Timeout, APIConnectionError, APIStatusError, APITimeoutError
+
+from modules.cm_sop_translate.batching import estimate_tokens
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.hedging import RequestHedger
+from modules.cm_sop_translate.rate_limiter import AdaptiveRateLimiter
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+# 可重试的HTTP状态码：超时、冲突、限流、服务端错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# 限流或服务过载，需要降低并发
+THROTTLE_STATUS = {429, 503, 529}
+
+
+class CircuitOpenError(Exception):
+    """熔断中，接口暂不可用"""
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def is_throttled(error: Exception) -> bool:
+    return isinstance(error, APIStatusError) and error.status_code in THROTTLE_STATUS
+
+
+def request_tokens(kwargs: dict) -> int:
+    """估算一次请求占用的token额度：输入token的两倍（输出按与输入相当估算）"""
+    return 2 * sum(estimate_tokens(message.get('content') or '') for message in kwargs.get('messages', []))
+
+
+def retry_after_seconds(error: Exception):
+    """读取限流应答中的Retry-After（秒），没有则返回None"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败failure_threshold次后打开，reset_timeout秒内直接拒绝请求；
+    之后进入半开状态，只放行一个试探请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.error(f"接口连续失败{self.failures}次，熔断{self.reset_timeout}秒")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class ApiClient:
+    def __init__(self, api_key, base_url, timeout: float = 60, connect_timeout: float = 10,
+                 max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 20.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30, rate_limit: dict = None,
+                 hedging: dict = None):
+        # 重试由本类负责，关闭SDK自带的重试
+        self.client = OpenAI(api_key=api_key, base_url=base_url,
+                             timeout=Timeout(timeout, connect=connect_timeout), max_retries=0)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # 自适应限流，为None时不限流
+        self.limiter = AdaptiveRateLimiter(**rate_limit) if rate_limit else None
+        # 对冲请求，为None时不对冲
+        self.hedger = RequestHedger(**hedging) if hedging else None
+        self.retries = 0  # 累计重试次数
+        self.local = threading.local()  # 当前线程最近一次请求的重试次数，供埋点读取
+
+    def backoff(self, attempt: int) -> float:
+        """指数退避+全抖动：在[0, min(上限, 基数*2^(attempt-1))]中随机取等待时间"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def chat(self, **kwargs):
+        """发送chat.completions请求，可重试的错误自动重试；stream=True时返回stream()的逐块迭代器"""
+        if kwargs.get('stream'):
+            return self.stream(**kwargs)
+        attempt = 0
+        tokens = request_tokens(kwargs)
+        while True:
+            attempt += 1
+            started = self.begin(tokens)
+            start = time.perf_counter()
+            # 开启对冲时主请求的限流槽位在主请求真正结束时由对冲归还（对冲请求先返回时主请求仍在进行）
+            release = self.hedger is None
+            try:
+                response = self.send(kwargs, tokens, started)
+            except Exception as e:
+                time.sleep(self.failed(e, attempt, started, time.perf_counter() - start, release=release))
+            else:
+                self.succeeded(attempt, started, time.perf_counter() - start, release=release)
+                return response
+
+    def stream(self, **kwargs):
+        """
+        流式请求，逐块返回应答。读完或出错时才归还限流槽位、记录熔断结果（耗时为整个输出的耗时，不只是首字）；
+        还没有收到任何内容时出错按chat的规则重试，已经收到内容后出错直接抛出（已输出的内容无法撤回）
+        """
+        attempt = 0
+        tokens = request_tokens(kwargs)
+        while True:
+            attempt += 1
+            started = self.begin(tokens)
+            start = time.perf_counter()
+            received = False
+            try:
+                for chunk in self.client.chat.completions.create(**kwargs):
+                    received = True
+                    yield chunk
+            except GeneratorExit:
+                # 调用方不再读取：归还槽位，不计入熔断
+                if self.limiter:
+                    self.limiter.release(started, time.perf_counter() - start)
+                raise
+            except Exception as e:
+                time.sleep(self.failed(e, attempt, started, time.perf_counter() - start, retry=not received))
+            else:
+                self.succeeded(attempt, started, time.perf_counter() - start)
+                return
+
+    def begin(self, tokens: int):
+        """发送一次请求前：熔断中直接拒绝，否则等待限流槽位，返回槽位的开始时间"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("接口熔断中，暂停请求")
+        return self.limiter.acquire(tokens) if self.limiter else 0
+
+    def succeeded(self, attempt: int, started, latency: float, release: bool = True):
+        """一次请求成功：归还限流槽位（release为False时由调用方归还）、关闭熔断"""
+        if self.limiter and release:
+            self.limiter.release(started, latency)
+        self.breaker.record_success()
+        self.local.retries = attempt - 1
+        logger.info(f"第{attempt}次请求成功，耗时{latency:.2f}s")
+
+    def failed(self, error: Exception, attempt: int, started, latency: float, retry: bool = True,
+               release: bool = True) -> float:
+        """
+        一次请求失败：归还限流槽位（release为False时由调用方归还）、记录熔断；
+        可以重试时返回重试前的等待时间，否则抛出error
+        """
+        if self.limiter and release:
+            self.limiter.release(started, throttled=is_throttled(error), retry_after=retry_after_seconds(error))
+        if not is_retryable(error):
+            # 接口有正常应答（如400参数错误），不计入熔断
+            self.breaker.record_success()
+            logger.error(f"第{attempt}次请求失败，耗时{latency:.2f}s，不可重试：{error}")
+            raise error
+        self.breaker.record_failure()
+        if not retry or attempt > self.max_retries:
+            reason = "已达重试上限" if retry else "流式输出中断"
+            logger.error(f"第{attempt}次请求失败，耗时{latency:.2f}s，{reason}：{error}")
+            raise error
+        delay = self.backoff(attempt)
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = min(self.backoff_max, max(delay, retry_after))
+        logger.warning(f"第{attempt}次请求失败，耗时{latency:.2f}s，{delay:.2f}s后重试：{error}")
+        self.retries += 1
+        return delay
+
+    def send(self, kwargs: dict, tokens: int, started=0):
+        """
+        发送一次非流式请求（不重试），开启对冲时超过p95未返回则再发一个；
+        started为begin返回的槽位开始时间，开启对冲时主请求结束时归还该槽位
+        """
+        if self.hedger is None:
+            return self.client.chat.completions.create(**kwargs)
+        return self.hedger.run(lambda: self.client.chat.completions.create(**kwargs),
+                               lambda: self.hedge_slot(tokens), self.release_slot(started))
+
+    def release_slot(self, started):
+        """返回请求结束时归还限流槽位的回调finish(latency, error)，latency为None表示失败"""
+        def finish(latency, error):
+            if self.limiter is None:
+                return
+            if error is None:
+                self.limiter.release(started, latency)
+            else:
+                self.limiter.release(started, throttled=is_throttled(error), retry_after=retry_after_seconds(error))
+        return finish
+
+    def hedge_slot(self, tokens: int):
+        """对冲请求不排队等限流：限流器没有空位时返回None不发，否则返回对冲请求结束时的回调"""
+        if self.limiter is None:
+            return self.release_slot(0)
+        started = self.limiter.try_acquire(tokens)
+        if started is None:
+            return None
+        return self.release_slot(started)
+
+    def last_retries(self) -> int:
+        """当前线程最近一次成功请求之前重试了几次"""
+        return getattr(self.local, 'retries', 0)
+
+
+# 进程内共享的客户端：(base_url, api_key) -> ApiClient
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_api_client(api_key, base_url, **options) -> ApiClient:
+    """获取客户端，同一进程内相同地址和KEY只建一个，复用TCP/TLS连接"""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get((base_url, api_key))
+        if client is None:
+            client = ApiClient(api_key, base_url, **options)
+            _CLIENTS[(base_url, api_key)] = client
+    return client
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : batching.py
+@Author  : Shawn
+@Date    : 2026/10/18 11:20
+@Info    : 批量翻译的辅助函数：token估算、按预算打包、解析模型返回的JSON结果
+"""
+
+import json
+import re
+
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+CODE_FENCE_PATTERN = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩字符按1个token，其余字符按4个字符1个token（偏保守）"""
+    cjk = len(CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def pack_batches(texts: list, max_items: int = 40, max_tokens: int = 1500) -> list:
+    """
+    按条数上限和token预算把文本打包成多个批次，保持原有顺序
+    单条超出预算的文本单独成批
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_batch_payload(batch: list) -> dict:
+    """为每条文本分配稳定的编号：{"1": text1, "2": text2, ...}"""
+    return {str(index + 1): text for index, text in enumerate(batch)}
+
+
+def parse_batch_reply(content: str, payload: dict) -> dict:
+    """
+    解析模型返回的JSON对象，返回 编号 -> 译文
+    缺失、非字符串或为空的条目不返回，由调用方拆分重试
+    """
+    if not content:
+        return {}
+    content = CODE_FENCE_PATTERN.sub('', content.strip())
+    try:
+        reply = json.loads(content)
+    except ValueError:
+        return {}
+    if not isinstance(reply, dict):
+        return {}
+
+    result = {}
+    for key in payload:
+        value = reply.get(key)
+        if isinstance(value, str) and value.strip():
+            result[key] = value.strip()
+    return result
+
+
+def parse_multi_batch_reply(content: str, payload: dict, languages: list) -> dict:
+    """
+    解析一次翻译多种语言的返回：{"1": {"英语": "...", "越南语": "..."}, ...}
+    返回 语言 -> {编号: 译文}，缺失或格式错误的条目不返回
+    """
+    result = {lang: {} for lang in languages}
+    if not content:
+        return result
+    content = CODE_FENCE_PATTERN.sub('', content.strip())
+    try:
+        reply = json.loads(content)
+    except ValueError:
+        return result
+    if not isinstance(reply, dict):
+        return result
+
+    for key in payload:
+        item = reply.get(key)
+        if not isinstance(item, dict):
+            continue
+        for lang in languages:
+            value = item.get(lang)
+            if isinstance(value, str) and value.strip():
+                result[lang][key] = value.strip()
+    return result
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : __init__.py
+@Author  : Shawn
+@Date    : 2026/10/18 16:20
+@Info    : 离线压测：本地模拟的OpenAI兼容接口及文档翻译压测脚本
+"""
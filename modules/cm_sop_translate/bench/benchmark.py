@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : benchmark.py
+@Author  : Shawn
+@Date    : 2026/10/18 16:50
+@Info    : 文档翻译压测：对本地模拟接口端到端运行docx_translate/excel_translate，统计每分钟文件数和请求延迟p50/p95/p99。
+           用法：python -m modules.cm_sop_translate.bench.benchmark --input D:\\sop_samples --type docx --concurrency 16
+           不指定--base-url时自动在本进程内启动模拟接口；输入文件会先复制到临时目录，不影响原文件夹
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.request
+
+from modules.cm_sop_translate.bench.mock_server import start_server, add_settings_arguments, settings_from_args
+from modules.cm_sop_translate.config.config import config
+
+EXTENSIONS = {
+    'docx': ('.doc', '.docx'),
+    'excel': ('.xls', '.xlsx'),
+}
+
+
+def fetch_stats(base_url) -> dict:
+    with urllib.request.urlopen(f"{base_url.rstrip('/')}/stats") as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def run_benchmark(input_folder, kind='docx', languages=None, base_url=None, settings=None,
+                  concurrency=None, keep_cache=False) -> dict:
+    """
+    端到端压测一次，返回统计结果
+    keep_cache为False时使用临时的空缓存，保证每段文本都真正请求接口
+    """
+    languages = languages or ['英语', '越南语']
+    workdir = tempfile.mkdtemp(prefix='translate_bench_')
+    work_input = os.path.join(workdir, 'input')
+    os.makedirs(work_input)
+    files = 0
+    for filename in os.listdir(input_folder):
+        path = os.path.join(input_folder, filename)
+        if os.path.isfile(path) and filename.endswith(EXTENSIONS[kind]) and not filename.startswith('~$'):
+            shutil.copy(path, work_input)
+            files += 1
+
+    server = None
+    if base_url is None:
+        server, base_url = start_server(settings=settings)
+    config.API_BASE_URL = base_url
+    if concurrency:
+        config.TRANSLATE_CONCURRENCY = concurrency
+    if not keep_cache:
+        config.TRANSLATION_CACHE = dict(config.TRANSLATION_CACHE, path=os.path.join(workdir, 'translation_cache.db'))
+
+    # 配置修改之后再导入，Translator初始化时读取的是修改后的配置
+    from modules.cm_sop_translate.main import docx_translate, excel_translate
+
+    start = time.perf_counter()
+    try:
+        if kind == 'docx':
+            docx_translate(languages, work_input)
+        else:
+            excel_translate(languages, work_input)
+        elapsed = time.perf_counter() - start
+        stats = server.RequestHandlerClass.stats.summary() if server else fetch_stats(base_url)
+    finally:
+        if server:
+            server.shutdown()
+
+    report = {
+        "type": kind,
+        "files": files,
+        "seconds": elapsed,
+        "files_per_min": files / elapsed * 60 if elapsed else 0.0,
+        "concurrency": config.TRANSLATE_CONCURRENCY,
+        "workdir": workdir,
+    }
+    report.update(stats)
+    return report
+
+
+def print_report(report: dict):
+    print("=" * 60)
+    print(f"类型: {report['type']}    文件数: {report['files']}    并发: {report['concurrency']}")
+    print(f"总耗时: {report['seconds']:.2f}s    文件/分钟: {report['files_per_min']:.2f}")
+    print(f"请求数: {report['requests']}    错误: {report['errors']}")
+    print(f"输入token: {report['prompt_tokens']}（前缀缓存命中{report['cached_tokens']}）    "
+          f"输出token: {report['completion_tokens']}")
+    print(f"请求延迟 p50: {report['p50']:.3f}s    p95: {report['p95']:.3f}s    p99: {report['p99']:.3f}s")
+    print(f"输出目录: {report['workdir']}")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='文档翻译端到端压测（本地模拟接口）')
+    parser.add_argument('--input', required=True, help='待翻译文件所在目录')
+    parser.add_argument('--type', choices=['docx', 'excel'], default='docx')
+    parser.add_argument('--languages', default='英语,越南语', help='目标语言，逗号分隔')
+    parser.add_argument('--base-url', default=None, help='已启动的模拟接口地址，不指定则在本进程内启动')
+    parser.add_argument('--concurrency', type=int, default=None)
+    parser.add_argument('--keep-cache', action='store_true', help='使用正式的翻译缓存（默认使用临时空缓存）')
+    parser.add_argument('--json', default=None, help='把结果写入该JSON文件')
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    result = run_benchmark(args.input, args.type, args.languages.split(','), args.base_url,
+                           settings_from_args(args), args.concurrency, args.keep_cache)
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
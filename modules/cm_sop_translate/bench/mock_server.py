@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : mock_server.py
+@Author  : Shawn
+@Date    : 2026/10/18 16:20
+@Info    : 本地模拟的OpenAI兼容chat.completions接口，用于无外网环境下压测翻译流程。
+           支持可配置的延迟分布、500/429错误注入、token统计（含模拟的前缀缓存命中）、确定性的伪翻译（含批量JSON、多语言JSON、流式输出）。
+           用法：python -m modules.cm_sop_translate.bench.mock_server --port 8765 --latency lognormal --median 0.8
+           然后设置环境变量 DS_BASE_URL=http://127.0.0.1:8765 运行翻译
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.cm_sop_translate.batching import estimate_tokens
+from modules.cm_sop_translate.masking import PLACEHOLDER_PATTERN
+from modules.cm_sop_translate.metrics import percentile
+
+LANGUAGE_PATTERN = re.compile(r'翻译成(.+?)[，,。]')
+MULTI_LANGUAGE_PATTERN = re.compile(r'分别翻译成(.+?)[，,。]')
+TEXT_MARKER = '待翻译内容如下：'
+# 接口前缀缓存的粒度（token），与DeepSeek一致：不足一个单位的部分不缓存
+PREFIX_CACHE_UNIT = 64
+# 伪翻译用的词表
+PSEUDO_WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet',
+                'kilo', 'lima', 'mike', 'november', 'oscar', 'papa', 'quebec', 'romeo', 'sierra', 'tango']
+
+
+def pseudo_translate(text: str, language: str) -> str:
+    """确定性的伪翻译：同样的原文和语言总是得到同样的结果，长度与原文成比例，原文中的占位符原样保留"""
+    seed = int(hashlib.sha1(f"{language}\x1f{text}".encode('utf-8')).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    count = max(1, estimate_tokens(text) // 2)
+    words = [rng.choice(PSEUDO_WORDS) for _ in range(count)] + [match.group(0) for match in PLACEHOLDER_PATTERN.finditer(text)]
+    return f"[{language}] " + ' '.join(words)
+
+
+class MockSettings:
+    def __init__(self, latency='lognormal', median=0.8, sigma=0.5, low=0.2, high=1.5,
+                 per_token=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency  # fixed / uniform / lognormal
+        self.median = median  # fixed、lognormal的中位数（秒）
+        self.sigma = sigma  # lognormal的形状参数
+        self.low = low  # uniform的下限（秒）
+        self.high = high  # uniform的上限（秒）
+        self.per_token = per_token  # 每个输出token额外增加的延迟（秒）
+        self.error_rate = error_rate  # 返回500的比例
+        self.rate_limit_rate = rate_limit_rate  # 返回429的比例
+        self.retry_after = retry_after  # 429时Retry-After头（秒）
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample_latency(self, completion_tokens: int) -> float:
+        with self.lock:
+            if self.latency == 'fixed':
+                base = self.median
+            elif self.latency == 'uniform':
+                base = self.rng.uniform(self.low, self.high)
+            else:
+                base = self.rng.lognormvariate(math.log(self.median), self.sigma)
+        return base + self.per_token * completion_tokens
+
+    def sample_error(self):
+        """返回要注入的HTTP状态码，不注入返回None"""
+        with self.lock:
+            r = self.rng.random()
+        if r < self.rate_limit_rate:
+            return 429
+        if r < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+
+class MockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.latencies = []
+        self.prefixes = set()  # 出现过的system消息，模拟接口侧的前缀缓存
+
+    def prefix_hit(self, system: str) -> int:
+        """模拟前缀缓存：同样的system消息第二次出现时，按缓存粒度返回命中的token数"""
+        key = hashlib.sha1(system.encode('utf-8')).hexdigest()
+        with self.lock:
+            seen = key in self.prefixes
+            self.prefixes.add(key)
+        if not seen:
+            return 0
+        return estimate_tokens(system) // PREFIX_CACHE_UNIT * PREFIX_CACHE_UNIT
+
+    def record(self, latency, prompt_tokens=0, completion_tokens=0, status=200, cached_tokens=0):
+        with self.lock:
+            self.requests += 1
+            if status != 200:
+                self.errors[status] = self.errors.get(status, 0) + 1
+                return
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cached_tokens += cached_tokens
+            self.latencies.append(latency)
+
+    def summary(self) -> dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "errors": dict(self.errors),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "p50": percentile(self.latencies, 50),
+                "p95": percentile(self.latencies, 95),
+                "p99": percentile(self.latencies, 99),
+            }
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = {}
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.cached_tokens = 0
+            self.latencies = []
+            self.prefixes = set()
+
+
+def build_reply(body: dict) -> str:
+    """按请求的形式生成伪翻译：批量JSON、多语言批量JSON或单条文本"""
+    messages = body.get('messages', [])
+    system = ''.join(m.get('content', '') for m in messages if m.get('role') == 'system')
+    user = [m.get('content', '') for m in messages if m.get('role') == 'user']
+
+    if body.get('response_format', {}).get('type') == 'json_object':
+        payload = json.loads(user[-1]) if user else {}
+        multi = MULTI_LANGUAGE_PATTERN.search(system)
+        if multi:
+            languages = multi.group(1).split('、')
+            reply = {key: {lang: pseudo_translate(text, lang) for lang in languages} for key, text in payload.items()}
+        else:
+            match = LANGUAGE_PATTERN.search(system)
+            language = match.group(1) if match else ''
+            reply = {key: pseudo_translate(text, language) for key, text in payload.items()}
+        return json.dumps(reply, ensure_ascii=False)
+
+    match = LANGUAGE_PATTERN.search(system)
+    language = match.group(1) if match else ''
+    if user:
+        text = user[-1]
+    else:
+        text = system.split(TEXT_MARKER, 1)[-1]
+    return pseudo_translate(text, language)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持keep-alive
+    settings = MockSettings()
+    stats = MockStats()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/stats'):
+            self._send_json(200, self.stats.summary())
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length)
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        start = time.perf_counter()
+        status = self.settings.sample_error()
+        if status == 429:
+            self.stats.record(0, status=429)
+            self._send_json(429, {"error": {"message": "rate limit exceeded", "type": "rate_limit_error"}},
+                            {"Retry-After": str(self.settings.retry_after)})
+            return
+        if status == 500:
+            time.sleep(self.settings.sample_latency(0))
+            self.stats.record(0, status=500)
+            self._send_json(500, {"error": {"message": "injected server error", "type": "server_error"}})
+            return
+
+        body = json.loads(raw or b'{}')
+        content = build_reply(body)
+        prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in body.get('messages', []))
+        completion_tokens = estimate_tokens(content)
+        system = ''.join(m.get('content', '') for m in body.get('messages', []) if m.get('role') == 'system')
+        cached_tokens = min(self.stats.prefix_hit(system), prompt_tokens)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            # DeepSeek和OpenAI两种写法都返回
+            "prompt_cache_hit_tokens": cached_tokens,
+            "prompt_cache_miss_tokens": prompt_tokens - cached_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        latency = self.settings.sample_latency(completion_tokens)
+        model = body.get('model', 'mock')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if body.get('stream'):
+            self._stream(completion_id, model, content, usage, latency)
+        else:
+            time.sleep(latency)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        self.stats.record(time.perf_counter() - start, prompt_tokens, completion_tokens, cached_tokens=cached_tokens)
+
+    def _stream(self, completion_id, model, content, usage, latency):
+        """SSE流式输出：首块前等待一半延迟，其余延迟均摊到各块之间"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        words = content.split(' ')
+        pieces = [word if index == 0 else ' ' + word for index, word in enumerate(words)]
+        time.sleep(latency / 2)
+        for piece in pieces:
+            self._send_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                              "model": model,
+                              "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+            time.sleep(latency / 2 / len(pieces))
+        self._send_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                          "model": model, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_event(self, data):
+        self.wfile.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+def start_server(host='127.0.0.1', port=0, settings: MockSettings = None):
+    """在后台线程启动模拟服务，返回 (server, base_url)；port为0时自动分配端口"""
+    handler = type('BoundMockHandler', (MockHandler,), {
+        "settings": settings or MockSettings(),
+        "stats": MockStats(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_settings_arguments(parser):
+    parser.add_argument('--latency', choices=['fixed', 'uniform', 'lognormal'], default='lognormal')
+    parser.add_argument('--median', type=float, default=0.8, help='fixed/lognormal延迟中位数（秒）')
+    parser.add_argument('--sigma', type=float, default=0.5, help='lognormal形状参数')
+    parser.add_argument('--low', type=float, default=0.2, help='uniform延迟下限（秒）')
+    parser.add_argument('--high', type=float, default=1.5, help='uniform延迟上限（秒）')
+    parser.add_argument('--per-token', type=float, default=0.0, help='每个输出token额外延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的比例')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429的比例')
+    parser.add_argument('--retry-after', type=int, default=1, help='429应答的Retry-After（秒）')
+    parser.add_argument('--seed', type=int, default=None)
+
+
+def settings_from_args(args) -> MockSettings:
+    return MockSettings(latency=args.latency, median=args.median, sigma=args.sigma, low=args.low, high=args.high,
+                        per_token=args.per_token, error_rate=args.error_rate,
+                        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模拟的OpenAI兼容翻译接口')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_settings_arguments(parser)
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.host, args.port, settings_from_args(args))
+    print(f"模拟接口已启动：{base_url}（统计信息：{base_url}/stats），Ctrl+C退出")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -22,6 +22,103 @@ class Config(object):  # 默认配置
 
     # DeepSeek KEY
     DS_KEY = conf.DS_KEY
+    # 接口地址，压测时可通过环境变量DS_BASE_URL指向本地模拟服务（bench/mock_server.py）
+    API_BASE_URL = os.environ.get('DS_BASE_URL', 'https://api.deepseek.com')
+    # DeepSeek接口：超时（秒）、重试退避、熔断
+    API_CLIENT = {
+        'timeout': 60,
+        'connect_timeout': 10,
+        'max_retries': 3,
+        'backoff_base': 1.0,  # 第n次重试最多等待 backoff_base * 2^(n-1) 秒
+        'backoff_max': 20.0,
+        'failure_threshold': 5,  # 连续失败多少次后熔断
+        'reset_timeout': 30,  # 熔断多少秒后试探恢复
+    }
+
+    # 自适应限流：令牌桶限制每分钟请求数、token数，并发数遇到429/过载时减半、延迟正常时逐步增加（不超过TRANSLATE_CONCURRENCY）
+    RATE_LIMIT = {
+        'enabled': True,
+        'rpm': 600,
+        'tpm': 1000000,
+        'initial_concurrency': 8,
+        'min_concurrency': 1,
+        'target_latency': 30,  # 单次请求超过该耗时（秒）视为接口变慢，并发数小幅减小
+    }
+
+    # 对冲请求：请求超过最近耗时的p95仍未返回时再发一个相同的请求，先返回的为准；对冲请求数不超过请求数的max_ratio
+    HEDGING = {
+        'enabled': False,
+        'quantile': 95,
+        'max_ratio': 0.1,  # 额外负载上限
+        'min_samples': 20,  # 攒够多少次请求耗时后开始对冲
+        'min_delay': 2.0,  # 至少等待多少秒才对冲
+    }
+
+    # 跨进程请求合并：多个翻译进程共用翻译缓存时，其他进程正在请求的文本等它的结果，不重复请求
+    SHARED_FLIGHT = {
+        'enabled': True,
+        'lease': 300,  # 登记有效期（秒），大于一次请求含重试的最长耗时；进程被强制结束时其他进程最多等这么久
+        'poll_interval': 0.2,  # 等待时查询间隔（秒），逐步加倍到max_poll_interval
+        'max_poll_interval': 2.0,
+    }
+
+    # 批量翻译：每次请求的文本条数上限与输入token预算；
+    # 文本少时为了用上空闲的并发槽位可以拆成更小的批次，但每批不少于min_items条
+    TRANSLATE_BATCH = {
+        'max_items': 40,
+        'max_tokens': 1500,
+        'min_items': 20,
+    }
+    # 长段落分句：超过max_tokens（估算）的段落按句末标点拆成多块并发翻译
+    SEGMENT = {
+        'max_tokens': 150,
+    }
+    # 文档翻译时同时进行的请求数
+    TRANSLATE_CONCURRENCY = 16
+    # 多种目标语言在一次请求中同时翻译，解析失败时自动改为按语言分别翻译
+    MULTI_TARGET = True
+    # 文件夹翻译分两阶段：先收集所有文件的文本去重后统一翻译，再逐个文件写入
+    FOLDER_PLAN = True
+    # 翻译预估（不发送请求）：译文token数与原文的比例、每次请求的固定耗时（秒）、输出速度（token/s）
+    DRY_RUN = {
+        'output_ratio': 1.3,
+        'base_latency': 1.5,
+        'output_tokens_per_sec': 40,
+    }
+    # 限时翻译：按 封面标题 > 正文 > 页眉页脚、长段落优先 的顺序发请求；剩余时间减去reserve（留给生成文档）
+    # 不够一次请求的预计耗时（最近请求耗时的p95，还没有请求时按request_seconds）时不再请求，
+    # 未翻译的文本只查词库、缓存，仍未命中的保留原文并加marker标注
+    DEADLINE = {
+        'reserve': 30,
+        'request_seconds': 10,
+        'marker': '[未翻译]',
+    }
+    # 翻译前按规则过滤文件编号、版本号、日期、数字及单位、已是目标语言的文本，原样返回不请求接口
+    PREFILTER = True
+    # 请求模型前把网址、日期、编号、数字及单位换成{1}、{2}等占位符，译文返回后换回；
+    # 缓存中存遮盖后的文本，只有数字不同的文本共用一条译文
+    MASKING = True
+    # 词库挖掘（glossary_mining）：不超过max_chars个字、在缓存和最近runs次运行日志中出现至少min_count次、
+    # 各模型/提示词版本译文一致的文本，作为词库的候选
+    GLOSSARY_MINING = {
+        'max_chars': 20,
+        'min_count': 3,
+        'runs': 10,
+    }
+    # 翻译记忆交换（TMX）：原文的语言代码，目标语言 -> 语言代码
+    TMX = {
+        'source': 'zh-CN',
+        'languages': {
+            '英语': 'en',
+            '越南语': 'vi',
+        },
+    }
+    # 费用估算用的单价（元/百万token）
+    TOKEN_PRICE = {
+        'prompt': 2.0,
+        'prompt_cached': 0.5,  # 命中接口前缀缓存的输入token
+        'completion': 8.0,
+    }
 
     # 预设的账号密码（在实际应用中应该使用更安全的方式存储）
     VALID_ACCOUNTS = {
@@ -47,6 +144,40 @@ class DevConfig(Config):  # 开发环境
     TEMPLATE = os.path.join(ROOT_PATH, 'config/dev_template.json')
     # 缓存文件
     TEMP_PATH = os.path.join(ROOT_PATH, 'temp')
+    # 翻译记忆缓存（不能放在TEMP_PATH下，excel翻译结束时会清空TEMP_PATH）
+    TRANSLATION_CACHE = {
+        'path': os.path.join(ROOT_PATH, 'cache', 'translation_cache.db'),
+        'max_entries': 200000,  # 超过后按最近使用时间淘汰
+        'flush_size': 50,  # 攒够多少条再批量写入
+    }
+    # 随安装包分发的翻译记忆（tm_bundle.py生成），启动时内存映射，本地缓存未命中时查询；文件不存在时不使用
+    TM_BUNDLE = {
+        'path': os.path.join(ROOT_PATH, 'config', 'tm_bundle.bin'),
+    }
+    # 模糊翻译记忆（fuzzy_tm.py）：用向量模型（bge-large的ONNX导出）找相似的历史原文，
+    # 只有数字不同的直接换数字复用译文，其余作为参考译文随请求发送；需要该向量模型，默认关闭
+    FUZZY_TM = {
+        'enabled': False,
+        'path': os.path.join(ROOT_PATH, 'cache', 'fuzzy_index'),
+        'model': os.path.join(ROOT_PATH, 'models', 'bge-large-zh-v1.5'),  # 第一次用到时加载
+        'threshold': 0.9,  # 余弦相似度不低于该值才算相似
+        'min_chars': 6,  # 更短的文本不参与
+        'reuse_digits': True,  # 只有数字不同时直接复用
+    }
+    # 本地离线翻译模型（ONNX导出的seq2seq模型，需另外安装onnxruntime、transformers并下载模型）
+    LOCAL_MT = {
+        'mode': 'off',  # off：不使用；fallback：接口熔断或连不上时改用；local：全部使用本地模型
+        'models': {
+            '英语': os.path.join(ROOT_PATH, 'models', 'opus-mt-zh-en'),
+            '越南语': os.path.join(ROOT_PATH, 'models', 'opus-mt-zh-vi'),
+        },
+        'intra_op_threads': 4,  # 单个算子的并行线程数，取CPU物理核心数
+        'inter_op_threads': 1,  # 顺序执行，不并行多个算子
+        'max_batch_size': 32,
+        'max_batch_tokens': 4096,  # 每批 条数×最长token数 的上限
+        'max_wait': 0.02,  # 攒批等待时间（秒）
+        'max_length': 256,
+    }
     # database
     DATABASE = {
         'host': '106.54.47.212',
@@ -76,6 +207,40 @@ class ProdConfig(Config):  # 生产环境
     TEMPLATE = './_internal/config/template.json'
     # 缓存文件
     TEMP_PATH = './temp'
+    # 翻译记忆缓存（不能放在TEMP_PATH下，excel翻译结束时会清空TEMP_PATH）
+    TRANSLATION_CACHE = {
+        'path': './cache/translation_cache.db',
+        'max_entries': 200000,  # 超过后按最近使用时间淘汰
+        'flush_size': 50,  # 攒够多少条再批量写入
+    }
+    # 随安装包分发的翻译记忆（tm_bundle.py生成），放在_internal/config下，启动时内存映射，本地缓存未命中时查询
+    TM_BUNDLE = {
+        'path': './_internal/config/tm_bundle.bin',
+    }
+    # 模糊翻译记忆（fuzzy_tm.py）：用向量模型（bge-large的ONNX导出）找相似的历史原文，
+    # 只有数字不同的直接换数字复用译文，其余作为参考译文随请求发送；需要该向量模型，默认关闭
+    FUZZY_TM = {
+        'enabled': False,
+        'path': './cache/fuzzy_index',
+        'model': './_internal/models/bge-large-zh-v1.5',  # 第一次用到时加载
+        'threshold': 0.9,  # 余弦相似度不低于该值才算相似
+        'min_chars': 6,  # 更短的文本不参与
+        'reuse_digits': True,  # 只有数字不同时直接复用
+    }
+    # 本地离线翻译模型（ONNX导出的seq2seq模型，需另外安装onnxruntime、transformers并下载模型）
+    LOCAL_MT = {
+        'mode': 'off',  # off：不使用；fallback：接口熔断或连不上时改用；local：全部使用本地模型
+        'models': {
+            '英语': './_internal/models/opus-mt-zh-en',
+            '越南语': './_internal/models/opus-mt-zh-vi',
+        },
+        'intra_op_threads': 4,  # 单个算子的并行线程数，取CPU物理核心数
+        'inter_op_threads': 1,  # 顺序执行，不并行多个算子
+        'max_batch_size': 32,
+        'max_batch_tokens': 4096,  # 每批 条数×最长token数 的上限
+        'max_wait': 0.02,  # 攒批等待时间（秒）
+        'max_length': 256,
+    }
     # database
     DATABASE = {
         'host': '106.54.47.212',
@@ -726,10 +726,81 @@ def apply_table_format(table, table_data):
                 start_cell.merge(end_cell)
 
 
+def collect_texts(original_data):
+    """递归收集段落及表格单元格中需要翻译的文本，保持文档顺序"""
+    texts = []
+    for item in original_data:
+        if item['type'] == 'paragraph':
+            if item['text'].strip():
+                texts.append(item['text'])
+        elif item['type'] == 'table':
+            for cell in item['cells']:
+                if (cell['grid_span'] > 1 and cell['is_merge_start']) or cell['grid_span'] == 1:
+                    texts.extend(collect_texts(cell['content']))
+    return texts
+
+
+def split_preamble_text(text):
+    """封面头信息如'文件编号：C2GM-Z13-000'，按第一个冒号拆分后分别翻译；没有冒号返回空列表"""
+    text = text.replace(":", "：")
+    if "：" in text:
+        return text.split("：", 1)  # 1代表只分割第一个冒号
+    return []
+
+
+# 限时翻译的优先级，越小越先翻译：封面（含大标题）> 正文 > 页眉页脚
+PRIORITY_COVER = 0
+PRIORITY_BODY = 1
+PRIORITY_HEADER_FOOTER = 2
+
+
+def collect_document_parts(cover_data, body_data, header_data, footer_data):
+    """按封面、正文、页眉页脚收集需要翻译的文本，返回 [(优先级, 文本列表), ...]"""
+    cover_texts = []
+    for item in cover_data:
+        if item['type'] == 'paragraph' and item['flag'] == 'preamble':
+            cover_texts.extend(split_preamble_text(item['text']))
+        else:
+            cover_texts.extend(collect_texts([item]))
+    header_footer_texts = []
+    for item in header_data:
+        for key in ('first_page_header_content', 'odd_page_header', 'even_page_header'):
+            header_footer_texts.extend(collect_texts(item[key]))
+    for item in footer_data:
+        for key in ('first_page_footer_content', 'odd_page_footer', 'even_page_footer'):
+            header_footer_texts.extend(collect_texts(item[key]))
+    return [
+        (PRIORITY_COVER, cover_texts),
+        (PRIORITY_BODY, collect_texts(body_data)),
+        (PRIORITY_HEADER_FOOTER, header_footer_texts),
+    ]
+
+
+def collect_document_texts(cover_data, body_data, header_data, footer_data):
+    """收集整篇文档（封面、正文、页眉、页脚）需要翻译的文本，封面头信息按冒号拆分后收集"""
+    parts = collect_document_parts(cover_data, body_data, header_data, footer_data)
+    return [text for _, texts in parts for text in texts]
+
+
+def collect_document_priorities(cover_data, body_data, header_data, footer_data):
+    """整篇文档的文本 -> 优先级，同一文本出现在多处时取最高的优先级"""
+    priorities = {}
+    for priority, texts in collect_document_parts(cover_data, body_data, header_data, footer_data):
+        for text in texts:
+            priorities.setdefault(text, priority)
+    return priorities
+
+
 def add_paragraph_translation(original_data, translator, language):
     """添加翻译段落"""
     new_data = []
 
+    # 同一层级的段落一次批量翻译
+    texts = [item['text'] for item in original_data if item['type'] == 'paragraph' and item['text'].strip()]
+    translations = {}
+    for lang, translated_texts in translator.engine.translate_document(texts, language, display=True).items():
+        translations[lang] = dict(zip(texts, translated_texts))
+
     for item in original_data:
         new_data.append(item)
         if item['type'] == 'paragraph':
@@ -740,7 +811,7 @@ def add_paragraph_translation(original_data, translator, language):
                 for lang in language:
                     new_item = item.copy()
 
-                    translated_text = translator.translate(original_text, language=lang, display=True)
+                    translated_text = translations[lang][original_text]
                     # translated_text = original_text
                     new_item['text'] = translated_text
                     new_item['language'] = lang
@@ -756,6 +827,12 @@ def add_paragraph_translation(original_data, translator, language):
 
 
 def add_table_translation(original_data, translator, language):
+    # 先把所有单元格（含嵌套表格）的文本一次批量翻译，之后逐个单元格处理时直接取本次运行的翻译结果
+    tables = [item for item in original_data if item['type'] == 'table']
+    texts = collect_texts(tables)
+    if texts:
+        translator.engine.translate_document(texts, language, display=True)
+
     new_data = original_data.copy()
     new_data2 = []
     for index, item in enumerate(original_data):
@@ -792,24 +869,17 @@ def add_cover_translation(original_data, translator, language):
             original_text = item['text']
 
             # 根据冒号拆分段落
-            split_text = []
             if ":" in original_text:
                 original_text = original_text.replace(":", "：")
                 item["text"] = original_text
-            if ":" in original_text:
-                split_text = original_text.split(":", 1)  # 1代表只分割第一个冒号
-            elif "：" in original_text:
-                split_text = original_text.split("：", 1)  # 1代表只分割第一个冒号
+            split_text = split_preamble_text(original_text)
 
             if split_text:
+                translations = translator.engine.translate_document(split_text, language, display=True)
                 for lang in language:
                     new_item = item.copy()
 
-                    translated_text = ''
-                    for part in split_text:
-                        part_translated = translator.translate(part, language=lang, display=True)
-                        translated_text = translated_text + part_translated + '：'
-                    translated_text = translated_text[:-1]
+                    translated_text = '：'.join(translations[lang])
                     # print(translated_text)
                     new_item['text'] = translated_text
                     new_item['language'] = lang
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : engine.py
+@Author  : Shawn
+@Date    : 2026/10/18 12:10
+@Info    : 异步翻译引擎：整篇文档的文本按批次并发请求（并发数有上限），结果按原顺序返回
+"""
+
+import asyncio
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.cm_sop_translate.batching import pack_batches
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.segmenter import split_text, join_chunks
+
+
+class AsyncTranslateEngine:
+    def __init__(self, translator, concurrency: int = 16):
+        self.translator = translator
+        self.concurrency = concurrency
+
+    def translate_all(self, texts: list, language, display=False) -> list:
+        """翻译一种语言，返回与texts顺序一致的译文列表"""
+        return self.translate_document(texts, [language], display)[language]
+
+    def translate_document(self, texts: list, languages: list, display=False, priorities: dict = None) -> dict:
+        """
+        同时翻译多种语言，返回 语言 -> 与texts顺序一致的译文列表
+        与Translator.translate_many相同：先查词库和缓存，未命中的再请求模型；
+        开启config.MULTI_TARGET时，多种语言都未命中的文本在一次请求中同时翻译成所有语言
+        限时翻译时按priorities（原文 -> 优先级，越小越先，缺省为0）、长段落优先的顺序发请求，
+        到时不再等待还在进行的请求，这些文本改为只查词库、缓存
+        """
+        return self._translate_document(texts, languages, display, priorities or {})
+
+    def plan_document(self, texts: list, languages: list, priorities: dict = None, display=False, count=True):
+        """
+        与translate_document相同的请求规划（不发送请求）：长段落换成分块，限时翻译时按优先级排序，查词库和缓存后规划请求批次；
+        count为False时只查不计（翻译计划、预估）。返回 (实际要翻译的文本, 长段落 -> 分块, plan_requests的两项结果)
+        """
+        work_texts, long_texts = self.expand_long_texts(texts, languages)
+        if self.translator.deadline is not None:
+            work_texts, rank = self.order_requests(work_texts, long_texts, priorities or {})
+        cached, requests = self.plan_requests(work_texts, languages, display, count)
+        if self.translator.deadline is not None:
+            requests.sort(key=lambda request: min(rank[text] for text in request[0]))
+        return work_texts, long_texts, cached, requests
+
+    def plan_requests(self, texts: list, languages: list, display=False, count=True):
+        """
+        不发送请求，先查词库和缓存，再把未命中的文本规划成请求批次
+        返回 (语言 -> (译文列表, 待请求文本 -> 下标列表), [(批次文本, 批次语言), ...])
+        """
+        cached = {lang: self.translator.split_cached(texts, lang, display, count) for lang in languages}
+
+        # 按缺少的语言分组：(缺少的语言, ...) -> 文本列表
+        groups = {}
+        missing_texts = dict.fromkeys(text for lang in languages for text in cached[lang][1])
+        for text in missing_texts:
+            missing = tuple(lang for lang in languages if text in cached[lang][1])
+            if config.MULTI_TARGET:
+                groups.setdefault(missing, []).append(text)
+            else:
+                for lang in missing:
+                    groups.setdefault((lang,), []).append(text)
+
+        requests = []
+        for missing, group in groups.items():
+            for batch in self.plan_batches(group, len(missing)):
+                requests.append((batch, list(missing)))
+        return cached, requests
+
+    def split_long_texts(self, texts: list, languages: list) -> dict:
+        """找出需要请求模型的长段落（整段已在词库、缓存中的除外），返回 长段落 -> 分块"""
+        long_texts = {}
+        for text in dict.fromkeys(texts):
+            chunks = split_text(text, config.SEGMENT['max_tokens'])
+            # 只查不计：整段命中的之后规划请求时再查一次，未命中的在拼回分块时再查一次
+            if len(chunks) > 1 and any(self.translator.lookup(text, lang, count=False) is None for lang in languages):
+                long_texts[text] = chunks
+        return long_texts
+
+    def expand_long_texts(self, texts: list, languages: list):
+        """长段落换成分块，返回 (实际要翻译的文本, 长段落 -> 分块)"""
+        long_texts = self.split_long_texts(texts, languages)
+        work_texts = [chunk for chunks in long_texts.values() for chunk in chunks]
+        work_texts += [text for text in texts if text not in long_texts]
+        return work_texts, long_texts
+
+    def order_requests(self, work_texts: list, long_texts: dict, priorities: dict):
+        """
+        限时翻译时的请求顺序：先按优先级，同一优先级内长的先翻译；长段落的分块沿用整段的优先级
+        返回 (排序后的文本, 原文 -> 排序键)
+        """
+        rank = {}
+        for text in work_texts:
+            rank[text] = (priorities.get(text, 0), -len(text))
+        for text, chunks in long_texts.items():
+            for chunk in chunks:
+                rank[chunk] = min(rank[chunk], (priorities.get(text, 0), -len(text)))
+        return sorted(work_texts, key=rank.get), rank
+
+    def _translate_document(self, texts, languages, display, priorities):
+        # 长段落拆成多块，与其他文本一起打包并发翻译，完成后按顺序拼回
+        work_texts, long_texts, cached, requests = self.plan_document(texts, languages, priorities, display)
+
+        replies = []
+        time_left = self.translator.time_left()
+        if requests and (time_left is None or time_left > 0):
+            # 有需要请求的文本时才建事件循环和线程池（逐个段落、单元格写入时文本通常都已翻译过，只查本次运行的结果）
+            replies, requests = asyncio.run(self._request_all(requests, time_left))
+        # 没来得及翻译的批次只查词库、缓存
+        for batch, batch_languages in requests:
+            replies.append({lang: {text: self.translator.degrade(text, lang) for text in batch}
+                            for lang in batch_languages})
+
+        for reply in replies:
+            for lang, translations in reply.items():
+                results, todo = cached[lang]
+                for text, res in translations.items():
+                    if display:
+                        print(text, "-->", res)
+                    for index in todo[text]:
+                        results[index] = res
+
+        document = {}
+        for lang in languages:
+            translated = dict(zip(work_texts, cached[lang][0]))
+            for text, chunks in long_texts.items():
+                res = self.translator.lookup(text, lang)
+                if res is None:
+                    parts = [translated[chunk] for chunk in chunks]
+                    if any(self.translator.is_untranslated(part) for part in parts):
+                        # 限时翻译时部分分块没翻译完，整段保留原文，不写入缓存
+                        res = config.DEADLINE['marker'] + text
+                    else:
+                        res = join_chunks(parts)
+                        self.translator.remember(text, lang, res)
+                translated[text] = res
+            document[lang] = [translated[text] for text in texts]
+        return document
+
+    async def _request_all(self, requests: list, time_left=None):
+        """并发发送请求批次，返回 (各批次的应答, 没有完成的批次)；time_left不为None时到时不再等待"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # 默认线程池的线程数可能小于并发数，这里单独建一个
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='translate')
+        tasks = [asyncio.ensure_future(self._run_batch(batch, batch_languages, semaphore, executor))
+                 for batch, batch_languages in requests]
+        done, pending = await asyncio.wait(tasks, timeout=time_left)
+        for task in pending:
+            task.cancel()
+        # 到时还在进行的请求不再等待，完成后仍会写入缓存
+        executor.shutdown(wait=not pending, cancel_futures=True)
+        replies = [task.result() for task in tasks if task in done]
+        return replies, [request for request, task in zip(requests, tasks) if task not in done]
+
+    async def _run_batch(self, batch, languages, semaphore, executor):
+        """返回 语言 -> {原文: 译文}"""
+        # 线程中的埋点归到发出请求时的文档：限时翻译到时不再等待的请求完成得晚，不能记到下一个文件上
+        metrics = self.translator.metrics
+        document = metrics.current()
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            if len(languages) > 1:
+                return await loop.run_in_executor(executor, metrics.run_as, document,
+                                                  self.translator.translate_batch_multi, batch, languages)
+            reply = await loop.run_in_executor(executor, metrics.run_as, document,
+                                               self.translator.translate_batch, batch, languages[0])
+            return {languages[0]: reply}
+
+    def plan_batches(self, texts: list, language_count: int = 1) -> list:
+        """
+        按单批的条数和token上限把文本装满批次；文本少、批次数不到并发数时，把文本摊到更多批次上用满并发槽位，
+        但每批不少于min_items条（小文档不会拆成一段一个请求）。
+        一次翻译多种语言时输出成倍增加，单批条数按语言数缩小
+        """
+        if not texts:
+            return []
+        max_items = max(1, config.TRANSLATE_BATCH['max_items'] // language_count)
+        min_items = max(1, min(max_items, config.TRANSLATE_BATCH['min_items'] // language_count))
+        items = min(max_items, max(min_items, math.ceil(len(texts) / self.concurrency)))
+        return pack_batches(texts, max_items=items, max_tokens=config.TRANSLATE_BATCH['max_tokens'])
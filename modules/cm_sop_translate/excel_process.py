@@ -499,6 +499,30 @@ def paste_shape_to_excel(input_file, output_file, sheet_name):
     excelApp.Quit()
 
 
+def collect_excel_texts(data, method: str):
+    """收集所有单元格（replace_multi时还有文本框）中需要翻译的文字，已去重"""
+    texts = []
+    for sheet_data in data:
+        texts.extend(str(cell_data['value']) for cell_data in sheet_data['cells'])
+        if method == 'replace_multi':
+            texts.extend(str(shape_data['text']) for shape_data in sheet_data['shape_info'])
+    return [text for text in dict.fromkeys(texts) if text.strip()]
+
+
+def read_excel_texts(file_path: str) -> List[str]:
+    """
+    只读方式收集所有单元格中需要翻译的文字，已去重（预估用）：不启动Excel，不关闭用户已打开的工作簿；
+    文本框中的文字要通过Excel读取，不统计
+    """
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        texts = [str(value) for sheet in workbook.worksheets
+                 for row in sheet.iter_rows(values_only=True) for value in row if value]
+    finally:
+        workbook.close()
+    return [text for text in dict.fromkeys(texts) if text.strip()]
+
+
 def add_translation(data, translator, langs: list, method: str):
     """
     添加翻译段落
@@ -506,6 +530,12 @@ def add_translation(data, translator, langs: list, method: str):
     method-add: 增加新的内容，保留3种语言
     """
     tran_data = []
+    # 所有单元格和文本框的文字先一次并发批量翻译
+    texts = collect_excel_texts(data, method)
+    translations = {}
+    for lang, translated_texts in translator.engine.translate_document(texts, langs, display=True).items():
+        translations[lang] = dict(zip(texts, translated_texts))
+
     if method == 'replace':  # 替换成一种语言
         for lang in langs:
             lang_data = copy.deepcopy(data)  # 使用copy()会影响原始数据，deepcopy不会影响
@@ -513,7 +543,7 @@ def add_translation(data, translator, langs: list, method: str):
                 for cell_data in sheet_data['cells']:
                     original_text = str(cell_data['value'])
                     if original_text.strip():
-                        translated_text = translator.translate(original_text, lang, display=True)
+                        translated_text = translations[lang][original_text]
                         cell_data['value'] = translated_text
             tran_data.append({
                 "language": lang,
@@ -529,7 +559,7 @@ def add_translation(data, translator, langs: list, method: str):
                 if original_text.strip():
                     all_translated_text = original_text
                     for lang in langs:
-                        translated_text = translator.translate(original_text, lang, display=True)
+                        translated_text = translations[lang][original_text]
                         all_translated_text = all_translated_text + '\n' + translated_text
                     cell_data['value'] = all_translated_text
             # 翻译shape文本框文字
@@ -538,7 +568,7 @@ def add_translation(data, translator, langs: list, method: str):
                 if original_text.strip():
                     all_translated_text = original_text
                     for lang in langs:
-                        translated_text = translator.translate(original_text, lang, display=True)
+                        translated_text = translations[lang][original_text]
                         all_translated_text = all_translated_text + '\n' + translated_text
                     shape_data['text'] = all_translated_text
 
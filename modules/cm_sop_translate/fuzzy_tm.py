@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : fuzzy_tm.py
+@Author  : Shawn
+@Date    : 2026/10/18 23:00
+@Info    : 模糊翻译记忆：用bge-large的ONNX导出（与modules/demo/vector_distance.py相同的归一化句向量）给已翻译的原文建向量索引，
+           翻译时找最相似的历史原文：只有数字不同的直接换数字复用译文，其余相似度超过阈值的作为参考译文随请求发给模型。
+           向量以float16追加写入文件并内存映射，条数多时用倒排（IVF：k-means聚类后只搜最近的几个类）保证查询速度。
+           重建索引：python -m modules.cm_sop_translate.fuzzy_tm build
+"""
+
+import json
+import logging
+import os
+import re
+import struct
+import threading
+
+import numpy as np
+
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.tm_cache import cache_text
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+MAGIC = b'SOPFZ001'
+HEADER = struct.Struct('<8sI4x')  # 标识、向量维度，后接float16向量
+
+
+def replace_numbers(text: str, source: str, target: str):
+    """
+    text与source只有数字不同时，把target中对应的数字按顺序换成text中的数字；
+    不是只有数字不同，或target中的数字与source不一一对应时返回None
+    """
+    if NUMBER_PATTERN.sub('#', text) != NUMBER_PATTERN.sub('#', source):
+        return None
+    old_numbers = NUMBER_PATTERN.findall(source)
+    if NUMBER_PATTERN.findall(target) != old_numbers:
+        return None
+    new_numbers = iter(NUMBER_PATTERN.findall(text))
+    return NUMBER_PATTERN.sub(lambda match: next(new_numbers), target)
+
+
+def load_encoder(model_dir: str):
+    """
+    加载向量模型，返回 文本列表 -> 归一化的[CLS]向量 的函数（与modules/demo/vector_distance.py的encode_onnx相同）；
+    第一次建向量或查询时才加载，不用模糊翻译记忆时不需要安装onnxruntime、optimum
+    """
+    from onnxruntime import SessionOptions, ExecutionMode, GraphOptimizationLevel
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    if not os.path.isdir(model_dir):
+        raise FileNotFoundError(f"向量模型不存在：{model_dir}")
+    options = SessionOptions()
+    options.intra_op_num_threads = 4  # 等于CPU物理核心数
+    options.execution_mode = ExecutionMode.ORT_PARALLEL
+    options.graph_optimization_level = GraphOptimizationLevel.ORT_ENABLE_ALL
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = ORTModelForFeatureExtraction.from_pretrained(model_dir, session_options=options)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    def encode(texts):
+        inputs = tokenizer(texts, padding=True, truncation=True, max_length=512, return_tensors="np")
+        inputs.pop('token_type_ids', None)
+        embeddings = model(**inputs).last_hidden_state[:, 0, :]  # 取[CLS] token
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    logger.info(f"已加载向量模型：{model_dir}")
+    return encode
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """归一化向量按内积聚类，返回k个归一化的中心"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = (vectors @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # 空的类重新随机取一个点
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        norms[empty] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+class FuzzyMemory:
+    """
+    文件：path.jsonl（每行一条原文及各语言译文，同一原文后出现的行补充/覆盖译文）、
+    path.f16（按原文首次出现的顺序追加的向量，与原文逐行对应）、path.ivf.npz（聚类中心和每行所属的类）
+    """
+
+    def __init__(self, path: str, model: str = None, threshold: float = 0.9, min_chars: int = 6,
+                 reuse_digits: bool = True, ivf_min_rows: int = 10000, nprobe: int = 8, encoder=None):
+        self.path = path
+        self.model = model  # 向量模型目录，没有传入encoder时第一次用到再加载
+        self.threshold = threshold  # 相似度（内积）不低于该值才算匹配
+        self.min_chars = min_chars  # 更短的文本不建索引、不查询（短文本交给词库和精确缓存）
+        self.reuse_digits = reuse_digits
+        self.ivf_min_rows = ivf_min_rows  # 超过该条数才建倒排，以下全部比对
+        self.nprobe = nprobe  # 每次查询搜索的类数
+        self.encoder = encoder
+        self.sources = []  # 行号 -> 规范化原文
+        self.targets = []  # 行号 -> {语言: 译文}
+        self.rows = {}  # 规范化原文 -> 行号
+        self.embeddings = None  # 内存映射的float16向量
+        self.dense = None  # 条数少时常驻内存的float32向量
+        self.centroids = None
+        self.lists = None  # 类 -> 行号数组
+        self.labels = None  # 行号 -> 类
+        self.assigned = 0  # 已分配到类的行数
+        self.pending = {}  # 待建向量的 规范化原文 -> {语言: 译文}
+        self.hits = 0
+        self.reused = 0
+        self._encode_lock = threading.Lock()
+        self._lock = threading.RLock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.load()
+
+    def encode(self, texts: list) -> np.ndarray:
+        with self._encode_lock:
+            if self.encoder is None:
+                self.encoder = load_encoder(self.model)
+            return np.asarray(self.encoder(texts), dtype=np.float32)
+
+    # ---------- 读写索引 ----------
+
+    def load(self):
+        with self._lock:
+            self.sources, self.targets, self.rows = [], [], {}
+            if os.path.isfile(self.path + '.jsonl'):
+                with open(self.path + '.jsonl', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            item = json.loads(line)
+                            self._merge_entry(item['source'], item['targets'])
+            self._open_embeddings()
+            # 中途退出可能导致向量与原文条数不一致，只用两者都有的部分，没有向量的原文之后重新建
+            rows = min(len(self.sources), len(self.embeddings) if self.embeddings is not None else 0)
+            for source in self.sources[rows:]:
+                del self.rows[source]
+            self.sources, self.targets = self.sources[:rows], self.targets[:rows]
+            if self.embeddings is not None:
+                self.embeddings = self.embeddings[:rows]
+            self._load_ivf()
+
+    def _open_embeddings(self):
+        self.embeddings = None
+        self.dense = None
+        if os.path.isfile(self.path + '.f16') and os.path.getsize(self.path + '.f16') > HEADER.size:
+            with open(self.path + '.f16', 'rb') as f:
+                magic, dim = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"模糊翻译记忆文件格式错误：{self.path}.f16")
+            embeddings = np.memmap(self.path + '.f16', dtype=np.float16, mode='r', offset=HEADER.size)
+            self.embeddings = embeddings[:len(embeddings) // dim * dim].reshape(-1, dim)
+
+    def _merge_entry(self, source, targets):
+        row = self.rows.get(source)
+        if row is None:
+            self.rows[source] = len(self.sources)
+            self.sources.append(source)
+            self.targets.append(dict(targets))
+        else:
+            self.targets[row].update(targets)
+
+    def _load_ivf(self):
+        self.centroids = None
+        self.lists = None
+        self.assigned = 0
+        if os.path.isfile(self.path + '.ivf.npz') and self.embeddings is not None:
+            data = np.load(self.path + '.ivf.npz')
+            labels = data['labels'][:len(self.sources)]
+            self.centroids = data['centroids']
+            self._set_lists(labels)
+        self._update_ivf()
+
+    def _set_lists(self, labels: np.ndarray):
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        self.labels = labels
+        self.assigned = len(labels)
+
+    def _update_ivf(self):
+        """条数超过ivf_min_rows且比上次聚类时翻倍时重新聚类，否则把新增的行分到最近的类"""
+        rows = len(self.sources)
+        if rows < self.ivf_min_rows:
+            self.centroids = None
+            self.lists = None
+            if rows:
+                self.dense = np.asarray(self.embeddings, dtype=np.float32)
+            return
+        self.dense = None
+        if self.centroids is None or rows >= 2 * len(self.centroids) ** 2:
+            sample = np.random.default_rng(0).choice(rows, min(rows, 50000), replace=False)
+            vectors = np.asarray(self.embeddings[np.sort(sample)], dtype=np.float32)
+            self.centroids = spherical_kmeans(vectors, int(np.sqrt(rows)))
+            labels = self._assign(0, rows)
+        elif self.assigned < rows:
+            labels = np.concatenate([self.labels, self._assign(self.assigned, rows)])
+        else:
+            return
+        self._set_lists(labels)
+        np.savez(self.path + '.ivf.npz', centroids=self.centroids, labels=labels)
+
+    def _assign(self, start, end, chunk_size: int = 16384) -> np.ndarray:
+        labels = []
+        for chunk_start in range(start, end, chunk_size):
+            block = np.asarray(self.embeddings[chunk_start:min(end, chunk_start + chunk_size)], dtype=np.float32)
+            labels.append((block @ self.centroids.T).argmax(axis=1).astype(np.int32))
+        return np.concatenate(labels) if labels else np.zeros(0, dtype=np.int32)
+
+    def add(self, text: str, language, translated_text: str):
+        """记录一条模型译文，flush时再批量建向量"""
+        source = cache_text(text)
+        if len(source) < self.min_chars or not translated_text:
+            return
+        with self._lock:
+            row = self.rows.get(source)
+            if row is not None and self.targets[row].get(language) == translated_text:
+                return
+            self.pending.setdefault(source, {})[language] = translated_text
+
+    def flush(self, batch_size: int = 64):
+        """新原文批量建向量后追加写入，已有原文只追加译文"""
+        with self._lock:
+            if not self.pending:
+                return
+            pending, self.pending = self.pending, {}
+            new_sources = [source for source in pending if source not in self.rows]
+            # 先释放内存映射（Windows下映射中的文件不能截断），截掉中途退出时多写的向量，保证向量与原文逐行对应
+            size = HEADER.size + self.embeddings.nbytes if self.embeddings is not None else 0
+            self.embeddings = None
+            try:
+                with open(self.path + '.f16', 'r+b' if size else 'wb') as f:
+                    f.truncate(size)
+                    f.seek(size)
+                    for start in range(0, len(new_sources), batch_size):
+                        vectors = self.encode(new_sources[start:start + batch_size]).astype(np.float16)
+                        if f.tell() == 0:
+                            f.write(HEADER.pack(MAGIC, vectors.shape[1]))
+                        f.write(vectors.tobytes())
+                with open(self.path + '.jsonl', 'a', encoding='utf-8') as f:
+                    for source in pending:
+                        f.write(json.dumps({"source": source, "targets": pending[source]}, ensure_ascii=False) + '\n')
+                for source in pending:
+                    self._merge_entry(source, pending[source])
+            finally:
+                # 建向量失败时多写的向量不对应任何原文，不使用
+                self._open_embeddings()
+                if self.embeddings is not None:
+                    self.embeddings = self.embeddings[:len(self.sources)]
+                self._update_ivf()
+            logger.info(f"模糊翻译记忆：新增{len(new_sources)}条，共{len(self.sources)}条")
+
+    # ---------- 查询 ----------
+
+    def _candidates(self, query: np.ndarray):
+        """返回 (候选行号, 候选向量)，条数少时为全部"""
+        if self.lists is None:
+            return None, self.dense
+        probes = np.argsort(query @ self.centroids.T)[::-1][:self.nprobe]
+        rows = np.sort(np.concatenate([self.lists[probe] for probe in probes]))
+        return rows, np.asarray(self.embeddings[rows], dtype=np.float32)
+
+    def search(self, texts: list, languages: list, top: int = 5) -> dict:
+        """
+        返回 语言 -> {原文: [(相似的历史原文, 译文, 相似度), ...]}，按相似度从高到低最多top条，
+        只包含相似度不低于阈值、有该语言译文、与原文不完全相同的（完全相同的由翻译记忆缓存处理）
+        """
+        matches = {language: {} for language in languages}
+        texts = [text for text in texts if len(cache_text(text)) >= self.min_chars]
+        if not texts or not self.sources:
+            return matches
+        # 建向量较慢，不占着锁，其他线程可以同时查询、登记译文
+        queries = self.encode([cache_text(text) for text in texts])
+        with self._lock:
+            for text, query in zip(texts, queries):
+                rows, vectors = self._candidates(query)
+                scores = vectors @ query
+                for index in np.argsort(scores)[::-1][:top]:
+                    if scores[index] < self.threshold:
+                        break
+                    row = int(rows[index]) if rows is not None else int(index)
+                    if self.sources[row] == cache_text(text):
+                        continue
+                    for language in languages:
+                        target = self.targets[row].get(language)
+                        if target:
+                            matches[language].setdefault(text, []).append(
+                                (self.sources[row], target, float(scores[index])))
+            self.hits += len({text for items in matches.values() for text in items})
+            return matches
+
+    def prepare(self, texts: list, languages: list):
+        """
+        请求模型前调用：返回 (只有数字不同、直接换数字复用的 原文 -> {语言: 译文}, 语言 -> {原文: (相似原文, 参考译文, 相似度)})
+        一段文本要所有语言都能复用才算复用，否则取最相似的一条作为参考译文随请求发送
+        """
+        matches = self.search(texts, languages)
+        reused = {}
+        if self.reuse_digits:
+            for text in texts:
+                translations = {}
+                for language in languages:
+                    for source, target, _ in matches[language].get(text, []):
+                        translated = replace_numbers(cache_text(text), source, target)
+                        if translated is not None:
+                            translations[language] = translated
+                            break
+                    else:
+                        break
+                else:
+                    reused[text] = translations
+        references = {language: {text: items[0] for text, items in matches[language].items() if text not in reused}
+                      for language in languages}
+        self.reused += len(reused)
+        return reused, references
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "entries": len(self.sources),
+            "ivf_lists": len(self.lists) if self.lists is not None else 0,
+            "matches": self.hits,
+            "reused": self.reused,
+        }
+
+
+# 进程内共享：索引路径 -> FuzzyMemory
+_MEMORIES = {}
+_MEMORIES_LOCK = threading.Lock()
+
+
+def get_fuzzy_memory(path: str, **options):
+    """获取模糊翻译记忆，向量模型不可用时返回None（不影响其他翻译流程）"""
+    path = os.path.abspath(path)
+    with _MEMORIES_LOCK:
+        if path not in _MEMORIES:
+            try:
+                _MEMORIES[path] = FuzzyMemory(path, **options)
+            except Exception as e:
+                logger.error(f"模糊翻译记忆不可用{e}")
+                _MEMORIES[path] = None
+    return _MEMORIES[path]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from modules.cm_sop_translate.masking import is_masked
+    from modules.cm_sop_translate.tm_cache import get_translation_cache
+    from modules.cm_sop_translate.translator import MODEL, PROMPT_VERSION
+
+    parser = argparse.ArgumentParser(description='模糊翻译记忆')
+    parser.add_argument('command', choices=['build'], help='build：从翻译记忆缓存补建向量索引')
+    args = parser.parse_args()
+
+    settings = {k: v for k, v in config.FUZZY_TM.items() if k != 'enabled'}
+    memory = FuzzyMemory(**settings)
+    for source, language, model, prompt_version, target in get_translation_cache(**config.TRANSLATION_CACHE).entries():
+        # 遮盖了数字的原文（带占位符）不建索引，相似文本的数字复用由replace_numbers处理
+        if model == MODEL and prompt_version == str(PROMPT_VERSION) and not is_masked(source):
+            memory.add(source, language, target)
+    memory.flush()
+    logger.info(f"模糊翻译记忆统计：{memory.stats()}")
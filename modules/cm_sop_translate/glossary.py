@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : glossary.py
+@Author  : Shawn
+@Date    : 2026/10/18 10:05
+@Info    : 词库索引：每种语言的词库只加载一次，按规范化的键存放，词库文件变化（mtime/size）时自动重载
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+
+# 规范化时去掉的末尾标点（NFKC之后全角冒号等已转为半角）
+TRAILING_PUNCTUATION = ':;,.!?、。；，！？…'
+# 去掉的末尾标点在译文中的对应写法
+PUNCTUATION_MAPPING = {
+    '。': '.',
+    '，': ',',
+    '、': ',',
+    '；': ';',
+    '！': '!',
+    '？': '?',
+}
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化文本，用作词库/缓存的键：
+    NFKC（全角转半角，全角空格　转为普通空格）、去掉所有空白、去掉末尾标点
+    """
+    text = unicodedata.normalize('NFKC', text)
+    text = WHITESPACE_PATTERN.sub('', text)
+    return text.rstrip(TRAILING_PUNCTUATION)
+
+
+def trailing_punctuation(text: str) -> str:
+    """返回规范化时被去掉的末尾标点，用于补回译文"""
+    text = WHITESPACE_PATTERN.sub('', unicodedata.normalize('NFKC', text))
+    stripped = text.rstrip(TRAILING_PUNCTUATION)
+    suffix = text[len(stripped):]
+    return ''.join(PUNCTUATION_MAPPING.get(ch, ch) for ch in suffix)
+
+
+class GlossaryIndex:
+    """
+    单个词库文件的内存索引
+    exact: 原始键 -> 译文；normalized: 规范化键 -> (原始键, 译文)
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval  # 两次检查文件变化的最小间隔（秒）
+        self.exact = {}
+        self.normalized = {}
+        self.version = 0  # 每次（重新）加载后加1
+        self.hits = 0
+        self.misses = 0
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, signature):
+        with open(self.path, "r", encoding="utf-8") as f:
+            dicts = json.load(f)
+
+        normalized = {}
+        for key, value in dicts.items():
+            norm_key = normalize_text(key)
+            if not norm_key:
+                continue
+            # 规范化后冲突时（如"文件编号"与"文件编号："），优先保留本身就是规范形式的键
+            if norm_key in normalized and normalized[norm_key][0] == norm_key:
+                continue
+            normalized[norm_key] = (key, value)
+
+        self.exact = dicts
+        self.normalized = normalized
+        self._signature = signature
+        self.version += 1
+
+    def refresh(self, force=False):
+        """文件的mtime或size变化时重新加载"""
+        now = time.monotonic()
+        if not force and self._signature is not None and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            signature = self._file_signature()
+            if force or signature != self._signature:
+                self._load(signature)
+
+    def lookup(self, text: str, count=True):
+        """查词库，先精确匹配，再按规范化的键匹配；未命中返回None。count为False时不计入命中率（如生成翻译计划时预查）"""
+        self.refresh()
+
+        if text in self.exact:
+            if count:
+                self.hits += 1
+            return self.exact[text]
+
+        entry = self.normalized.get(normalize_text(text))
+        if entry is None:
+            if count:
+                self.misses += 1
+            return None
+
+        if count:
+            self.hits += 1
+        key, value = entry
+        # 命中的键本身不带末尾标点时，把原文的末尾标点补回译文
+        suffix = trailing_punctuation(text)
+        if suffix and key == normalize_text(key) and not value.endswith(suffix):
+            value = value + suffix
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "version": self.version,
+            "entries": len(self.exact),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# 进程内的索引注册表：词库路径 -> GlossaryIndex
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_glossary_index(path: str) -> GlossaryIndex:
+    """获取词库索引，同一进程内每个词库文件只建一个索引"""
+    path = os.path.abspath(path)
+    index = _INDEXES.get(path)
+    if index is None:
+        with _INDEXES_LOCK:
+            index = _INDEXES.get(path)
+            if index is None:
+                index = GlossaryIndex(path)
+                _INDEXES[path] = index
+    return index
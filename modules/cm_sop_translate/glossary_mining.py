@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : glossary_mining.py
+@Author  : Shawn
+@Date    : 2026/10/18 21:40
+@Info    : 词库挖掘：从翻译记忆缓存和运行日志（translate_metrics.jsonl）中找出高频、短小、译文稳定的文本，
+           生成对词库JSON的diff供人工审核，并估算加入词库后最近N次运行可以省下的请求次数。
+           用法：python -m modules.cm_sop_translate.glossary_mining --metrics D:\\docs\\translate_output --runs 10
+"""
+
+import argparse
+import difflib
+import json
+import logging
+import os
+import sqlite3
+
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.glossary import GlossaryIndex, normalize_text
+from modules.cm_sop_translate.masking import is_masked
+from modules.cm_sop_translate.metrics import MODEL_PATHS
+from modules.cm_sop_translate.prefilter import classify, HAN_PATTERN
+from modules.cm_sop_translate.tm_cache import cache_text, WHITESPACE_PATTERN
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+METRICS_FILENAME = 'translate_metrics.jsonl'
+
+
+def load_runs(paths: list) -> list:
+    """
+    读取运行日志，返回按时间排序的运行列表，每次运行为该次的调用记录列表；
+    paths可以是jsonl文件或输出目录，同一文件中以summary行分隔多次运行
+    """
+    runs = []
+    for path in paths:
+        if os.path.isdir(path):
+            path = os.path.join(path, METRICS_FILENAME)
+        if not os.path.isfile(path):
+            logger.warning(f"运行日志不存在：{path}")
+            continue
+        calls = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get('type') == 'call':
+                    calls.append(record)
+                elif record.get('type') == 'summary':
+                    runs.append((record['time'], calls))
+                    calls = []
+        if calls:
+            # 没有正常结束的运行（中途退出），时间取最后一条文档汇总之后
+            runs.append(('~', calls))
+    return [calls for _, calls in sorted(runs, key=lambda run: run[0])]
+
+
+def call_texts(record: dict) -> list:
+    """一条调用记录涉及的原文：请求模型的记录有完整的texts，其余记录只有一条文本"""
+    if 'texts' in record:
+        return record['texts']
+    if record['items'] == 1:
+        return [record['text']]
+    return []
+
+
+def load_cache_entries(cache_path: str) -> dict:
+    """
+    读取翻译记忆缓存（只读），返回 (语言, 规范化原文) -> {"targets": 各模型/提示词版本的译文集合, "uses": 命中次数}
+    """
+    entries = {}
+    if not os.path.isfile(cache_path):
+        logger.warning(f"翻译缓存不存在：{cache_path}")
+        return entries
+    conn = sqlite3.connect(f"file:{os.path.abspath(cache_path)}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT source, language, target, use_count FROM translations").fetchall()
+    finally:
+        conn.close()
+    for source, language, target, use_count in rows:
+        entry = entries.setdefault((language, cache_text(source)), {"targets": set(), "uses": 0})
+        entry['targets'].add(WHITESPACE_PATTERN.sub(' ', target).strip())
+        entry['uses'] += use_count + 1  # 写入时请求过一次模型
+    return entries
+
+
+def count_occurrences(runs: list) -> dict:
+    """运行日志中每段文本（按语言）出现的次数：(语言, 规范化原文) -> 次数"""
+    counts = {}
+    for calls in runs:
+        for record in calls:
+            for language in record['language'].split('、'):
+                for text in call_texts(record):
+                    key = (language, cache_text(text))
+                    counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def is_candidate(source: str, target: str, language, index: GlossaryIndex, max_chars: int) -> bool:
+    """短文本、未在词库中、不会被规则过滤、不是遮盖了数字的缓存原文、译文不含中文且不带未翻译标注"""
+    if not source or len(source) > max_chars or not HAN_PATTERN.search(source) or is_masked(source):
+        return False
+    if source in index.exact or normalize_text(source) in index.normalized:
+        return False
+    if classify(source, language):
+        return False
+    return bool(target) and '\n' not in target and not HAN_PATTERN.search(target) \
+        and not target.startswith(config.DEADLINE['marker'])
+
+
+def mine_candidates(entries: dict, counts: dict, indexes: dict, max_chars: int, min_count: int) -> dict:
+    """
+    返回 语言 -> [(原文, 译文, 次数), ...]，按次数从高到低排列；
+    次数取缓存的使用次数（写入加命中）与运行日志中出现次数的较大者（两者有重叠，不相加），
+    各模型/提示词版本译文不一致的不作为候选
+    """
+    candidates = {language: [] for language in indexes}
+    for (language, source), entry in entries.items():
+        if language not in indexes or len(entry['targets']) != 1:
+            continue
+        target = next(iter(entry['targets']))
+        count = max(entry['uses'], counts.get((language, source), 0))
+        if count >= min_count and is_candidate(source, target, language, indexes[language], max_chars):
+            candidates[language].append((source, target, count))
+    for items in candidates.values():
+        items.sort(key=lambda item: (-item[2], item[0]))
+    return candidates
+
+
+def project_savings(runs: list, candidates: dict) -> list:
+    """
+    按候选词条加入词库估算每次运行省下的请求：整批文本都能在词库中查到的请求可以省掉，
+    其余请求中查到的文本从批次中去掉。返回每次运行的 {"api_calls", "calls_saved", "segments_saved"}
+    """
+    covered = {(language, source) for language, items in candidates.items() for source, _, _ in items}
+    projection = []
+    for calls in runs:
+        api_calls = 0
+        calls_saved = 0
+        segments_saved = 0
+        for record in calls:
+            if record['path'] not in MODEL_PATHS or record['path'] == 'local':
+                continue
+            api_calls += 1
+            texts = call_texts(record)
+            hits = [(language, cache_text(text)) in covered
+                    for language in record['language'].split('、') for text in texts]
+            segments_saved += sum(hits)
+            if texts and all(hits):
+                calls_saved += 1
+        projection.append({"api_calls": api_calls, "calls_saved": calls_saved, "segments_saved": segments_saved})
+    return projection
+
+
+def propose_glossary(path: str, additions: list):
+    """
+    在词库文件末尾另起一组追加候选词条，不改动已有内容（保留手工整理的分组空行），
+    返回 (追加后的文本, unified diff)
+    """
+    with open(path, encoding='utf-8') as f:
+        original = f.read()
+    body = original.rstrip()
+    if not body.endswith('}'):
+        raise ValueError(f"词库文件格式错误：{path}")
+    body = body[:-1].rstrip()
+    lines = [f"  {json.dumps(source, ensure_ascii=False)}: {json.dumps(target, ensure_ascii=False)}"
+             for source, target, _ in additions]
+    separator = ',\n\n' if not body.endswith('{') else '\n'
+    proposed = body + separator + ',\n'.join(lines) + '\n}\n'
+    json.loads(proposed)  # 确认追加后仍是合法的JSON
+
+    filename = os.path.basename(path)
+    diff = ''.join(difflib.unified_diff(original.splitlines(keepends=True), proposed.splitlines(keepends=True),
+                                        fromfile=f"a/{filename}", tofile=f"b/{filename}"))
+    return proposed, diff
+
+
+def mine_glossary(metrics_paths: list, runs: int = None, cache_path: str = None, output_folder: str = '.',
+                  max_chars: int = None, min_count: int = None) -> dict:
+    """
+    挖掘词库候选，在output_folder写出glossary_mining.diff（在词库目录下用git apply或patch -p1应用）
+    和glossary_candidates.json，返回汇总
+    """
+    settings = config.GLOSSARY_MINING
+    runs = runs or settings['runs']
+    max_chars = max_chars or settings['max_chars']
+    min_count = min_count or settings['min_count']
+    cache_path = cache_path or config.TRANSLATION_CACHE['path']
+
+    recent_runs = load_runs(metrics_paths)[-runs:]
+    glossary_paths = {language: os.path.join(config.GLOSSARY['dir'], filename)
+                      for language, filename in config.GLOSSARY['languages'].items()}
+    indexes = {}
+    for language, path in glossary_paths.items():
+        indexes[language] = GlossaryIndex(path)
+        indexes[language].refresh(force=True)
+
+    candidates = mine_candidates(load_cache_entries(cache_path), count_occurrences(recent_runs), indexes,
+                                 max_chars, min_count)
+    projection = project_savings(recent_runs, candidates)
+
+    os.makedirs(output_folder, exist_ok=True)
+    diffs = []
+    for language, additions in candidates.items():
+        if additions:
+            diffs.append(propose_glossary(glossary_paths[language], additions)[1])
+    diff_path = os.path.join(output_folder, 'glossary_mining.diff')
+    with open(diff_path, 'w', encoding='utf-8') as f:
+        f.write(''.join(diffs))
+
+    summary = {
+        "runs": len(recent_runs),
+        "candidates": {language: len(items) for language, items in candidates.items()},
+        "api_calls": sum(run['api_calls'] for run in projection),
+        "calls_saved": sum(run['calls_saved'] for run in projection),
+        "segments_saved": sum(run['segments_saved'] for run in projection),
+        "per_run": projection,
+        "diff": diff_path,
+    }
+    with open(os.path.join(output_folder, 'glossary_candidates.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, items={language: [{"source": source, "target": target, "count": count}
+                                                  for source, target, count in items]
+                                       for language, items in candidates.items()}),
+                  f, ensure_ascii=False, indent=2)
+
+    logger.info(f"词库挖掘：最近{summary['runs']}次运行，候选{summary['candidates']}，"
+                f"共{summary['api_calls']}次请求中可省{summary['calls_saved']}次，"
+                f"批次中可去掉{summary['segments_saved']}段，diff：{diff_path}")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='从翻译缓存和运行日志中挖掘词库候选')
+    parser.add_argument('--metrics', nargs='+', required=True,
+                        help='translate_metrics.jsonl文件或translate_output目录，可指定多个')
+    parser.add_argument('--runs', type=int, default=None, help='只看最近N次运行')
+    parser.add_argument('--cache', default=None, help='翻译缓存数据库，默认为config.TRANSLATION_CACHE的路径')
+    parser.add_argument('--output', default='.', help='diff和候选列表的输出目录')
+    parser.add_argument('--max-chars', type=int, default=None)
+    parser.add_argument('--min-count', type=int, default=None)
+    args = parser.parse_args()
+    mine_glossary(args.metrics, args.runs, args.cache, args.output, args.max_chars, args.min_count)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : hedging.py
+@Author  : Shawn
+@Date    : 2026/10/18 23:59
+@Info    : 对冲请求（hedged requests）：一次请求超过最近请求耗时的p95仍未返回时，再发一个相同的请求，先返回的为准，
+           压低长尾延迟（少数慢请求决定整个文件的完成时间）；对冲请求数不超过请求数的max_ratio，
+           统计对冲前后的p99以及多花的token
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.metrics import cached_tokens, percentile, token_cost
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+
+class RequestHedger:
+    def __init__(self, quantile: float = 95, max_ratio: float = 0.1, burst: int = 2, min_samples: int = 20,
+                 min_delay: float = 2.0, window: int = 200, max_workers: int = 32):
+        self.quantile = quantile  # 超过最近请求耗时的这个分位数时发对冲请求
+        self.max_ratio = max_ratio  # 对冲请求数最多占请求数的比例（额外负载上限）
+        self.burst = burst  # 请求还少时允许的对冲请求数
+        self.min_samples = min_samples  # 攒够这么多次耗时后才开始对冲
+        self.min_delay = min_delay  # 对冲等待时间的下限（秒），避免接口很快时频繁对冲
+        self.latencies = deque(maxlen=window)  # 最近完成的单次请求耗时
+        self.requests = 0
+        self.hedged = 0  # 发出的对冲请求数
+        self.wins = 0  # 对冲请求先返回的次数
+        self.skipped = 0  # 达到额外负载上限或限流器没有空位而没有对冲的次数
+        self.unhedged_latencies = []  # 每次请求中主请求的耗时（不对冲时的耗时）
+        self.hedged_latencies = []  # 每次请求实际拿到结果的耗时
+        self.extra_prompt_tokens = 0  # 没有用上的请求（对冲中后返回的一方）消耗的token
+        self.extra_completion_tokens = 0
+        self.extra_cached_tokens = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """当前的对冲等待时间，耗时样本不够时返回None（不对冲）"""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            return max(self.min_delay, percentile(list(self.latencies), self.quantile))
+
+    def run(self, send, hedge_slot=None, finish=None):
+        """
+        send()发送一次请求并返回应答；hedge_slot()在发对冲请求前调用，返回对冲请求结束时的回调finish(latency, error)，
+        返回None表示不能发（如限流器没有空位）；finish为主请求结束时的回调（对冲请求先返回时主请求仍在进行，
+        在它真正结束时才调用）。返回先成功的应答，都失败时抛出主请求的异常
+        """
+        start = time.perf_counter()
+        primary = self._executor.submit(self._timed, send)
+        primary.add_done_callback(self._primary_done)
+        if finish is not None:
+            primary.add_done_callback(lambda future: finish(*self._outcome(future)))
+        with self._lock:
+            self.requests += 1
+        hedge = None
+        delay = self.delay()
+        if delay is not None and not wait([primary], timeout=delay).done:
+            hedge = self._start_hedge(send, hedge_slot, delay)
+
+        winner = None
+        pending = {primary, hedge} - {None}
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # 同时完成时优先用主请求
+            for future in (primary, hedge):
+                if future in done and future.exception() is None:
+                    winner = future
+                    break
+        if winner is None:
+            return primary.result()[0]
+
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.hedged_latencies.append(latency)
+            if winner is hedge:
+                self.wins += 1
+        if hedge is not None:
+            (primary if winner is hedge else hedge).add_done_callback(self._wasted)
+        return winner.result()[0]
+
+    def _start_hedge(self, send, hedge_slot, delay):
+        with self._lock:
+            allowed = self.hedged < self.max_ratio * self.requests + self.burst
+        finish = None
+        if allowed:
+            finish = hedge_slot() if hedge_slot else (lambda latency, error: None)
+        if finish is None:
+            with self._lock:
+                self.skipped += 1
+            return None
+        with self._lock:
+            self.hedged += 1
+        logger.info(f"请求{delay:.2f}s未返回，发出对冲请求")
+        hedge = self._executor.submit(self._timed, send)
+        hedge.add_done_callback(lambda future: finish(*self._outcome(future)))
+        return hedge
+
+    def _timed(self, send):
+        start = time.perf_counter()
+        response = send()
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.latencies.append(latency)
+        return response, latency
+
+    @staticmethod
+    def _outcome(future):
+        """返回 (耗时, 异常)，失败时耗时为None"""
+        error = future.exception()
+        return (None, error) if error is not None else (future.result()[1], None)
+
+    def _primary_done(self, future):
+        latency, _ = self._outcome(future)
+        if latency is not None:
+            with self._lock:
+                self.unhedged_latencies.append(latency)
+
+    def _wasted(self, future):
+        """对冲中后返回的一方：应答没有用上，token计为额外开销"""
+        if future.exception() is not None:
+            return
+        usage = getattr(future.result()[0], 'usage', None)
+        with self._lock:
+            self.extra_prompt_tokens += getattr(usage, 'prompt_tokens', 0) or 0
+            self.extra_completion_tokens += getattr(usage, 'completion_tokens', 0) or 0
+            self.extra_cached_tokens += cached_tokens(usage)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_ratio": self.hedged / self.requests if self.requests else 0.0,
+                "wins": self.wins,
+                "skipped": self.skipped,
+                "p99_unhedged": percentile(self.unhedged_latencies, 99),
+                "p99": percentile(self.hedged_latencies, 99),
+                "extra_prompt_tokens": self.extra_prompt_tokens,
+                "extra_completion_tokens": self.extra_completion_tokens,
+                "extra_cost": token_cost(self.extra_prompt_tokens, self.extra_completion_tokens,
+                                         self.extra_cached_tokens),
+            }
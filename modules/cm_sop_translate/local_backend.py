@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : local_backend.py
+@Author  : Shawn
+@Date    : 2026/10/18 20:10
+@Info    : 本地离线翻译：导出为ONNX的seq2seq翻译模型（如opus-mt-zh-en，optimum导出的encoder_model.onnx + decoder_model.onnx），
+           CPU推理。各线程的请求汇总成动态批次，按token长度分桶后批量贪心解码，InferenceSession常驻复用。
+           网络慢或不可用时作为兜底，也可以用于大批量翻译。需要额外安装onnxruntime、transformers，并下载模型
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from modules.cm_sop_translate.config.config import config
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+
+class LocalBackendError(Exception):
+    """本地翻译不可用：未安装依赖、模型不存在等"""
+
+
+def bucket_batches(lengths: list, max_batch_size: int = 32, max_batch_tokens: int = 4096) -> list:
+    """
+    按长度排序后切分批次，返回下标列表的列表；
+    批次内按最长的补齐，批次条数×最长长度不超过max_batch_tokens，长度相近的放在一起减少补齐浪费
+    """
+    order = sorted(range(len(lengths)), key=lambda index: lengths[index])
+    batches = []
+    batch = []
+    longest = 0
+    for index in order:
+        length = max(1, lengths[index])
+        if batch and (len(batch) >= max_batch_size or max(longest, length) * (len(batch) + 1) > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+            longest = 0
+        batch.append(index)
+        longest = max(longest, length)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def empty_past(session, batch_size: int) -> dict:
+    """合并的解码器第一步（不走缓存分支）也要传入past_key_values，按输入的形状给长度为0的张量"""
+    past = {}
+    for item in session.get_inputs():
+        if item.name.startswith('past_key_values.'):
+            shape = [batch_size if axis == 0 else (dim if isinstance(dim, int) else 0)
+                     for axis, dim in enumerate(item.shape)]
+            past[item.name] = np.zeros(shape, dtype=np.float16 if 'float16' in item.type else np.float32)
+    return past
+
+
+class OnnxSeq2SeqModel:
+    """
+    一个翻译方向的模型：分词器 + 编码器会话 + 解码器会话；
+    解码器用带KV缓存的导出（decoder_with_past_model.onnx或decoder_model_merged.onnx），
+    第一步算完整的前缀，之后每步只输入新的token，把上一步输出的present.*作为past_key_values.*传回
+    """
+
+    def __init__(self, model_dir, session_options, max_length: int = 256):
+        try:
+            import onnxruntime
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise LocalBackendError(f"本地翻译需要安装onnxruntime和transformers：{e}")
+        if not os.path.isdir(model_dir):
+            raise LocalBackendError(f"本地翻译模型不存在：{model_dir}")
+
+        self.model_dir = model_dir
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        providers = ['CPUExecutionProvider']
+        self.encoder = onnxruntime.InferenceSession(os.path.join(model_dir, 'encoder_model.onnx'),
+                                                    sess_options=session_options, providers=providers)
+        if os.path.isfile(os.path.join(model_dir, 'decoder_with_past_model.onnx')):
+            self.merged = False
+            self.decoder = onnxruntime.InferenceSession(os.path.join(model_dir, 'decoder_model.onnx'),
+                                                        sess_options=session_options, providers=providers)
+            self.decoder_with_past = onnxruntime.InferenceSession(
+                os.path.join(model_dir, 'decoder_with_past_model.onnx'), sess_options=session_options,
+                providers=providers)
+        elif os.path.isfile(os.path.join(model_dir, 'decoder_model_merged.onnx')):
+            # 合并的解码器用use_cache_branch区分第一步和之后的步骤
+            self.merged = True
+            self.decoder = onnxruntime.InferenceSession(os.path.join(model_dir, 'decoder_model_merged.onnx'),
+                                                        sess_options=session_options, providers=providers)
+            self.decoder_with_past = self.decoder
+        else:
+            raise LocalBackendError(f"本地翻译模型缺少带KV缓存的解码器（decoder_with_past_model.onnx），"
+                                    f"请用--task text2text-generation-with-past导出：{model_dir}")
+        self.encoder_inputs = {item.name for item in self.encoder.get_inputs()}
+
+        with open(os.path.join(model_dir, 'config.json'), encoding='utf-8') as f:
+            model_config = json.load(f)
+        self.pad_id = model_config.get('pad_token_id', 0)
+        self.eos_id = model_config.get('eos_token_id', 0)
+        self.start_id = model_config.get('decoder_start_token_id', self.pad_id)
+
+    def lengths(self, texts: list) -> list:
+        """各文本的token数，用于分桶"""
+        return [len(ids) for ids in self.tokenizer(texts, truncation=True, max_length=self.max_length)['input_ids']]
+
+    def generate(self, texts: list) -> list:
+        """一批文本贪心解码"""
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors='np')
+        input_ids = inputs['input_ids'].astype(np.int64)
+        attention_mask = inputs['attention_mask'].astype(np.int64)
+        feed = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        hidden = self.encoder.run(None, {k: v for k, v in feed.items() if k in self.encoder_inputs})[0]
+        # 译文长度上限按原文长度估算，避免短文本解码到max_length
+        max_new_tokens = min(self.max_length, int(input_ids.shape[1] * 2) + 10)
+        decoder_ids = self.greedy_decode(hidden, attention_mask, max_new_tokens)
+        return [text.strip() for text in self.tokenizer.batch_decode(decoder_ids, skip_special_tokens=True)]
+
+    def greedy_decode(self, hidden, attention_mask, max_new_tokens: int) -> np.ndarray:
+        """贪心解码，返回 (条数, 长度) 的token id，每步只把新的token和KV缓存输入解码器"""
+        batch_size = hidden.shape[0]
+        decoder_ids = np.full((batch_size, 1), self.start_id, dtype=np.int64)
+        finished = np.zeros(batch_size, dtype=bool)
+        past = {}
+        for step in range(max_new_tokens):
+            session = self.decoder if step == 0 else self.decoder_with_past
+            feed = {
+                'input_ids': decoder_ids if step == 0 else decoder_ids[:, -1:],
+                'encoder_hidden_states': hidden,
+                'encoder_attention_mask': attention_mask,
+            }
+            if self.merged:
+                feed['use_cache_branch'] = np.array([step > 0])
+                feed.update(empty_past(session, batch_size) if step == 0 else past)
+            else:
+                feed.update(past)
+            names = {item.name for item in session.get_inputs()}
+            outputs = session.run(None, {k: v for k, v in feed.items() if k in names})
+            for item, value in zip(session.get_outputs(), outputs):
+                # 编码器部分的缓存在第一步算出后不再变化（带缓存的解码器不再输出）
+                if item.name.startswith('present.') and (step == 0 or '.encoder.' not in item.name):
+                    past['past_key_values.' + item.name[len('present.'):]] = value
+
+            logits = outputs[0][:, -1, :]
+            logits[:, self.pad_id] = -np.inf
+            next_ids = np.where(finished, self.pad_id, logits.argmax(axis=-1)).astype(np.int64)
+            decoder_ids = np.concatenate([decoder_ids, next_ids[:, None]], axis=1)
+            finished |= next_ids == self.eos_id
+            if finished.all():
+                break
+        return decoder_ids
+
+
+class LocalBackend:
+    """
+    各线程调用translate()提交文本后等待结果；后台一个线程在max_wait秒内攒够请求，
+    按语言分组、按长度分桶后批量推理。推理本身的并行交给onnxruntime的intra_op线程
+    """
+
+    def __init__(self, models: dict, intra_op_threads: int = 0, inter_op_threads: int = 1,
+                 max_batch_size: int = 32, max_batch_tokens: int = 4096, max_wait: float = 0.02,
+                 max_length: int = 256):
+        self.model_dirs = models  # 语言 -> 模型目录
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait
+        self.max_length = max_length
+        self.models = {}  # 语言 -> OnnxSeq2SeqModel，首次使用时加载
+        self.segments = 0  # 累计翻译的文本数
+        self.seconds = 0.0  # 累计推理耗时
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def supports(self, language) -> bool:
+        return language in self.model_dirs
+
+    def session_options(self):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads  # 0为onnxruntime默认（物理核心数）
+        options.inter_op_num_threads = self.inter_op_threads
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return options
+
+    def model(self, language) -> OnnxSeq2SeqModel:
+        with self._lock:
+            if language not in self.models:
+                if not self.supports(language):
+                    raise LocalBackendError(f"没有{language}的本地翻译模型")
+                start = time.perf_counter()
+                self.models[language] = OnnxSeq2SeqModel(self.model_dirs[language], self.session_options(),
+                                                         self.max_length)
+                logger.info(f"本地翻译模型已加载：{language}，耗时{time.perf_counter() - start:.2f}s")
+            return self.models[language]
+
+    def translate(self, texts: list, language) -> list:
+        """翻译一组文本，返回与texts顺序一致的译文；可在多个线程中同时调用"""
+        if not texts:
+            return []
+        self.model(language)  # 模型加载失败时直接在调用方线程抛出
+        future = Future()
+        self._queue.put((list(texts), language, future))
+        self._ensure_worker()
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='local-translate', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            # 攒一小段时间的请求，合并成更大的批次
+            deadline = time.monotonic() + self.max_wait
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    jobs.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            by_language = {}
+            for job in jobs:
+                by_language.setdefault(job[1], []).append(job)
+            for language, language_jobs in by_language.items():
+                try:
+                    self._run_jobs(language, language_jobs)
+                except Exception as e:
+                    logger.error(f"本地翻译失败{e}")
+                    for _, _, future in language_jobs:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def _run_jobs(self, language, jobs):
+        texts = list(dict.fromkeys(text for job_texts, _, _ in jobs for text in job_texts))
+        model = self.model(language)
+        start = time.perf_counter()
+        translated = {}
+        for batch in bucket_batches(model.lengths(texts), self.max_batch_size, self.max_batch_tokens):
+            batch_texts = [texts[index] for index in batch]
+            translated.update(zip(batch_texts, model.generate(batch_texts)))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.segments += len(texts)
+            self.seconds += elapsed
+        logger.info(f"本地翻译{language}：{len(texts)}段，耗时{elapsed:.2f}s，{len(texts) / max(elapsed, 1e-9):.1f}段/s")
+        for job_texts, _, future in jobs:
+            future.set_result([translated[text] for text in job_texts])
+
+    def stats(self) -> dict:
+        return {
+            "segments": self.segments,
+            "seconds": self.seconds,
+            "segments_per_sec": self.segments / self.seconds if self.seconds else 0.0,
+        }
+
+
+# 进程内共享：模型只加载一次
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_local_backend(**options) -> LocalBackend:
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            _BACKEND = LocalBackend(**options)
+    return _BACKEND
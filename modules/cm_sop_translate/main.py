@@ -17,13 +17,15 @@ import time
 from docx import Document
 
 from modules.cm_sop_translate.excel_process import xls_to_xlsx, get_content, add_translation, create_new_excel, \
-    ensure_excel_closed, apply_excel_template
+    ensure_excel_closed, apply_excel_template, collect_excel_texts, read_excel_texts
 from modules.common.log import setup_logger
 from modules.cm_sop_translate.config.config import config
 from modules.cm_sop_translate.auth import check_license, login
 from modules.cm_sop_translate.doc_process import doc_to_docx, DocumentContent, set_paper_size_format, \
     add_content, add_cover_translation, add_paragraph_translation, add_cover, add_table_translation, \
-    add_header_translation, add_footer_translation
+    add_header_translation, add_footer_translation, collect_document_texts, collect_document_priorities
+from modules.cm_sop_translate.metrics import PLAN_DOCUMENT
+from modules.cm_sop_translate.plan import TranslationPlan
 from modules.cm_sop_translate.template import apply_header_format, apply_footer_format, apply_template
 from modules.cm_sop_translate.translator import Translator
 
@@ -33,116 +35,252 @@ logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
 def text_translate(language):
     original_text = input("请输入待翻译内容：\n").strip()
     translator = Translator()
+    translator.metrics.begin('文本翻译')
+    # 流式输出，边翻译边显示
     for lang in language:
-        res = translator.translate(original_text, language=lang)
+        print(f"{lang}: ", end='', flush=True)
+        res = ''
+        for piece in translator.translate_stream(original_text, language=lang):
+            print(piece, end='', flush=True)
+            res += piece
+        print()
         logger.info(f"{lang}: {res}")
+    translator.metrics.end()
 
 
-def docx_translate(language):
+def docx_translate(language, input_folder=None, dry_run=False, deadline=None):
+    """deadline为限时（秒）：到时不再请求模型，未翻译的段落保留原文并标注，所有文件仍按时生成"""
     # 设置输入文件夹路径
-    input_folder = ""
-    while input_folder.strip() == "":
+    while not input_folder or input_folder.strip() == "":
         input_folder = input("请输入待翻译的文件目录：\n")
 
+    # 只预估请求次数、token和耗时，不发送请求、不生成文件；.doc文件需要转换格式（会写入文件），不预估
+    if dry_run:
+        translator = Translator()
+        documents = [extract_docx(input_folder, filename) for filename in list_docx_files(input_folder, convert=False)]
+        plan = TranslationPlan(translator, language)
+        for document in documents:
+            plan.add(document['filename'], document['texts'])
+        return print_estimate(plan.estimate(), list_legacy_files(input_folder, '.doc'))
+
     # 设置输出文件夹路径（二级文件夹）
     output_folder = os.path.join(input_folder, "translate_output")
     os.makedirs(output_folder, exist_ok=True)
 
     # 初始化翻译器
     translator = Translator()
+    translator.set_deadline(deadline)
+    # 翻译埋点与warning.txt放在一起
+    metrics_path = os.path.join(output_folder, "translate_metrics.jsonl")
+
+    filenames = list_docx_files(input_folder)
+    if config.FOLDER_PLAN:
+        # 第一阶段：读取所有文件，收集文本去重后统一翻译一次
+        documents = [extract_docx(input_folder, filename) for filename in filenames]
+        plan = TranslationPlan(translator, language)
+        for document in documents:
+            plan.add(document['filename'], document['texts'], document['priorities'])
+        plan.report()
+        translator.metrics.begin(PLAN_DOCUMENT)
+        plan.execute(display=True)
+        translator.metrics.end(metrics_path)
+        # 第二阶段：逐个文件写入，译文直接取本次运行的翻译结果
+        for document in documents:
+            translator.metrics.begin(document['filename'])
+            write_docx(document, translator, language, output_folder)
+            write_degraded_warning(output_folder, translator.metrics.end(metrics_path))
+    else:
+        for filename in filenames:
+            document = extract_docx(input_folder, filename)
+            translator.metrics.begin(filename)
+            # 整篇文档的文本先一次并发翻译，后续各部分直接取本次运行的翻译结果
+            translator.engine.translate_document(document['texts'], language, display=True,
+                                                 priorities=document['priorities'])
+            write_docx(document, translator, language, output_folder)
+            write_degraded_warning(output_folder, translator.metrics.end(metrics_path))
+
+    translator.metrics.summary(metrics_path)
+    logger.info(f"翻译缓存统计: {translator.cache.stats()}")
+    if translator.bundle is not None:
+        logger.info(f"翻译记忆包统计: {translator.bundle.stats()}")
+    if translator.fuzzy is not None:
+        logger.info(f"模糊翻译记忆统计: {translator.fuzzy.stats()}")
+    logger.info(f"所有文件处理完成！输出目录: {output_folder}")
+
 
-    # 遍历文件夹中的所有文件
+def list_docx_files(input_folder, convert=True):
+    """列出文件夹中待翻译的Word文档，.doc文件先转为.docx；convert为False时（预估）跳过.doc文件，不写入任何文件"""
+    filenames = []
     for filename in os.listdir(input_folder):
         logger.info(f"正在处理文件: {filename}")
 
         # 检查文件是否为Word文档（.docx格式）,若是.doc文件则转为.docx
-        if filename.endswith('.doc') and not filename.startswith('~$'):  # 忽略临时文件
+        if convert and filename.endswith('.doc') and not filename.startswith('~$'):  # 忽略临时文件
             doc_path = os.path.join(input_folder, filename)
             filename = os.path.basename(doc_to_docx(doc_path))
 
         if filename.endswith('.docx') and not filename.startswith('~$'):
-            input_file = os.path.join(input_folder, filename)
-
-            # 生成输出文件名（原文件名+时间）
-            current_time = datetime.datetime.now().strftime('%y%m%d%H%M%S')
-            file_base_name = os.path.splitext(filename)[0]  # 去掉扩展名
-            output_filename = f"{file_base_name}_translate_{current_time}.docx"
-            output_file = os.path.join(output_folder, output_filename)
-
-            print(f"********************start at {current_time}********************")
-
-            # 1. 读取原文档内容
-            doc = Document(input_file)
-            new_doc = DocumentContent(doc)
-            # 正文主体
-            content_data = new_doc.get_content(doc)
-            # 页眉、页脚
-            header_data = new_doc.get_header_content(doc)
-            footer_data = new_doc.get_footer_content(doc)
-            # picture&shape
-            pictures = new_doc.extract_pics(doc)
-            shapes = new_doc.extract_shapes(doc)
-
-            # 2. 标注关键信息：大标题、头信息，同时修改content_data内容
-            after_title = new_doc.flag_title(content_data)
-            after_preamble = new_doc.flag_preamble(content_data)
-            after_approve = new_doc.flag_approveTable(content_data)
-            after_main_text = new_doc.flag_main_text(content_data)
-
-            # 3. 拆分封面和正文
-            data = new_doc.split_cover_body_data(after_main_text)
-
-            # 4. 翻译
-            # ① 翻译封面
-            translated_cover_data = add_cover_translation(data['cover_data'], translator, language)
-            # ② 翻译正文内容
-            after_para = add_paragraph_translation(data['body_data'], translator, language)
-            translated_body_data = add_table_translation(after_para, translator, language)
-            # ③ 翻译页眉、页脚
-            translated_header_data = add_header_translation(header_data, translator, language)
-            translated_footer_data = add_footer_translation(footer_data, translator, language)
-
-            # 5. 处理内容
-            formatted_content = apply_template(body_data=translated_body_data, header_data=translated_header_data,
-                                               footer_data=translated_footer_data, cover_data=translated_cover_data)
-
-            # 6. 创建新文档
-            create_new_document(formatted_content, output_file, 2)
-
-            # 7. 记录此文件存在图片或者形状
-            log_path = os.path.join(output_folder, "warning.txt")
-            log_pic = ""
-            log_shape = ""
-            error_doc = ""
-            current_time = datetime.datetime.now().strftime('%y-%m-%d %H:%M:%S')
-            if len(pictures) > 0:
-                log_pic = f"{current_time}: {filename}存在{len(pictures)}张图片！\n"
-            if len(shapes) > 0:
-                log_shape = f"{current_time}: {filename}存在{len(shapes)}个形状！\n"
-            if len(new_doc.errors) > 0:
-                error_doc = f"{current_time}: {filename}中{new_doc.errors}\n"
-            if (log_pic+log_shape+error_doc).strip():
-                with open(log_path, "a", encoding="utf-8") as f:
-                    f.write(log_pic+log_shape+error_doc)
-            logger.info(f"已完成翻译: {output_filename}")
-
-    logger.info(f"所有文件处理完成！输出目录: {output_folder}")
-
-
-def excel_translate(language):
+            filenames.append(filename)
+    return list(dict.fromkeys(filenames))
+
+
+def extract_docx(input_folder, filename):
+    """读取Word文档内容并标注、拆分封面和正文，同时收集需要翻译的文本"""
+    input_file = os.path.join(input_folder, filename)
+    current_time = datetime.datetime.now().strftime('%y%m%d%H%M%S')
+    print(f"********************start at {current_time}********************")
+
+    # 1. 读取原文档内容
+    doc = Document(input_file)
+    new_doc = DocumentContent(doc)
+    # 正文主体
+    content_data = new_doc.get_content(doc)
+    # 页眉、页脚
+    header_data = new_doc.get_header_content(doc)
+    footer_data = new_doc.get_footer_content(doc)
+    # picture&shape
+    pictures = new_doc.extract_pics(doc)
+    shapes = new_doc.extract_shapes(doc)
+
+    # 2. 标注关键信息：大标题、头信息，同时修改content_data内容
+    after_title = new_doc.flag_title(content_data)
+    after_preamble = new_doc.flag_preamble(content_data)
+    after_approve = new_doc.flag_approveTable(content_data)
+    after_main_text = new_doc.flag_main_text(content_data)
+
+    # 3. 拆分封面和正文
+    data = new_doc.split_cover_body_data(after_main_text)
+
+    return {
+        "filename": filename,
+        "new_doc": new_doc,
+        "data": data,
+        "header_data": header_data,
+        "footer_data": footer_data,
+        "pictures": pictures,
+        "shapes": shapes,
+        "texts": collect_document_texts(data['cover_data'], data['body_data'], header_data, footer_data),
+        "priorities": collect_document_priorities(data['cover_data'], data['body_data'], header_data, footer_data),
+    }
+
+
+def write_docx(document, translator, language, output_folder):
+    """把译文加入文档内容并生成新文档"""
+    filename = document['filename']
+    new_doc = document['new_doc']
+    data = document['data']
+
+    # 生成输出文件名（原文件名+时间）
+    current_time = datetime.datetime.now().strftime('%y%m%d%H%M%S')
+    file_base_name = os.path.splitext(filename)[0]  # 去掉扩展名
+    output_filename = f"{file_base_name}_translate_{current_time}.docx"
+    output_file = os.path.join(output_folder, output_filename)
+
+    # 4. 翻译
+    # ① 翻译封面
+    translated_cover_data = add_cover_translation(data['cover_data'], translator, language)
+    # ② 翻译正文内容
+    after_para = add_paragraph_translation(data['body_data'], translator, language)
+    translated_body_data = add_table_translation(after_para, translator, language)
+    # ③ 翻译页眉、页脚
+    translated_header_data = add_header_translation(document['header_data'], translator, language)
+    translated_footer_data = add_footer_translation(document['footer_data'], translator, language)
+
+    # 5. 处理内容
+    formatted_content = apply_template(body_data=translated_body_data, header_data=translated_header_data,
+                                       footer_data=translated_footer_data, cover_data=translated_cover_data)
+
+    # 6. 创建新文档
+    create_new_document(formatted_content, output_file, 2)
+
+    # 7. 记录此文件存在图片或者形状
+    log_path = os.path.join(output_folder, "warning.txt")
+    log_pic = ""
+    log_shape = ""
+    error_doc = ""
+    current_time = datetime.datetime.now().strftime('%y-%m-%d %H:%M:%S')
+    if len(document['pictures']) > 0:
+        log_pic = f"{current_time}: {filename}存在{len(document['pictures'])}张图片！\n"
+    if len(document['shapes']) > 0:
+        log_shape = f"{current_time}: {filename}存在{len(document['shapes'])}个形状！\n"
+    if len(new_doc.errors) > 0:
+        error_doc = f"{current_time}: {filename}中{new_doc.errors}\n"
+    if (log_pic+log_shape+error_doc).strip():
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(log_pic+log_shape+error_doc)
+    # 每个文件完成后写入翻译缓存
+    translator.flush()
+    logger.info(f"已完成翻译: {output_filename}")
+    return output_file
+
+
+def excel_translate(language, input_folder=None, dry_run=False, deadline=None):
+    """deadline为限时（秒），单元格文本长的先翻译，到时未翻译的保留原文并标注"""
     # 设置输入文件夹路径
-    input_folder = ""
-    while input_folder.strip() == "":
+    while not input_folder or input_folder.strip() == "":
         input_folder = input("请输入待翻译的文件目录：\n")
 
+    # 只预估请求次数、token和耗时，不发送请求、不生成文件；.xls文件需要转换格式（会写入文件），不预估
+    # 只读方式读取单元格，不关闭用户已打开的Excel，文本框中的文字不预估
+    if dry_run:
+        translator = Translator()
+        plan = TranslationPlan(translator, language)
+        for filename in list_xlsx_files(input_folder, convert=False):
+            plan.add(filename, read_excel_texts(os.path.join(input_folder, filename)))
+        return print_estimate(plan.estimate(), list_legacy_files(input_folder, '.xls'))
+
     # 设置输出文件夹路径（二级文件夹）
     output_folder = os.path.join(input_folder, "translate_output")
     os.makedirs(output_folder, exist_ok=True)
 
     # 初始化翻译器
     translator = Translator()
+    translator.set_deadline(deadline)
+    metrics_path = os.path.join(output_folder, "translate_metrics.jsonl")
+
+    filenames = list_xlsx_files(input_folder)
+    if config.FOLDER_PLAN:
+        # 第一阶段：读取所有文件，收集文本去重后统一翻译一次
+        workbooks = [(filename, extract_xlsx(input_folder, filename)) for filename in filenames]
+        plan = TranslationPlan(translator, language)
+        for filename, content_data in workbooks:
+            plan.add(filename, collect_excel_texts(content_data, 'replace_multi'))
+        plan.report()
+        translator.metrics.begin(PLAN_DOCUMENT)
+        plan.execute(display=True)
+        translator.metrics.end(metrics_path)
+        # 第二阶段：逐个文件写入，译文直接取本次运行的翻译结果
+        for filename, content_data in workbooks:
+            translator.metrics.begin(filename)
+            write_xlsx(input_folder, filename, content_data, translator, language, output_folder)
+            write_degraded_warning(output_folder, translator.metrics.end(metrics_path))
+    else:
+        for filename in filenames:
+            content_data = extract_xlsx(input_folder, filename)
+            translator.metrics.begin(filename)
+            write_xlsx(input_folder, filename, content_data, translator, language, output_folder)
+            write_degraded_warning(output_folder, translator.metrics.end(metrics_path))
+
+    translator.metrics.summary(metrics_path)
+    logger.info(f"所有文件处理完成！输出目录: {output_folder}")
+    logger.info(f"翻译缓存统计: {translator.cache.stats()}")
+    if translator.bundle is not None:
+        logger.info(f"翻译记忆包统计: {translator.bundle.stats()}")
+    if translator.fuzzy is not None:
+        logger.info(f"模糊翻译记忆统计: {translator.fuzzy.stats()}")
+
+
+def list_legacy_files(input_folder, extension):
+    """文件夹中需要先转换格式的旧版文件（.doc、.xls），已有转换结果的除外，预估时列出为未预估"""
+    filenames = os.listdir(input_folder)
+    return [filename for filename in filenames
+            if filename.endswith(extension) and not filename.startswith('~$')
+            and os.path.splitext(filename)[0] + extension + 'x' not in filenames]
 
-    # 遍历文件夹中的所有文件
+
+def list_xlsx_files(input_folder, convert=True):
+    """列出文件夹中待翻译的Excel文件，.xls文件先转为.xlsx；convert为False时（预估）跳过.xls文件，不写入任何文件"""
+    filenames = []
     for filename in os.listdir(input_folder):
         logger.info(f"正在处理文件: {filename}")
 
@@ -151,41 +289,87 @@ def excel_translate(language):
             logger.info("这是输出文件夹")
             continue
         # 检查文件是否为Excel文档（.xlsx格式）,若是.doc文件则转为.xlsx
-        if filename.endswith('.xls') and not filename.startswith('~$'):  # 忽略临时文件
+        if convert and filename.endswith('.xls') and not filename.startswith('~$'):  # 忽略临时文件
             doc_path = os.path.join(input_folder, filename)
             filename = os.path.basename(xls_to_xlsx(doc_path))
 
         if filename.endswith('.xlsx') and not filename.startswith('~$'):
-            input_file = os.path.join(input_folder, filename)
+            filenames.append(filename)
+    return list(dict.fromkeys(filenames))
+
+
+def extract_xlsx(input_folder, filename):
+    """读取Excel文件内容"""
+    input_file = os.path.join(input_folder, filename)
+    current_time = datetime.datetime.now().strftime('%y%m%d%H%M%S')
+    print(f"********************start at {current_time}********************")
+
+    # 确保没有残留的Excel进程
+    ensure_excel_closed()
+    # 等待一段时间确保Excel完全关闭
+    time.sleep(2)
+
+    # 1. 读取原始内容
+    return get_content(input_file)
+
 
-            # 生成输出文件名（原文件名+时间）
-            current_time = datetime.datetime.now().strftime('%y%m%d%H%M%S')
-            # file_base_name = os.path.splitext(filename)[0]  # 去掉扩展名
-            # output_filename = f"{file_base_name}_translate_{current_time}.xlsx"
-            # output_file = os.path.join(output_folder, output_filename)
+def write_xlsx(input_folder, filename, content_data, translator, language, output_folder):
+    """把译文写入单元格并生成新文件"""
+    input_file = os.path.join(input_folder, filename)
 
-            print(f"********************start at {current_time}********************")
+    # 2. 翻译
+    translated_data = add_translation(content_data, translator, language, 'replace_multi')
 
-            # 确保没有残留的Excel进程
-            ensure_excel_closed()
-            # 等待一段时间确保Excel完全关闭
-            time.sleep(2)
+    # 3. 处理数据内容，使其符合创建新文档格式
+    formatted_data = apply_excel_template(translated_data)
 
-            # 1. 读取原始内容
-            content_data = get_content(input_file)
+    # 4. 创建新文档，替换单元格内容
+    output_filename = create_new_excel(output_folder, formatted_data, 'simple', input_file)
 
-            # 2. 翻译
-            translated_data = add_translation(content_data, translator, language, 'replace_multi')
+    # 每个文件完成后写入翻译缓存
+    translator.flush()
+    logger.info(f"已完成翻译: {output_filename}")
+    return output_filename
 
-            # 3. 处理数据内容，使其符合创建新文档格式
-            formatted_data = apply_excel_template(translated_data)
 
-            # 4. 创建新文档，替换单元格内容
-            output_filename = create_new_excel(output_folder, formatted_data, 'simple', input_file)
+def write_degraded_warning(output_folder, report):
+    """限时翻译未翻译的段落记入warning.txt，便于人工补译"""
+    if not report['degraded_texts']:
+        return
+    current_time = datetime.datetime.now().strftime('%y-%m-%d %H:%M:%S')
+    lines = [f"{current_time}: {report['document']}限时翻译有{len(report['degraded_texts'])}段未翻译，"
+             f"译文处保留原文并标注{config.DEADLINE['marker']}：\n"]
+    lines += [f"    [{item['language']}] {item['text']}\n" for item in report['degraded_texts']]
+    with open(os.path.join(output_folder, "warning.txt"), "a", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def input_deadline():
+    """输入翻译时限（分钟），直接回车为不限时，返回秒数或None"""
+    while True:
+        value = input("请输入翻译时限（分钟，直接回车为不限时）：\n").strip()
+        if not value:
+            return None
+        try:
+            return float(value) * 60
+        except ValueError:
+            print("输入错误，请重新输入")
 
-            logger.info(f"已完成翻译: {output_filename}")
 
-        logger.info(f"所有文件处理完成！输出目录: {output_folder}")
+def print_estimate(estimate, skipped=None):
+    """打印翻译预估结果，skipped为需要先转换格式、未预估的文件"""
+    minutes, seconds = divmod(int(estimate['seconds']), 60)
+    print("-" * 60)
+    print(f"文件数：{estimate['files']}    文本段数：{estimate['total']}    去重后：{estimate['unique']}")
+    print(f"词库、规则、缓存未命中（待翻译）：{estimate['pending']}    其中长段落：{estimate['long_texts']}")
+    print(f"预计请求：{estimate['api_calls']}次    输入约{estimate['prompt_tokens']} token    "
+          f"输出约{estimate['completion_tokens']} token    费用约{estimate['cost']:.2f}元")
+    print(f"并发{estimate['concurrency']}时预计耗时：{minutes}分{seconds}秒")
+    if skipped:
+        print(f"以下{len(skipped)}个文件需要先转换格式，未预估：{'、'.join(skipped)}")
+    print("-" * 60)
+    estimate['skipped_files'] = skipped or []
+    return estimate
 
 
 def create_new_document(data, output_path, type):
@@ -236,7 +420,8 @@ def main():
               "1. 文本翻译\n"
               "2. 文档翻译\n"
               "3. excel翻译\n"
-              "4. 退出")
+              "4. 翻译预估（只统计请求次数、token和耗时，不发送请求）\n"
+              "5. 退出")
         option = input().strip()
         language = ['英语', '越南语']
         if option == '1':
@@ -244,11 +429,19 @@ def main():
             text_translate(language)
         elif option == '2':
             print(f"当前目标语言为{language}")
-            docx_translate(language)
+            docx_translate(language, deadline=input_deadline())
         elif option == '3':
             print(f"当前目标语言为{language}")
-            excel_translate(language)
+            excel_translate(language, deadline=input_deadline())
         elif option == '4':
+            kind = input("请选择预估的文件类型(请输入序号)：\n1. 文档\n2. excel\n").strip()
+            if kind == '1':
+                docx_translate(language, dry_run=True)
+            elif kind == '2':
+                excel_translate(language, dry_run=True)
+            else:
+                print("输入错误，请重新输入")
+        elif option == '5':
             print("\n感谢使用！程序即将退出...")
             input("按回车键关闭窗口...")
             sys.exit(0)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : masking.py
+@Author  : Shawn
+@Date    : 2026/10/19 0:20
+@Info    : 占位符遮盖：翻译前把文本中的网址、数字日期、文件编号/料号、版本号、数字及单位替换为{1}、{2}…，
+           译文返回后再按编号换回原值。少发token，编号、数字不会被模型改动；
+           只有数字不同的文本（如不同版本的SOP）遮盖后相同，共用一条翻译缓存
+"""
+
+import re
+
+from modules.cm_sop_translate.prefilter import CODE_PATTERN, DATE_PATTERN, HAN_PATTERN, NUMBER_PATTERN, \
+    VERSION_PATTERN
+
+URL_PATTERN = re.compile(r'(?:https?://|www\.)[^\s　-〿一-鿿＀-￯]+')
+# 中文日期：2024年3月5日、3月5日。整体匹配但不遮盖，由模型按目标语言的格式翻译（拆成{1}年{2}月{3}日后模型无法改写格式）
+CJK_DATE_PATTERN = re.compile(r'\d{4}\s*年\s*\d{1,2}\s*月(?:\s*\d{1,2}\s*[日号])?|\d{1,2}\s*月\s*\d{1,2}\s*[日号]')
+# 按顺序尝试：数字及单位放在编号前面（否则"10N·m"会被当作编号"10N"截断），
+# 数字前后不能紧挨字母（避免截断英文单词，如"5 mother"中的m）
+MASK_PATTERN = re.compile('|'.join([
+    f'(?:{CJK_DATE_PATTERN.pattern})',
+    f'(?:{URL_PATTERN.pattern})',
+    f'(?:{DATE_PATTERN.pattern})',
+    rf'(?<![A-Za-z0-9])(?:{NUMBER_PATTERN.pattern})(?![A-Za-z·])',
+    f'(?:{CODE_PATTERN.pattern})',
+    f'(?:{VERSION_PATTERN.pattern})',
+]))
+PLACEHOLDER_PATTERN = re.compile(r'\{(\d+)\}')
+PARTIAL_PLACEHOLDER_PATTERN = re.compile(r'\{\d*')  # 流式输出中还没输出完的占位符
+DIGIT_PATTERN = re.compile(r'\d')
+
+
+def mask_text(text: str):
+    """
+    返回 (遮盖后的文本, 占位值列表)，第i个占位符{i}对应占位值[i-1]；
+    不含汉字（不需要模型翻译或已由规则过滤）、本身含花括号或没有可遮盖内容时原样返回，占位值为空
+    """
+    if not HAN_PATTERN.search(text) or '{' in text or '}' in text:
+        return text, []
+    values = []
+
+    def replace(match):
+        value = match.group(0)
+        # 只遮盖带数字的部分（如单独的大写缩写、网址以外的纯字母不遮盖），中文日期不遮盖
+        if (not DIGIT_PATTERN.search(value) and not URL_PATTERN.fullmatch(value)) or CJK_DATE_PATTERN.fullmatch(value):
+            return value
+        # 匹配两端的空白留在原文中，保持遮盖后的文本与原文排版一致
+        stripped = value.strip()
+        start = value.index(stripped)
+        values.append(stripped)
+        return f"{value[:start]}{{{len(values)}}}{value[start + len(stripped):]}"
+
+    masked = MASK_PATTERN.sub(replace, text)
+    return (masked, values) if values else (text, [])
+
+
+def unmask_text(translated: str, values: list):
+    """
+    把译文中的占位符换回原值；每个占位符必须恰好出现一次，否则返回None（调用方改为不遮盖重新翻译）
+    """
+    if translated is None:
+        return None
+    if not values:
+        return translated
+    if not isinstance(translated, str):
+        return None
+    found = PLACEHOLDER_PATTERN.findall(translated)
+    if sorted(found) != sorted(str(index) for index in range(1, len(values) + 1)):
+        return None
+    return PLACEHOLDER_PATTERN.sub(lambda match: values[int(match.group(1)) - 1], translated)
+
+
+def unmask_stream(pieces, values: list):
+    """
+    流式输出逐段换回占位符：段末是没输出完的占位符（如"{1"）时先留着，与下一段拼起来再换；
+    编号超出范围的占位符原样输出（由调用方读完后用unmask_text检查）
+    """
+    def replace(text):
+        return PLACEHOLDER_PATTERN.sub(
+            lambda match: values[int(match.group(1)) - 1] if 1 <= int(match.group(1)) <= len(values)
+            else match.group(0), text)
+
+    pending = ''
+    for piece in pieces:
+        pending += piece
+        cut = pending.rfind('{')
+        if values and cut != -1 and PARTIAL_PLACEHOLDER_PATTERN.fullmatch(pending, cut):
+            ready, pending = pending[:cut], pending[cut:]
+        else:
+            ready, pending = pending, ''
+        if ready:
+            yield replace(ready) if values else ready
+    if pending:
+        yield replace(pending)
+
+
+def is_masked(text: str) -> bool:
+    """缓存中的原文是否是遮盖后的文本"""
+    return PLACEHOLDER_PATTERN.search(text) is not None
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : metrics.py
+@Author  : Shawn
+@Date    : 2026/10/18 18:10
+@Info    : 翻译埋点：记录每次翻译走的路径（词库/本次运行/缓存/模型）、耗时、token用量、重试次数，
+           按文档汇总写入输出目录的translate_metrics.jsonl，运行结束时输出最慢的请求、缓存命中率、每个文件的token数
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+
+from modules.cm_sop_translate.config.config import config
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+# 不请求模型的路径：规则过滤（原样返回）、词库、本次运行已翻译、翻译记忆缓存、随安装包分发的翻译记忆、等待其他线程的相同请求
+LOOKUP_PATHS = ('skip', 'glossary', 'memo', 'cache', 'bundle', 'fuzzy', 'coalesced')
+# 请求接口的路径：单条、批量、多语言批量、流式
+API_PATHS = ('model', 'batch', 'multi', 'stream')
+# 翻译模型（接口或本地ONNX模型）
+MODEL_PATHS = API_PATHS + ('local',)
+# 限时翻译到时未请求模型、也没有查到译文的文本（保留原文并标注）
+DEGRADED_PATH = 'degraded'
+# 文件夹两阶段翻译时，统一翻译阶段的记录归到这个名字下，不算作文件
+PLAN_DOCUMENT = '翻译计划'
+
+
+def percentile(values: list, p: float) -> float:
+    """p取0~100，线性插值"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = math.floor(k)
+    high = math.ceil(k)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def cached_tokens(usage) -> int:
+    """
+    输入中命中接口前缀缓存的token数：DeepSeek为usage.prompt_cache_hit_tokens，
+    OpenAI兼容接口为usage.prompt_tokens_details.cached_tokens；都没有返回0
+    """
+    if usage is None:
+        return 0
+    hit = getattr(usage, 'prompt_cache_hit_tokens', None)
+    if hit is None:
+        details = getattr(usage, 'prompt_tokens_details', None)
+        hit = getattr(details, 'cached_tokens', None)
+    return hit or 0
+
+
+def token_cost(prompt_tokens: int, completion_tokens: int, cached: int = 0) -> float:
+    """按config.TOKEN_PRICE（每百万token单价）估算费用，命中缓存的输入token按缓存单价计"""
+    price = config.TOKEN_PRICE
+    return ((prompt_tokens - cached) * price['prompt'] + cached * price['prompt_cached']
+            + completion_tokens * price['completion']) / 1_000_000
+
+
+def aggregate(records: list) -> dict:
+    """汇总一组调用记录"""
+    paths = {}
+    for record in records:
+        paths[record['path']] = paths.get(record['path'], 0) + record['items']
+    model_records = [record for record in records if record['path'] in MODEL_PATHS]
+    latencies = [record['latency'] for record in model_records]
+    prompt_tokens = sum(record['prompt_tokens'] for record in records)
+    completion_tokens = sum(record['completion_tokens'] for record in records)
+    cached = sum(record['cached_tokens'] for record in records)
+    segments = sum(paths.values())
+    hits = sum(paths.get(path, 0) for path in LOOKUP_PATHS)
+    # 吞吐量：每秒翻译的文本数（按单次请求耗时累计，不含并发带来的提升），接口与本地模型分开统计
+    throughput = {}
+    for backend, backend_paths in (('api', API_PATHS), ('local', ('local',))):
+        backend_records = [record for record in model_records if record['path'] in backend_paths]
+        seconds = sum(record['latency'] for record in backend_records)
+        if backend_records:
+            throughput[backend] = sum(record['items'] for record in backend_records) / seconds if seconds else 0.0
+    return {
+        "segments": segments,
+        "paths": paths,
+        "hit_rate": hits / segments if segments else 0.0,
+        "skipped": paths.get('skip', 0),  # 规则过滤掉、省下的请求数
+        "coalesced": paths.get('coalesced', 0),  # 与其他线程的相同请求合并的文本数
+        "degraded": paths.get(DEGRADED_PATH, 0),  # 限时翻译未翻译的文本数
+        "api_calls": len(model_records),
+        "api_seconds": sum(latencies),
+        "segments_per_sec": throughput,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "retries": sum(record['retries'] for record in records),
+        "source_chars": sum(record['chars'] for record in model_records),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached,
+        "cached_ratio": cached / prompt_tokens if prompt_tokens else 0.0,  # 输入token命中接口前缀缓存的比例
+        "cost": token_cost(prompt_tokens, completion_tokens, cached),
+    }
+
+
+class TranslationMetrics:
+    """
+    调用记录按当前文档归类：main中处理每个文件前调用begin(文件名)，完成后调用end()写出该文档的汇总；
+    并发翻译的线程用run_as绑定发出请求时的文档，限时翻译到时后仍在进行的请求完成时不会记到下一个文件上
+    """
+
+    def __init__(self, limiter=None, hedger=None):
+        self.limiter = limiter  # 自适应限流器，汇总时附带当前并发数和限流次数
+        self.hedger = hedger  # 对冲请求，汇总时附带对冲次数、对冲前后的p99和额外开销
+        self.records = []
+        self.document = None
+        self.documents = {}  # 文档名 -> 汇总
+        self._start = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()  # 翻译线程绑定的文档
+
+    def record(self, path, texts, language, latency=0.0, prompt_tokens=0, completion_tokens=0, retries=0,
+               cached=0):
+        """
+        记录一次翻译；texts为本次翻译的原文（批量请求时为整批）
+        不在begin/end之间的调用（如生成翻译计划时预查缓存）不记录
+        """
+        document = self.current()
+        if document is None:
+            return
+        if isinstance(texts, str):
+            texts = [texts]
+        record = {
+            "document": document,
+            "path": path,
+            "language": language if isinstance(language, str) else '、'.join(language),
+            "items": len(texts),
+            "chars": sum(len(text) for text in texts),
+            "latency": latency,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "retries": retries,
+            "cached_tokens": cached,
+            "text": texts[0][:60] if texts else '',
+        }
+        if path in MODEL_PATHS:
+            record['texts'] = list(texts)  # 请求模型的全部原文，用于从运行日志中挖掘词库候选
+        with self._lock:
+            self.records.append(record)
+
+    def record_response(self, path, texts, language, start, response, retries=0):
+        """按接口应答的usage记录一次模型请求，start为发送请求前的time.perf_counter()"""
+        usage = getattr(response, 'usage', None)
+        self.record(path, texts, language, time.perf_counter() - start,
+                    getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0, retries,
+                    cached_tokens(usage))
+
+    def current(self):
+        """当前线程的记录归属的文档：run_as绑定的文档，没有绑定时为begin设置的当前文档"""
+        return getattr(self._local, 'document', self.document)
+
+    def run_as(self, document, func, *args):
+        """在当前线程中执行func(*args)，期间的记录都归到document（在线程池中执行翻译时使用）"""
+        bound = hasattr(self._local, 'document')
+        previous = getattr(self._local, 'document', None)
+        self._local.document = document
+        try:
+            return func(*args)
+        finally:
+            if bound:
+                self._local.document = previous
+            else:
+                del self._local.document
+
+    def begin(self, document):
+        with self._lock:
+            self.document = document
+            self._start = len(self.records)
+
+    def end(self, output_path=None) -> dict:
+        """结束当前文档，返回汇总；指定output_path时把汇总和该文档的调用记录追加写入（JSON lines）"""
+        with self._lock:
+            document = self.document
+            # 上一个文件到时后才完成的请求也可能追加在后面，只取本文档的记录
+            records = [record for record in self.records[self._start:] if record['document'] == document]
+            self.document = None
+        report = {"type": "document", "document": document, "time": time.strftime('%Y-%m-%d %H:%M:%S')}
+        report.update(aggregate(records))
+        if self.limiter:
+            report['rate_limit'] = self.limiter.stats()
+        # 写入文件时同一段文本可能多次查询，按语言、原文去重
+        degraded = dict.fromkeys((record['language'], record['text']) for record in records
+                                 if record['path'] == DEGRADED_PATH)
+        report['degraded_texts'] = [{"language": language, "text": text} for language, text in degraded]
+        self.documents[document] = report
+        logger.info(f"{document}：{report['segments']}段，规则过滤{report['skipped']}段，命中率{report['hit_rate']:.1%}，"
+                    f"请求{report['api_calls']}次（重试{report['retries']}次），"
+                    f"token {report['prompt_tokens']}+{report['completion_tokens']}"
+                    f"（前缀缓存命中{report['cached_ratio']:.1%}），费用约{report['cost']:.4f}")
+        if report['degraded_texts']:
+            logger.warning(f"{document}：限时翻译有{len(report['degraded_texts'])}段未翻译")
+        if output_path:
+            lines = [report] + [dict(record, type='call') for record in records]
+            self.write_lines(output_path, lines)
+        return report
+
+    def summary(self, output_path=None, slowest=5) -> dict:
+        """整次运行的汇总：最慢的请求、缓存命中率、每个文件的token数"""
+        with self._lock:
+            records = list(self.records)
+        summary = {"type": "summary", "time": time.strftime('%Y-%m-%d %H:%M:%S')}
+        summary.update(aggregate(records))
+        model_records = sorted((record for record in records if record['path'] in MODEL_PATHS),
+                               key=lambda record: record['latency'], reverse=True)
+        if self.limiter:
+            summary['rate_limit'] = self.limiter.stats()
+        if self.hedger:
+            summary['hedging'] = self.hedger.stats()
+        summary['slowest'] = [
+            {key: record[key] for key in ('document', 'path', 'language', 'items', 'chars', 'latency', 'text')}
+            for record in model_records[:slowest]
+        ]
+        summary['tokens_per_file'] = {
+            document: report['prompt_tokens'] + report['completion_tokens']
+            for document, report in self.documents.items()
+        }
+        # 文件夹两阶段翻译时请求都发生在统一翻译阶段，按文件平均更有参考意义
+        files = [document for document in self.documents if document != PLAN_DOCUMENT]
+        total_tokens = summary['prompt_tokens'] + summary['completion_tokens']
+        summary['avg_tokens_per_file'] = total_tokens / len(files) if files else 0.0
+
+        logger.info(f"翻译统计：共{summary['segments']}段，规则过滤{summary['skipped']}段，"
+                    f"合并重复请求{summary['coalesced']}段，命中率{summary['hit_rate']:.1%}，"
+                    f"请求{summary['api_calls']}次（重试{summary['retries']}次），耗时p50 {summary['p50']:.2f}s，"
+                    f"p95 {summary['p95']:.2f}s，token {summary['prompt_tokens']}+{summary['completion_tokens']}"
+                    f"（前缀缓存命中{summary['cached_ratio']:.1%}），"
+                    f"费用约{summary['cost']:.4f}")
+        # 文件夹两阶段翻译时同一段文本在统一翻译阶段和写入文件时都会记一次，按文件统计
+        summary['degraded_per_file'] = {document: len(self.documents[document]['degraded_texts'])
+                                        for document in files if self.documents[document]['degraded_texts']}
+        if summary['degraded_per_file']:
+            logger.warning(f"限时翻译未翻译的段数：{summary['degraded_per_file']}，已保留原文并标注")
+        for record in summary['slowest']:
+            logger.info(f"慢请求 {record['latency']:.2f}s [{record['path']}×{record['items']}] "
+                        f"{record['document']}：{record['text']}")
+        if self.limiter:
+            rate_limit = summary['rate_limit']
+            logger.info(f"限流：当前并发{rate_limit['concurrency']}（{rate_limit['low_concurrency']}~"
+                        f"{rate_limit['peak_concurrency']}），429/过载{rate_limit['throttles']}次，"
+                        f"延迟超标{rate_limit['slowdowns']}次，累计等待{rate_limit['wait_seconds']:.1f}s")
+        if self.hedger:
+            hedging = summary['hedging']
+            logger.info(f"对冲请求：{hedging['hedged']}次（占请求{hedging['hedge_ratio']:.1%}），先返回{hedging['wins']}次，"
+                        f"p99 {hedging['p99_unhedged']:.2f}s -> {hedging['p99']:.2f}s，"
+                        f"额外token {hedging['extra_prompt_tokens']}+{hedging['extra_completion_tokens']}，"
+                        f"额外费用约{hedging['extra_cost']:.4f}")
+        if summary['segments_per_sec']:
+            logger.info("吞吐量：" + "，".join(f"{'接口' if backend == 'api' else '本地模型'} {value:.1f}段/s"
+                                          for backend, value in summary['segments_per_sec'].items()))
+        logger.info(f"每个文件的token数：{summary['tokens_per_file']}，平均{summary['avg_tokens_per_file']:.0f}")
+        if output_path:
+            self.write_lines(output_path, [summary])
+        return summary
+
+    def expected_latency(self, default: float, recent: int = 50) -> float:
+        """最近recent次接口请求耗时的p95，用于判断剩余时间够不够再发一次请求；还没有请求时返回default"""
+        with self._lock:
+            latencies = [record['latency'] for record in self.records if record['path'] in API_PATHS]
+        return percentile(latencies[-recent:], 95) if latencies else default
+
+    @staticmethod
+    def write_lines(output_path, lines):
+        with open(output_path, 'a', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : plan.py
+@Author  : Shawn
+@Date    : 2026/10/18 14:20
+@Info    : 文件夹级翻译计划：第一阶段收集文件夹内所有文件的文本并按规范化文本去重，
+           第二阶段对去重后的文本统一翻译一次，之后各文件写入时直接取本次运行的翻译结果
+"""
+
+import heapq
+import json
+import logging
+
+from modules.cm_sop_translate.batching import build_batch_payload, estimate_tokens
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.metrics import token_cost
+from modules.cm_sop_translate.prompts import single_messages, batch_messages, multi_messages
+from modules.cm_sop_translate.tm_cache import cache_text
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+
+class TranslationPlan:
+    def __init__(self, translator, languages: list):
+        self.translator = translator
+        self.languages = languages
+        self.files = {}  # 文件名 -> 该文件需要翻译的文本（含重复）
+        self.unique = {}  # 规范化文本 -> 第一次出现时的原文
+        self.priorities = {}  # 规范化文本 -> 各文件中最高的优先级（越小越先翻译），限时翻译时使用
+
+    def add(self, filename, texts: list, priorities: dict = None):
+        """第一阶段：登记一个文件的全部文本，priorities为 原文 -> 优先级"""
+        texts = [text for text in texts if text.strip()]
+        self.files[filename] = texts
+        for text in texts:
+            key = cache_text(text)
+            self.unique.setdefault(key, text)
+            if priorities and text in priorities:
+                self.priorities[key] = min(self.priorities.get(key, priorities[text]), priorities[text])
+
+    @property
+    def total(self) -> int:
+        return sum(len(texts) for texts in self.files.values())
+
+    def unique_texts(self) -> list:
+        return list(self.unique.values())
+
+    def unique_priorities(self) -> dict:
+        return {self.unique[key]: priority for key, priority in self.priorities.items()}
+
+    def report(self) -> dict:
+        """
+        在发送任何请求之前，统计去重比例和预计请求次数：与execute()相同的规划（长段落分块、限时排序），
+        只查不计，不影响之后翻译时的命中率统计
+        """
+        _, long_texts, cached, requests = self.translator.engine.plan_document(
+            self.unique_texts(), self.languages, self.unique_priorities(), count=False)
+        total = self.total
+        unique = len(self.unique)
+        report = {
+            "files": len(self.files),
+            "total": total,
+            "unique": unique,
+            "unique_ratio": unique / total if total else 0.0,
+            "pending": {lang: len(cached[lang][1]) for lang in self.languages},  # 词库、缓存都未命中的文本数
+            "long_texts": len(long_texts),  # 需要分块翻译的长段落
+            "api_calls": len(requests),
+        }
+        logger.info(f"翻译计划：{report['files']}个文件，共{total}段文本，去重后{unique}段"
+                    f"（{report['unique_ratio']:.1%}），待请求{report['pending']}，预计请求{report['api_calls']}次")
+        return report
+
+    def request_messages(self, batch: list, languages: list) -> list:
+        """与Translator发送的请求相同的提示词，用于估算输入token"""
+        translator = self.translator
+        if len(languages) > 1:
+            payload = json.dumps(build_batch_payload(batch), ensure_ascii=False)
+            return multi_messages(payload, languages, {lang: translator.match_terms(batch, lang) for lang in languages})
+        terms = translator.match_terms(batch, languages[0])
+        if len(batch) == 1:
+            return single_messages(batch[0], languages[0], terms)
+        return batch_messages(json.dumps(build_batch_payload(batch), ensure_ascii=False), languages[0], terms)
+
+    def estimate(self) -> dict:
+        """
+        预估（不发送任何请求）：按词库、规则过滤、缓存查完之后实际要发送的请求批次，
+        估算请求次数、输入/输出token、费用，以及按配置的并发数翻译完所需的时间
+        """
+        settings = config.DRY_RUN
+        engine = self.translator.engine
+        _, long_texts, cached, requests = engine.plan_document(self.unique_texts(), self.languages, count=False)
+
+        prompt_tokens = 0
+        completion_tokens = 0
+        durations = []
+        for batch, languages in requests:
+            prompt = sum(estimate_tokens(message['content']) + 4 for message in self.request_messages(batch, languages))
+            # 译文按原文token数乘以系数估算，批量请求另加JSON的键、引号
+            completion = sum(estimate_tokens(text) for text in batch) * settings['output_ratio'] * len(languages)
+            if len(batch) > 1 or len(languages) > 1:
+                completion += 4 * len(batch) * len(languages)
+            prompt_tokens += prompt
+            completion_tokens += completion
+            durations.append(settings['base_latency'] + completion / settings['output_tokens_per_sec'])
+
+        # 按并发数模拟排队：每个请求交给最早空闲的并发槽位，耗时长的先发
+        slots = [0.0] * max(1, engine.concurrency)
+        for duration in sorted(durations, reverse=True):
+            heapq.heapreplace(slots, slots[0] + duration)
+
+        total = self.total
+        estimate = {
+            "files": len(self.files),
+            "total": total,
+            "unique": len(self.unique),
+            "long_texts": len(long_texts),  # 需要分块翻译的长段落
+            "pending": {lang: len(cached[lang][1]) for lang in self.languages},
+            "api_calls": len(requests),
+            "prompt_tokens": int(prompt_tokens),
+            "completion_tokens": int(completion_tokens),
+            "cost": token_cost(int(prompt_tokens), int(completion_tokens)),
+            "concurrency": engine.concurrency,
+            "seconds": max(slots),
+        }
+        logger.info(f"翻译预估：{estimate['files']}个文件，共{total}段文本，去重后{estimate['unique']}段，"
+                    f"待请求{estimate['pending']}，预计请求{estimate['api_calls']}次，"
+                    f"输入约{estimate['prompt_tokens']} token，输出约{estimate['completion_tokens']} token，"
+                    f"费用约{estimate['cost']:.2f}元，并发{estimate['concurrency']}时约需{estimate['seconds']:.0f}秒")
+        return estimate
+
+    def execute(self, display=False):
+        """第二阶段：去重后的文本统一翻译一次"""
+        return self.translator.engine.translate_document(self.unique_texts(), self.languages, display,
+                                                         self.unique_priorities())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : prefilter.py
+@Author  : Shawn
+@Date    : 2026/10/18 18:40
+@Info    : 翻译前的规则过滤：文件编号、版本号、日期、纯数字及单位、料号、已经是目标语言的文本等不需要翻译，
+           原样返回，不请求接口。只用预编译的正则和汉字占比判断，不做任何网络请求
+"""
+
+import re
+import unicodedata
+
+# 汉字（不含全角标点），汉字占比大于0的文本一律交给模型
+HAN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+# 文件编号、料号：大写字母和数字用-_./连接，至少含一个数字，如C2GM-Z13-000、QMS-Z000-A00、10-2345.01
+CODE_PATTERN = re.compile(r'[A-Z0-9]*\d[A-Z0-9]*(?:[-_./][A-Z0-9]+)+|[A-Z0-9]+(?:[-_./][A-Z0-9]+)*[-_./][A-Z0-9]*\d[A-Z0-9]*'
+                          r'|(?=[A-Z]*\d)(?=\d*[A-Z])[A-Z0-9]{2,20}')
+# 版本号：V1.0、Rev.2、REV B、A0、1.0.3
+VERSION_PATTERN = re.compile(r'(?:[Vv]|[Rr]ev\.?|REV\.?|Ver\.?|VER\.?)\s*[A-Z0-9]+(?:\.\d+)*|\d+(?:\.\d+){1,3}')
+# 日期：2025-10-18、2025/10/18、2025.10.18、18/10/2025，可带时间
+DATE_PATTERN = re.compile(r'(?:\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{4})(?:\s+\d{1,2}:\d{2}(?::\d{2})?)?')
+# 数字及单位：25±2℃、0.5mm、100%、1,000 pcs、3~5 min、≤10N·m
+NUMBER_PATTERN = re.compile(r'[<>≤≥=±+\-~～]?\s*\d+(?:[.,]\d+)*\s*'
+                            r'(?:(?:[-~～/×xX*±]|to)\s*\d+(?:[.,]\d+)*\s*)*'
+                            r'(?:%|‰|°C|℃|°|mm|cm|dm|km|m|μm|um|nm|kg|mg|g|t|mL|ml|L|l|V|mV|kV|A|mA|W|kW|Hz|kHz|MHz|'
+                            r'Pa|kPa|MPa|N|N·m|Nm|s|ms|min|h|pcs|PCS|EA|ea|rpm|dB|Ω|kΩ|lux|lx)?'
+                            r'(?:\s*(?:[-~～/×xX*±]|to)\s*\d+(?:[.,]\d+)*\s*'
+                            r'(?:%|°C|℃|mm|cm|m|kg|g|mL|L|V|A|W|Hz|MPa|N|s|min|h|pcs)?)*')
+# 只有标点、符号、空白
+SYMBOL_PATTERN = re.compile(r'[\W_]+')
+# 缩写：HSF、ISO、IATF（全大写，可带数字后缀如ISO9001已由CODE_PATTERN处理）
+ACRONYM_PATTERN = re.compile(r'[A-Z]{2,8}(?:\s+\d+(?::\d{4})?)?')
+# 英文：只有ASCII字母、数字、标点和空白
+ENGLISH_PATTERN = re.compile(r'[A-Za-z0-9\s!-/:-@\[-`{-~’‘“”–—…]+')
+# 越南语特有的字母（带声调或变音符号）
+VIETNAMESE_CHAR_PATTERN = re.compile(r'[ăâđêôơưĂÂĐÊÔƠƯàáảãạằắẳẵặầấẩẫậèéẻẽẹềếểễệìíỉĩịòóỏõọồốổỗộờớởỡợùúủũụừứửữựỳýỷỹỵ'
+                                     r'ÀÁẢÃẠẰẮẲẴẶẦẤẨẪẬÈÉẺẼẸỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌỒỐỔỖỘỜỚỞỠỢÙÚỦŨỤỪỨỬỮỰỲÝỶỸỴ]')
+LATIN_PATTERN = re.compile(r'[\sA-Za-z0-9\u00c0-\u024f\u1e00-\u1eff!-/:-@\[-`{-~’‘“”–—…]+')
+
+# 按顺序检查的规则：(原因, 正则)，整段完全匹配才算
+RULES = [
+    ('symbol', SYMBOL_PATTERN),
+    ('date', DATE_PATTERN),
+    ('version', VERSION_PATTERN),
+    ('number', NUMBER_PATTERN),
+    ('code', CODE_PATTERN),
+]
+# 只在目标语言为英语时原样返回的规则：PASS、OK这样的缩写、标签译成其他语言时仍需翻译
+# （词库中收录的缩写在规则过滤之前已按词库返回）
+ENGLISH_RULES = [
+    ('acronym', ACRONYM_PATTERN),
+]
+
+
+def is_target_language(text: str, language) -> bool:
+    """不含汉字的文本是否已经是目标语言"""
+    if language == '英语':
+        return ENGLISH_PATTERN.fullmatch(text) is not None and re.search(r'[A-Za-z]', text) is not None
+    if language == '越南语':
+        return LATIN_PATTERN.fullmatch(text) is not None and VIETNAMESE_CHAR_PATTERN.search(text) is not None
+    return False
+
+
+def classify(text: str, language):
+    """
+    返回不需要翻译的原因（symbol/date/version/number/code/acronym/target_language），需要翻译返回None
+    含汉字的文本一律返回None；缩写、英文只在目标语言为英语时原样返回
+    """
+    stripped = unicodedata.normalize('NFKC', text).strip()
+    if not stripped:
+        return 'symbol'
+    if HAN_PATTERN.search(stripped):
+        return None
+    for reason, pattern in RULES + (ENGLISH_RULES if language == '英语' else []):
+        if pattern.fullmatch(stripped):
+            return reason
+    if is_target_language(stripped, language):
+        return 'target_language'
+    return None
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : prompts.py
+@Author  : Shawn
+@Date    : 2026/10/18 19:10
+@Info    : 提示词构建：system消息只放固定的指令、术语对照（按术语排序）和模糊翻译记忆的参考译文（按原文排序），
+           待翻译的内容放在user消息中。同一语言、同样的术语得到逐字节相同的system前缀，接口侧的前缀缓存（context caching）才能命中。
+           内容中有占位符（masking.py）时在最后加一句保留占位符的要求，没有占位符的请求提示词不变
+"""
+
+
+def terms_prompt(terms: dict, language=None) -> str:
+    """把命中的术语拼成提示词，按术语排序保证同样的术语得到同样的文本；没有术语时返回空字符串"""
+    if not terms:
+        return ''
+    pairs = '；'.join(f"{term}={terms[term]}" for term in sorted(terms))
+    if language:
+        return f"{language}请使用以下术语译法：{pairs}。"
+    return f"请使用以下术语译法：{pairs}。"
+
+
+def references_prompt(references: dict, language=None) -> str:
+    """把相似原文的历史译文拼成提示词，放在术语之后（参考译文随内容变化，不影响前面的固定前缀）；没有时返回空字符串"""
+    if not references:
+        return ''
+    pairs = '；'.join(f"{source}={references[source]}" for source in sorted(references))
+    if language:
+        return f"以下是相似原文的{language}历史译文，请参考其用词和风格：{pairs}。"
+    return f"以下是相似原文的历史译文，请参考其用词和风格：{pairs}。"
+
+
+def placeholder_prompt(placeholders: bool) -> str:
+    """内容中有占位符时要求原样保留，没有时返回空字符串"""
+    return "{1}、{2}等占位符请原样保留。" if placeholders else ''
+
+
+def single_messages(text: str, language, terms: dict, references: dict = None, placeholders: bool = False) -> list:
+    """单条文本翻译：原文作为user消息"""
+    return [
+        {"role": "system",
+         "content": f"你是一名工业领域翻译工作者，请把用户给出的内容翻译成{language}，保持专业术语的准确性，"
+                    f"只需返回翻译后的文本，不要添加任何额外的解释或注释。{terms_prompt(terms)}{references_prompt(references)}"
+                    f"{placeholder_prompt(placeholders)}"
+         },
+        {"role": "user", "content": text},
+    ]
+
+
+def batch_messages(payload_json: str, language, terms: dict, references: dict = None,
+                   placeholders: bool = False) -> list:
+    """批量翻译：user消息为 {"1": 原文1, "2": 原文2, ...} 的JSON"""
+    return [
+        {"role": "system",
+         "content": f"你是一名工业领域翻译工作者，请将用户给出的JSON对象中每一项的值翻译成{language}，保持专业术语的准确性。"
+                    f"以JSON对象返回，键保持不变，值为翻译后的文本，不要添加任何额外的解释或注释。"
+                    f"{terms_prompt(terms)}{references_prompt(references)}{placeholder_prompt(placeholders)}"
+         },
+        {"role": "user", "content": payload_json},
+    ]
+
+
+def multi_messages(payload_json: str, languages: list, terms: dict, references: dict = None,
+                   placeholders: bool = False) -> list:
+    """多语言批量翻译：terms为 语言 -> {术语: 译文}，references为 语言 -> {相似原文: 译文}，按languages的顺序拼接"""
+    language_names = '、'.join(languages)
+    terms_text = ''.join(terms_prompt(terms[lang], lang) for lang in languages)
+    references = references or {}
+    terms_text += ''.join(references_prompt(references.get(lang), lang) for lang in languages)
+    terms_text += placeholder_prompt(placeholders)
+    return [
+        {"role": "system",
+         "content": f"你是一名工业领域翻译工作者，请将用户给出的JSON对象中每一项的值分别翻译成{language_names}，保持专业术语的准确性。"
+                    f"以JSON对象返回，键保持不变，值为以语言名（{language_names}）为键、对应译文为值的JSON对象，"
+                    f"不要添加任何额外的解释或注释。{terms_text}"
+         },
+        {"role": "user", "content": payload_json},
+    ]
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : rate_limiter.py
+@Author  : Shawn
+@Date    : 2026/10/18 20:50
+@Info    : 自适应限流：按每分钟请求数、每分钟token数的令牌桶放行请求，同时限制同时进行的请求数；
+           遇到429/过载时并发数乘性减小（AIMD），延迟正常时逐步加性增大，充分使用额度又不引发成片的429
+"""
+
+import logging
+import threading
+import time
+
+from modules.cm_sop_translate.config.config import config
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+
+class TokenBucket:
+    """每分钟补充rate_per_min个令牌，最多攒burst_seconds秒的量"""
+
+    def __init__(self, rate_per_min: float, burst_seconds: float = 10):
+        self.rate = rate_per_min / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now) -> float:
+        """还需等待多久才有amount个令牌（超过容量的按容量算，避免大请求永远等不到）"""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rpm: float = 600, tpm: float = 1000000, initial_concurrency: int = 8,
+                 min_concurrency: int = 1, max_concurrency: int = 16, target_latency: float = 30,
+                 increase: float = 1.0, decrease: float = 0.5, slow_decrease: float = 0.9, burst_seconds: float = 10):
+        self.requests = TokenBucket(rpm, burst_seconds)
+        self.tokens = TokenBucket(tpm, burst_seconds)
+        self.limit = float(initial_concurrency)  # 当前允许的并发数
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency  # 单次请求超过这个耗时视为接口变慢
+        self.increase = increase  # 每轮（约limit个请求）并发数增加多少
+        self.decrease = decrease  # 429/过载时并发数乘以该系数
+        self.slow_decrease = slow_decrease  # 接口变慢时并发数乘以该系数
+        self.inflight = 0
+        self.blocked_until = 0.0  # Retry-After要求的暂停截止时间
+        self.throttles = 0  # 429/过载次数
+        self.slowdowns = 0  # 延迟超标次数
+        self.wait_seconds = 0.0  # 累计在限流器中等待的时间
+        self.decreased_at = 0.0  # 上次因限流减小并发的时间，之前放行的请求再遇到429不重复减小
+        self.peak = self.limit
+        self.low = self.limit
+        self._cond = threading.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return max(self.min_concurrency, int(self.limit))
+
+    def acquire(self, tokens: int = 0) -> float:
+        """等待直到并发数、请求数、token额度都允许，再放行一个请求，返回放行的时间（传给release）"""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = max(0.0, self.blocked_until - now)
+                if self.inflight >= self.concurrency:
+                    # 并发已满，等有请求结束或并发数调整时被唤醒
+                    self._cond.wait(timeout=wait or None)
+                    continue
+                wait = max(wait, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                if wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    self.inflight += 1
+                    self.wait_seconds += now - start
+                    return now
+                self._cond.wait(timeout=wait)
+
+    def try_acquire(self, tokens: int = 0):
+        """
+        不等待：请求数、token额度都允许且没有在Retry-After暂停中时放行并返回放行时间，否则返回None；
+        用于对冲请求，其数量另有上限，不受并发数限制（并发满时正是需要对冲的时候），但计入进行中的请求
+        """
+        with self._cond:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                return None
+            if self.requests.wait_time(1, now) > 0 or self.tokens.wait_time(tokens, now) > 0:
+                return None
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.inflight += 1
+            return now
+
+    def release(self, started: float, latency=None, throttled=False, retry_after=None):
+        """
+        请求结束，started为acquire返回的放行时间
+        throttled为遇到429/过载，并发数乘性减小（同一批并发的请求只减一次），并按Retry-After暂停放行；
+        否则按耗时调整：超过target_latency小幅减小，正常时加性增大（每个请求增加increase/limit）
+        latency为None（其他错误）时不调整
+        """
+        with self._cond:
+            self.inflight -= 1
+            if throttled:
+                self.throttles += 1
+                now = time.monotonic()
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, now + retry_after)
+                if started >= self.decreased_at:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease)
+                    self.decreased_at = now
+                    logger.warning(f"接口限流，并发数降为{self.concurrency}")
+            elif latency is not None:
+                if latency > self.target_latency:
+                    self.slowdowns += 1
+                    self.limit = max(self.min_concurrency, self.limit * self.slow_decrease)
+                else:
+                    self.limit = min(self.max_concurrency, self.limit + self.increase / self.limit)
+            self.peak = max(self.peak, self.limit)
+            self.low = min(self.low, self.limit)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "peak_concurrency": int(self.peak),
+            "low_concurrency": max(self.min_concurrency, int(self.low)),
+            "throttles": self.throttles,
+            "slowdowns": self.slowdowns,
+            "wait_seconds": self.wait_seconds,
+        }
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : segmenter.py
+@Author  : Shawn
+@Date    : 2026/10/18 15:40
+@Info    : 长段落分句：按中文句末标点（。；！？）切分，再按token预算合并成若干块，分块并发翻译后按顺序拼回
+"""
+
+import re
+
+from modules.cm_sop_translate.batching import estimate_tokens
+
+# 在句末标点之后切分，标点留在前一句
+SENTENCE_PATTERN = re.compile(r'(?<=[。；！？;!?])')
+# 单句仍超出预算时，再按逗号切分
+CLAUSE_PATTERN = re.compile(r'(?<=[，,])')
+
+
+def split_pieces(text: str, max_tokens: int) -> list:
+    """切分成句子，超出预算的句子再按逗号切分；仍超出的保持原样，不强行截断"""
+    pieces = []
+    for sentence in SENTENCE_PATTERN.split(text):
+        if not sentence:
+            continue
+        if estimate_tokens(sentence) > max_tokens:
+            pieces.extend(clause for clause in CLAUSE_PATTERN.split(sentence) if clause)
+        else:
+            pieces.append(sentence)
+    return pieces
+
+
+def split_text(text: str, max_tokens: int = 150) -> list:
+    """
+    把长文本拆成若干块，每块不超过max_tokens（单句超出时除外），拼接后与原文完全一致；
+    未超出预算的文本返回[text]
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks = []
+    chunk = ''
+    for piece in split_pieces(text, max_tokens):
+        if chunk and estimate_tokens(chunk + piece) > max_tokens:
+            chunks.append(chunk)
+            chunk = ''
+        chunk += piece
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def join_chunks(translated_chunks: list) -> str:
+    """按顺序拼回分块的译文（目标语言英语、越南语均以空格分隔句子）"""
+    return ' '.join(chunk.strip() for chunk in translated_chunks if chunk.strip())
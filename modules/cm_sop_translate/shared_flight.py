@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : shared_flight.py
+@Author  : Shawn
+@Date    : 2026/10/18 23:40
+@Info    : 跨进程的请求合并：同一台电脑上多个翻译进程（每个文件夹一个进程、进程池）共用一个翻译缓存时，
+           请求前在缓存数据库的claims表中登记 (原文, 语言)，其他进程正在请求的文本等它写入缓存后直接取用，不重复请求。
+           登记带有效期，请求方异常退出时过期后由其他进程接手
+"""
+
+import logging
+import sqlite3
+import time
+
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.tm_cache import TranslationCache, cache_key
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+
+class SharedFlight:
+    def __init__(self, cache: TranslationCache, lease: float = 180, poll_interval: float = 0.2,
+                 max_poll_interval: float = 2.0):
+        self.cache = cache
+        self.lease = lease  # 登记的有效期（秒），应大于一次请求（含重试）的最长耗时
+        self.poll_interval = poll_interval  # 等待其他进程时查询的间隔，逐步加倍到max_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.collapsed = 0  # 累计从其他进程等到的文本数
+        self.wait_seconds = 0.0  # 累计等待其他进程的时间
+
+    def run(self, texts: list, languages: list, model, prompt_version, request, get=None):
+        """
+        request(需要本进程请求的原文列表)返回 语言 -> {原文: 译文}，译文由request写入缓存；
+        get(原文, 语言)从缓存取其他进程的译文，默认直接查缓存（缓存键与原文不同时由调用方提供，如遮盖占位符后）；
+        返回texts全部的 语言 -> {原文: 译文}，以及从其他进程等到的原文列表
+        """
+        get = get or (lambda text, language: self.cache.get(text, language, model, prompt_version))
+
+        keys = {text: [cache_key(text, language, model, prompt_version) for language in languages]
+                for text in texts}
+        results = {language: {} for language in languages}
+        shared = []
+        todo = list(dict.fromkeys(texts))
+        while todo:
+            own, others = self.claim(todo, keys)
+            if own:
+                try:
+                    reply = request(own)
+                finally:
+                    self.release([key for text in own for key in keys[text]])
+                for language in languages:
+                    results[language].update(reply[language])
+            todo = []
+            for text in self.wait(others, keys):
+                found = {language: get(text, language) for language in languages}
+                if None in found.values():
+                    # 对方请求失败或译文未写入缓存（如本地模型、未翻译），由本进程重新登记请求
+                    todo.append(text)
+                    continue
+                for language, res in found.items():
+                    results[language][text] = res
+                shared.append(text)
+        self.collapsed += len(shared)
+        return results, shared
+
+    def claim(self, texts: list, keys: dict):
+        """登记texts，返回 (所有语言都由本进程登记到的原文, 需要等待其他进程的原文)"""
+        try:
+            claimed = self.cache.claim([key for text in texts for key in keys[text]], self.lease)
+        except sqlite3.Error as e:
+            # 数据库忙或不可写时不协调，直接请求
+            logger.warning(f"跨进程登记失败{e}，直接请求")
+            return texts, []
+        own = [text for text in texts if all(key in claimed for key in keys[text])]
+        others = [text for text in texts if text not in own]
+        # 部分语言被其他进程登记的文本整体等待，本进程登记到的其余语言先放开，避免两边互相等待
+        partial = [key for text in others for key in keys[text] if key in claimed]
+        if partial:
+            self.release(partial)
+        return own, others
+
+    def release(self, keys: list):
+        try:
+            self.cache.release(keys)
+        except sqlite3.Error as e:
+            logger.warning(f"跨进程登记释放失败{e}，{self.lease}s后过期")
+
+    def wait(self, texts: list, keys: dict) -> list:
+        """等待其他进程请求完texts（登记删除或过期），返回texts"""
+        if not texts:
+            return texts
+        start = time.monotonic()
+        interval = self.poll_interval
+        pending = [key for text in texts for key in keys[text]]
+        while pending:
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+            try:
+                claimed = self.cache.claimed(pending)
+            except sqlite3.Error as e:
+                logger.warning(f"查询跨进程登记失败{e}，稍后重试")
+                continue
+            pending = [key for key in pending if key in claimed]
+        self.wait_seconds += time.monotonic() - start
+        return texts
+
+    def stats(self) -> dict:
+        return {"collapsed": self.collapsed, "wait_seconds": self.wait_seconds}
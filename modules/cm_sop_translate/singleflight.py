@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : singleflight.py
+@Author  : Shawn
+@Date    : 2026/10/18 19:40
+@Info    : 请求合并（single-flight）：并发翻译时同一段文本（如重复的表头）可能在缓存写入之前被多个线程同时请求，
+           同一个键同时只发一次请求，其余调用方等待并共用它的结果
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class _Call:
+    def __init__(self, owner):
+        self.owner = owner  # 发起请求的线程
+        self.future = Future()
+
+
+class SingleFlight:
+    def __init__(self):
+        self.collapsed = 0  # 累计合并掉的重复请求数
+        self._calls = {}  # 键 -> 进行中的请求
+        self._lock = threading.Lock()
+
+    def claim(self, keys):
+        """
+        登记要请求的键，返回 (本次新登记、需要本线程请求并resolve的键, 其他线程正在请求的键 -> Future)
+        本线程自己已登记的键（批量失败拆分重试时）两者都不包含，由调用方直接请求，不等待自己
+        """
+        owned = []
+        waiting = {}
+        owner = threading.get_ident()
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    self._calls[key] = _Call(owner)
+                    owned.append(key)
+                elif call.owner != owner:
+                    waiting[key] = call.future
+                    self.collapsed += 1
+        return owned, waiting
+
+    def resolve(self, results: dict):
+        """请求完成：results为 键 -> 结果，通知等待的调用方"""
+        with self._lock:
+            calls = [(self._calls.pop(key), value) for key, value in results.items() if key in self._calls]
+        for call, value in calls:
+            call.future.set_result(value)
+
+    def fail(self, keys, error: Exception):
+        """请求失败：等待的调用方收到同样的异常"""
+        with self._lock:
+            calls = [self._calls.pop(key) for key in keys if key in self._calls]
+        for call in calls:
+            call.future.set_exception(error)
+
+    def run(self, keys: dict, texts: list, request):
+        """
+        合并请求：keys为 原文 -> 键，request(需要请求的原文列表)返回 原文 -> 结果；
+        返回texts全部的 原文 -> 结果，以及从其他线程等到的原文列表
+        """
+        owned, waiting = self.claim(keys[text] for text in texts)
+        own_texts = [text for text in texts if keys[text] not in waiting]
+        try:
+            results = request(own_texts) if own_texts else {}
+        except BaseException as e:
+            self.fail(owned, e)
+            raise
+        owned = set(owned)
+        self.resolve({keys[text]: results.get(text) for text in own_texts if keys[text] in owned})
+
+        shared = [text for text in texts if keys[text] in waiting]
+        for text in shared:
+            results[text] = waiting[keys[text]].result()
+        return results, shared
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : term_matcher.py
+@Author  : Shawn
+@Date    : 2026/10/18 15:00
+@Info    : 术语匹配：用词库的键构建Aho-Corasick自动机，线性时间找出句子中出现的所有术语，
+           只把命中的术语对照传给模型，不必发送整个词库
+"""
+
+import re
+import threading
+import unicodedata
+from collections import deque
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def match_text(text: str) -> str:
+    """与词库的规范化一致：NFKC、去掉所有空白（不去标点，句中标点保持原位）"""
+    return WHITESPACE_PATTERN.sub('', unicodedata.normalize('NFKC', text))
+
+
+class TermMatcher:
+    """
+    Aho-Corasick自动机
+    goto[state]: 字符 -> 下一状态；fail[state]: 失配时跳转的状态；
+    output[state]: 以该状态结尾的术语下标；dict_link[state]: 沿失配链最近的一个有输出的状态
+    """
+
+    def __init__(self, terms: dict, min_length: int = 2):
+        self.terms = []  # [(术语, 译文)]
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [-1]
+        self.dict_link = [0]
+
+        for term, translation in terms.items():
+            if len(term) < min_length or not translation:
+                continue
+            self._add(term, len(self.terms))
+            self.terms.append((term, translation))
+        self._build()
+
+    def _add(self, term, term_index):
+        state = 0
+        for ch in term:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(-1)
+                self.dict_link.append(0)
+            state = next_state
+        self.output[state] = term_index
+
+    def _build(self):
+        """广度优先计算失配指针和输出链"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[next_state] = target
+                self.dict_link[next_state] = target if self.output[target] >= 0 else self.dict_link[target]
+
+    def find(self, text: str) -> list:
+        """返回所有命中位置 [(起始, 结束, 术语下标)]"""
+        matches = []
+        state = 0
+        goto = self.goto
+        fail = self.fail
+        for position, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if self.output[state] >= 0 else self.dict_link[state]
+            while hit:
+                term_index = self.output[hit]
+                matches.append((position + 1 - len(self.terms[term_index][0]), position + 1, term_index))
+                hit = self.dict_link[hit]
+        return matches
+
+    def match(self, text: str) -> dict:
+        """
+        返回句子中出现的术语 -> 译文，按出现顺序；
+        被更长的命中术语完全覆盖的短术语（如"编号"之于"文件编号"）不返回
+        """
+        matches = self.find(match_text(text))
+        matches.sort(key=lambda m: (m[0], -m[1]))
+        result = {}
+        covered_end = -1
+        for start, end, term_index in matches:
+            if end <= covered_end:
+                continue
+            covered_end = end
+            term, translation = self.terms[term_index]
+            result.setdefault(term, translation)
+        return result
+
+
+# 每个词库只在版本变化时重建：词库路径 -> (版本, TermMatcher)
+_MATCHERS = {}
+_MATCHERS_LOCK = threading.Lock()
+
+
+def get_term_matcher(index) -> TermMatcher:
+    """获取词库索引对应的术语匹配器，词库重新加载（版本变化）后自动重建"""
+    index.refresh()
+    cached = _MATCHERS.get(index.path)
+    if cached is not None and cached[0] == index.version:
+        return cached[1]
+    with _MATCHERS_LOCK:
+        cached = _MATCHERS.get(index.path)
+        if cached is None or cached[0] != index.version:
+            terms = {key: value for key, (_, value) in index.normalized.items()}
+            cached = (index.version, TermMatcher(terms))
+            _MATCHERS[index.path] = cached
+    return cached[1]
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : tm_bundle.py
+@Author  : Shawn
+@Date    : 2026/10/18 22:20
+@Info    : 翻译记忆的导入导出与分发：翻译记忆缓存与TMX互相导入导出（合并去重），
+           并可把TMX/缓存打包成紧凑的二进制文件放到_internal/config下随安装包分发，启动时内存映射（mmap），
+           新装的电脑第一次运行就能命中已有的译文。
+           二进制文件结构：文件头 | 按哈希排序的键哈希(uint64) | 译文偏移(uint64, count+1个) | 译文(UTF-8)，
+           键为 目标语言+规范化原文 的64位哈希，查询时二分查找，不需要把内容读入内存。
+           用法：
+           python -m modules.cm_sop_translate.tm_bundle export tm.tmx
+           python -m modules.cm_sop_translate.tm_bundle import a.tmx b.tmx
+           python -m modules.cm_sop_translate.tm_bundle build tm_bundle.bin a.tmx b.tmx --with-cache
+"""
+
+import argparse
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from xml.parsers import expat
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.masking import is_masked
+from modules.cm_sop_translate.tm_cache import cache_text
+from modules.common.log import setup_logger
+
+logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
+
+BUNDLE_MAGIC = b'SOPTMB01'
+BUNDLE_VERSION = 1
+# 文件头：magic、格式版本、条数
+BUNDLE_HEADER = struct.Struct('<8sII')
+XML_LANG = 'xml:lang'
+
+
+def bundle_hash(text: str, language) -> int:
+    raw = f"{language}\x1f{cache_text(text)}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), 'little')
+
+
+def language_code(language) -> str:
+    return config.TMX['languages'].get(language, language)
+
+
+def language_name(code: str):
+    """TMX的语言代码 -> 目标语言，en-US等带地区的代码按主语言匹配；不认识的返回None"""
+    code = code.lower()
+    for language, language_code_ in config.TMX['languages'].items():
+        if code == language_code_.lower() or code.split('-')[0] == language_code_.lower().split('-')[0]:
+            return language
+    return None
+
+
+def write_tmx(path: str, entries) -> int:
+    """
+    导出TMX 1.4：entries为 (原文, 语言, 模型, 提示词版本, 译文)，模型和提示词版本写入prop，返回条数
+    逐条写出，不在内存中建整棵XML树
+    """
+    count = 0
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tmx version="1.4">\n')
+        f.write(f'  <header creationtool="cm_sop_translate" creationtoolversion="{BUNDLE_VERSION}" '
+                f'datatype="plaintext" segtype="sentence" adminlang="en" '
+                f'srclang={quoteattr(config.TMX["source"])} o-tmf="sqlite"/>\n  <body>\n')
+        for source, language, model, prompt_version, target in entries:
+            f.write(f'    <tu>\n'
+                    f'      <prop type="x-model">{escape(model)}</prop>\n'
+                    f'      <prop type="x-prompt-version">{escape(str(prompt_version))}</prop>\n'
+                    f'      <tuv xml:lang={quoteattr(config.TMX["source"])}><seg>{escape(source)}</seg></tuv>\n'
+                    f'      <tuv xml:lang={quoteattr(language_code(language))}><seg>{escape(target)}</seg></tuv>\n'
+                    f'    </tu>\n')
+            count += 1
+        f.write('  </body>\n</tmx>\n')
+    os.replace(tmp_path, path)
+    return count
+
+
+class _TmxTarget:
+    """expat解析的回调：不建XML树，只收集每个tu的prop和各语言的seg文本（seg内的标签只取文字）"""
+
+    def __init__(self, model: str, prompt_version):
+        self.model = model
+        self.prompt_version = str(prompt_version)
+        self.source_code = config.TMX['source'].lower()
+        self.entries = []
+        self.languages = {}  # 语言代码 -> 目标语言，缓存language_name的结果
+        self.props = {}
+        self.segments = {}
+        self.code = ''
+        self.prop_type = None
+        self.text = None  # 正在收集的seg/prop文本
+
+    def start(self, tag, attrib):
+        if tag == 'tu':
+            self.props = {}
+            self.segments = {}
+        elif tag == 'tuv':
+            self.code = (attrib.get(XML_LANG) or attrib.get('lang') or '').lower()
+        elif tag == 'seg':
+            self.text = []
+        elif tag == 'prop':
+            self.prop_type = attrib.get('type')
+            self.text = []
+        elif tag == 'header':
+            self.source_code = attrib.get('srclang', self.source_code).lower()
+
+    def data(self, data):
+        if self.text is not None:
+            self.text.append(data)
+
+    def end(self, tag):
+        if tag == 'seg':
+            self.segments[self.code] = ''.join(self.text)
+            self.text = None
+        elif tag == 'prop':
+            self.props[self.prop_type] = ''.join(self.text).strip()
+            self.text = None
+        elif tag == 'tu':
+            self.add_unit()
+
+    def add_unit(self):
+        segments = self.segments
+        source = segments.pop(self.source_code, None)
+        if source is None:
+            # 原文语言代码写法不一致（如zh与zh-CN）时按主语言匹配
+            prefix = self.source_code.split('-')[0]
+            code = next((code for code in segments if code.split('-')[0] == prefix), None)
+            source = segments.pop(code, None) if code else None
+        if not source:
+            return
+        model = self.props.get('x-model', self.model)
+        prompt_version = self.props.get('x-prompt-version', self.prompt_version)
+        for code, target in segments.items():
+            if code not in self.languages:
+                self.languages[code] = language_name(code)
+            language = self.languages[code]
+            if language and target:
+                self.entries.append((source, language, model, prompt_version, target))
+
+
+def read_tmx(path: str, model: str, prompt_version, chunk_size: int = 1 << 20):
+    """
+    流式读取TMX，逐条返回 (原文, 语言, 模型, 提示词版本, 译文)；
+    一个tu有多种目标语言时分别返回，没有x-model/x-prompt-version属性的用传入的默认值，不认识的语言跳过。
+    按块解析、不建XML树，百万条也不会占用大量内存
+    """
+    target = _TmxTarget(model, prompt_version)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True  # 连续的文字合并成一次回调
+    parser.StartElementHandler = target.start
+    parser.EndElementHandler = target.end
+    parser.CharacterDataHandler = target.data
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            parser.Parse(chunk, not chunk)
+            entries, target.entries = target.entries, []
+            yield from entries
+            if not chunk:
+                break
+
+
+def write_bundle(path: str, entries) -> int:
+    """
+    把 (原文, 语言, 译文) 打包成二进制文件，按 语言+规范化原文 去重（后出现的覆盖先出现的），返回条数
+    """
+    table = {}
+    for source, language, target in entries:
+        if target:
+            table[bundle_hash(source, language)] = target
+    count = len(table)
+    hashes = np.fromiter(table.keys(), dtype='<u8', count=count)
+    blobs = [target.encode('utf-8') for target in table.values()]
+    order = np.argsort(hashes, kind='stable')
+    lengths = np.fromiter((len(blob) for blob in blobs), dtype='<u8', count=count)[order]
+    offsets = np.zeros(count + 1, dtype='<u8')
+    np.cumsum(lengths, out=offsets[1:])
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, count))
+        f.write(hashes[order].tobytes())
+        f.write(offsets.tobytes())
+        f.write(b''.join(blobs[index] for index in order))
+    os.replace(tmp_path, path)
+    return count
+
+
+class TranslationBundle:
+    """只读的翻译记忆包，内存映射后按哈希二分查找"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = BUNDLE_HEADER.unpack_from(self._mm, 0)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            self.close()
+            raise ValueError(f"不是有效的翻译记忆包：{path}")
+        self.count = count
+        offset = BUNDLE_HEADER.size
+        self.hashes = np.frombuffer(self._mm, dtype='<u8', count=count, offset=offset)
+        offset += 8 * count
+        self.offsets = np.frombuffer(self._mm, dtype='<u8', count=count + 1, offset=offset)
+        self.data_start = offset + 8 * (count + 1)
+
+    def get(self, text: str, language, count=True):
+        """查询译文，未命中返回None；count为False时不计入命中率（由调用方用record计一次）"""
+        key = np.uint64(bundle_hash(text, language))
+        index = int(np.searchsorted(self.hashes, key))
+        if index >= self.count or self.hashes[index] != key:
+            if count:
+                self.misses += 1
+            return None
+        if count:
+            self.hits += 1
+        start = self.data_start + int(self.offsets[index])
+        end = self.data_start + int(self.offsets[index + 1])
+        return self._mm[start:end].decode('utf-8')
+
+    def record(self, hit: bool):
+        """记一次查找的命中或未命中"""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": self.count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        # numpy数组引用着映射的内存，先释放再关闭
+        self.hashes = self.offsets = None
+        self._mm.close()
+        self._file.close()
+
+
+def unmasked_entries(entries):
+    """
+    跳过遮盖了数字的缓存记录（原文、译文带占位符，不是完整的句段），不导出、不打包；
+    同一句段换回原值的译文另有一条记录，跳过的条数写入日志
+    """
+    skipped = 0
+    for entry in entries:
+        if is_masked(entry[0]):
+            skipped += 1
+            continue
+        yield entry
+    if skipped:
+        logger.info(f"跳过{skipped}条遮盖后（带占位符）的缓存记录")
+
+
+# 进程内共享：文件路径 -> TranslationBundle（文件不存在时为None）
+_BUNDLES = {}
+_BUNDLES_LOCK = threading.Lock()
+
+
+def get_translation_bundle(path: str):
+    """获取翻译记忆包，同一进程内只映射一次；文件不存在或格式不对时返回None"""
+    path = os.path.abspath(path)
+    with _BUNDLES_LOCK:
+        if path not in _BUNDLES:
+            bundle = None
+            if os.path.isfile(path):
+                try:
+                    bundle = TranslationBundle(path)
+                    logger.info(f"已加载翻译记忆包：{path}，共{bundle.count}条")
+                except (ValueError, OSError) as e:
+                    logger.error(f"翻译记忆包加载失败{e}，不使用")
+            _BUNDLES[path] = bundle
+    return _BUNDLES[path]
+
+
+if __name__ == '__main__':
+    from modules.cm_sop_translate.tm_cache import get_translation_cache
+    from modules.cm_sop_translate.translator import PROMPT_VERSION, MODEL
+
+    parser = argparse.ArgumentParser(description='翻译记忆导入导出（TMX）与打包')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='把翻译记忆缓存导出为TMX')
+    export_parser.add_argument('output')
+    import_parser = commands.add_parser('import', help='把TMX导入翻译记忆缓存（合并去重）')
+    import_parser.add_argument('inputs', nargs='+')
+    import_parser.add_argument('--overwrite', action='store_true', help='与本地译文冲突时以导入的为准')
+    build_parser = commands.add_parser('build', help='把TMX（及本地缓存）打包成随安装包分发的二进制文件')
+    build_parser.add_argument('output')
+    build_parser.add_argument('inputs', nargs='*')
+    build_parser.add_argument('--with-cache', action='store_true', help='同时打包本地翻译记忆缓存（优先于TMX）')
+    args = parser.parse_args()
+
+    cache = get_translation_cache(**config.TRANSLATION_CACHE)
+
+    start = time.perf_counter()
+    if args.command == 'export':
+        count = write_tmx(args.output, unmasked_entries(cache.entries()))
+        logger.info(f"已导出{count}条到{args.output}，耗时{time.perf_counter() - start:.1f}s")
+    elif args.command == 'import':
+        for tmx_path in args.inputs:
+            count = cache.merge(read_tmx(tmx_path, MODEL, PROMPT_VERSION), overwrite=args.overwrite)
+            logger.info(f"{tmx_path}：新增/更新{count}条，耗时{time.perf_counter() - start:.1f}s")
+        logger.info(f"翻译缓存统计: {cache.stats()}")
+    else:
+        def bundle_entries():
+            for tmx_path in args.inputs:
+                for source, language, _, _, target in read_tmx(tmx_path, MODEL, PROMPT_VERSION):
+                    yield source, language, target
+            if args.with_cache:
+                for source, language, _, _, target in unmasked_entries(cache.entries()):
+                    yield source, language, target
+
+        count = write_bundle(args.output, bundle_entries())
+        logger.info(f"已打包{count}条到{args.output}（{os.path.getsize(args.output) / 1024 / 1024:.1f}MB），"
+                    f"耗时{time.perf_counter() - start:.1f}s")
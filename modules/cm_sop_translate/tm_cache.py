@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : tm_cache.py
+@Author  : Shawn
+@Date    : 2026/10/18 10:40
+@Info    : 翻译记忆缓存：SQLite持久化，键为 规范化原文+目标语言+模型+提示词版本，
+           WAL模式、批量写入、超出容量按最近使用时间(LRU)淘汰；
+           claims表登记各进程正在请求的键，多个翻译进程共用同一个缓存时不重复请求（见shared_flight.py）
+"""
+
+import atexit
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def cache_text(text: str) -> str:
+    """缓存用的规范化：NFKC、首尾去空白、连续空白合并为一个空格（保留标点，避免"文件编号"与"文件编号："共用译文）"""
+    text = unicodedata.normalize('NFKC', text)
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def cache_key(text: str, language, model, prompt_version) -> str:
+    raw = '\x1f'.join([cache_text(text), language, model, str(prompt_version)])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class TranslationCache:
+    def __init__(self, path: str, max_entries: int = 200000, flush_size: int = 50):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_size = flush_size
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}  # 待写入：key -> (source, language, model, prompt_version, target, last_used)
+        self._touched = {}  # 待更新最近使用时间：key -> last_used
+        self._lock = threading.RLock()
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # 本进程登记请求时的标识
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                language TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                target TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                use_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations(last_used)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS claims (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        # 记录条数只在打开时统计一次，之后随写入、导入、淘汰增减（其他进程写入的条数在淘汰时重新统计）
+        self._count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def get(self, text: str, language, model, prompt_version, count=True):
+        """
+        查询缓存，未命中返回None；
+        count为False时不计入命中率，一次查找要查多个键（如遮盖后、原文）时由调用方用record计一次
+        """
+        key = cache_key(text, language, model, prompt_version)
+        with self._lock:
+            if key in self._pending:
+                if count:
+                    self.hits += 1
+                return self._pending[key][4]
+
+            row = self._conn.execute("SELECT target FROM translations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                if count:
+                    self.misses += 1
+                return None
+
+            if count:
+                self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.flush_size:
+                self.flush()
+            return row[0]
+
+    def record(self, hit: bool):
+        """记一次查找的命中或未命中"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, text: str, language, model, prompt_version, target: str):
+        """写入缓存（先放入待写入队列，攒够flush_size条再批量提交）"""
+        if not target:
+            return
+        key = cache_key(text, language, model, prompt_version)
+        with self._lock:
+            self._pending[key] = (cache_text(text), language, model, str(prompt_version), target, time.time())
+            if len(self._pending) >= self.flush_size:
+                self.flush()
+
+    def flush(self):
+        """批量写入，并在超出容量时淘汰最久未使用的记录"""
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+            with self._conn:
+                # 先插入新记录（变更数即新增条数），再更新已有记录的译文和最近使用时间
+                changes = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT INTO translations (key, source, language, model, prompt_version, target, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO NOTHING",
+                    [(key, *value[:5], value[5], value[5]) for key, value in self._pending.items()]
+                )
+                self._count += self._conn.total_changes - changes
+                self._conn.executemany(
+                    "UPDATE translations SET target = ?, last_used = ? WHERE key = ?",
+                    [(value[4], value[5], key) for key, value in self._pending.items()]
+                )
+                self._conn.executemany(
+                    "UPDATE translations SET last_used = ?, use_count = use_count + 1 WHERE key = ?",
+                    [(last_used, key) for key, last_used in self._touched.items()]
+                )
+                self._evict()
+            self._pending.clear()
+            self._touched.clear()
+
+    def entries(self) -> list:
+        """全部缓存记录 [(原文, 语言, 模型, 提示词版本, 译文), ...]，用于导出"""
+        with self._lock:
+            self.flush()
+            return self._conn.execute(
+                "SELECT source, language, model, prompt_version, target FROM translations ORDER BY language, source"
+            ).fetchall()
+
+    def merge(self, entries, overwrite: bool = False, chunk_size: int = 10000) -> int:
+        """
+        批量导入 (原文, 语言, 模型, 提示词版本, 译文)，按缓存键去重；
+        已有的记录默认保留本地译文，overwrite为True时以导入的为准。返回新增或更新的条数
+        """
+        now = time.time()
+        with self._lock:
+            self.flush()
+            changes = 0
+            with self._conn:
+                rows = []
+                for source, language, model, prompt_version, target in entries:
+                    if not target:
+                        continue
+                    rows.append((cache_key(source, language, model, prompt_version), cache_text(source), language,
+                                 model, str(prompt_version), target, now, now))
+                    if len(rows) >= chunk_size:
+                        changes += self._merge_rows(rows, overwrite)
+                        rows = []
+                if rows:
+                    changes += self._merge_rows(rows, overwrite)
+                self._evict()
+            return changes
+
+    def _merge_rows(self, rows: list, overwrite: bool) -> int:
+        """插入一批记录，overwrite为True时更新译文不同的已有记录，返回新增或更新的条数"""
+        changes = self._conn.total_changes
+        self._conn.executemany(
+            "INSERT INTO translations (key, source, language, model, prompt_version, target, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO NOTHING", rows
+        )
+        added = self._conn.total_changes - changes
+        self._count += added
+        if overwrite:
+            self._conn.executemany("UPDATE translations SET target = ? WHERE key = ? AND target != ?",
+                                   [(row[5], row[0], row[5]) for row in rows])
+        return self._conn.total_changes - changes
+
+    def claim(self, keys: list, lease: float) -> set:
+        """
+        原子地登记要请求的键（cache_key），返回本进程登记到的键；
+        其他进程已登记且未过期的不返回，本进程已登记的续期后返回，过期的（请求方异常退出）由本进程接手
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO claims (key, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE claims.owner = excluded.owner OR claims.expires <= ?",
+                [(key, self.owner, now + lease, now) for key in keys]
+            )
+            return {key for key, owner in self._select_claims(keys) if owner == self.owner}
+
+    def release(self, keys: list):
+        """请求结束：先写入待写入的译文（其他进程据此取结果），再删除本进程的登记"""
+        with self._lock:
+            self.flush()
+            with self._conn:
+                self._conn.executemany("DELETE FROM claims WHERE key = ? AND owner = ?",
+                                       [(key, self.owner) for key in keys])
+
+    def claimed(self, keys: list) -> set:
+        """仍被其他进程登记、未过期的键"""
+        now = time.time()
+        with self._lock:
+            return {key for key, owner, expires in self._select_claims(keys, with_expires=True)
+                    if owner != self.owner and expires > now}
+
+    def _select_claims(self, keys: list, with_expires=False, chunk_size: int = 500) -> list:
+        columns = "key, owner, expires" if with_expires else "key, owner"
+        rows = []
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            rows.extend(self._conn.execute(
+                f"SELECT {columns} FROM claims WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return rows
+
+    def _evict(self):
+        if self._count <= self.max_entries:
+            return
+        # 超出容量时才重新统计（包含其他进程写入、淘汰的条数），再删除最久未使用的记录
+        self._count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        overflow = self._count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN "
+                "(SELECT key FROM translations ORDER BY last_used LIMIT ?)", (overflow,)
+            )
+            self._count -= overflow
+
+    def stats(self):
+        """缓存命中率等统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": self._count,
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            try:
+                self.flush()
+                with self._conn:
+                    # 退出时未完成的登记交给其他进程，不必等到过期
+                    self._conn.execute("DELETE FROM claims WHERE owner = ?", (self.owner,))
+            finally:
+                self._conn.close()
+
+
+# 进程内共享的缓存实例：数据库路径 -> TranslationCache
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_translation_cache(path: str, max_entries: int = 200000, flush_size: int = 50) -> TranslationCache:
+    """获取缓存实例，同一进程内每个数据库只打开一次，进程退出时自动写入剩余记录"""
+    path = os.path.abspath(path)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(path)
+        if cache is None:
+            cache = TranslationCache(path, max_entries=max_entries, flush_size=flush_size)
+            _CACHES[path] = cache
+            atexit.register(cache.close)
+    return cache
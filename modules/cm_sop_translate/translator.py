@@ -12,77 +12,653 @@
 import json
 import logging
 import os
-
-from openai import OpenAI
+import time
 
 from modules.common.log import setup_logger
 from modules.cm_sop_translate.config.config import config
+from openai import APIConnectionError
+
+from modules.cm_sop_translate.api_client import CircuitOpenError, get_api_client
+from modules.cm_sop_translate.batching import pack_batches, build_batch_payload, parse_batch_reply, \
+    parse_multi_batch_reply
+from modules.cm_sop_translate.engine import AsyncTranslateEngine
+from modules.cm_sop_translate.fuzzy_tm import get_fuzzy_memory
+from modules.cm_sop_translate.glossary import GlossaryIndex, get_glossary_index
+from modules.cm_sop_translate.local_backend import get_local_backend
+from modules.cm_sop_translate.masking import mask_text, unmask_stream, unmask_text
+from modules.cm_sop_translate.metrics import TranslationMetrics, cached_tokens, DEGRADED_PATH
+from modules.cm_sop_translate.prefilter import classify
+from modules.cm_sop_translate.prompts import single_messages, batch_messages, multi_messages
+from modules.cm_sop_translate.segmenter import split_text
+from modules.cm_sop_translate.shared_flight import SharedFlight
+from modules.cm_sop_translate.singleflight import SingleFlight
+from modules.cm_sop_translate.term_matcher import get_term_matcher
+from modules.cm_sop_translate.tm_bundle import get_translation_bundle
+from modules.cm_sop_translate.tm_cache import get_translation_cache, cache_text
 
 logger = setup_logger(log_dir=config.LOG_PATH, name='logs', level=logging.INFO)
 
+# 提示词版本，修改提示词后需同步修改，使旧的缓存译文失效
+PROMPT_VERSION = 3
+MODEL = "deepseek-chat"
+
 
 class Translator:
     def __init__(self):
         self.api_key = config.DS_KEY
-        self.base_url = "https://api.deepseek.com"
+        self.base_url = config.API_BASE_URL
+        self.model = MODEL
         self.glossary_folder = config.GLOSSARY['dir']
+        rate_limit = None
+        if config.RATE_LIMIT['enabled']:
+            # 并发数最多调到引擎的并发槽位数
+            rate_limit = {k: v for k, v in config.RATE_LIMIT.items() if k != 'enabled'}
+            rate_limit['max_concurrency'] = config.TRANSLATE_CONCURRENCY
+        hedging = None
+        if config.HEDGING['enabled']:
+            # 每个并发槽位最多同时有主请求和对冲请求各一个
+            hedging = {k: v for k, v in config.HEDGING.items() if k != 'enabled'}
+            hedging['max_workers'] = 2 * config.TRANSLATE_CONCURRENCY
+        self.client = get_api_client(self.api_key, self.base_url, rate_limit=rate_limit, hedging=hedging,
+                                     **config.API_CLIENT)
+        self.cache = get_translation_cache(**config.TRANSLATION_CACHE)
+        self.bundle = get_translation_bundle(config.TM_BUNDLE['path'])  # 随安装包分发的翻译记忆，没有时为None
+        self.fuzzy = None  # 模糊翻译记忆，未启用或向量模型不可用时为None
+        if config.FUZZY_TM['enabled']:
+            self.fuzzy = get_fuzzy_memory(**{k: v for k, v in config.FUZZY_TM.items() if k != 'enabled'})
+        self.memo = {}  # 本次运行已翻译的内容：(语言, 规范化原文) -> 译文
+        self.mask_failed = set()  # 本次运行中译文没有保留占位符的遮盖后文本，之后不再遮盖请求
+        self.engine = AsyncTranslateEngine(self, concurrency=config.TRANSLATE_CONCURRENCY)
+        self.stream_stats = []  # 流式翻译每次请求的首字耗时、token/s
+        self.metrics = TranslationMetrics(self.client.limiter, self.client.hedger)  # 每次翻译的路径、耗时、token用量
+        self.flight = SingleFlight()  # 合并并发的重复请求
+        self.shared = None  # 合并其他进程正在进行的重复请求
+        if config.SHARED_FLIGHT['enabled']:
+            self.shared = SharedFlight(self.cache, **{k: v for k, v in config.SHARED_FLIGHT.items() if k != 'enabled'})
+        # 本地离线模型：off不使用，fallback接口熔断或连不上时改用，local全部改用
+        self.local_mode = config.LOCAL_MT['mode']
+        self.local = None
+        if self.local_mode != 'off':
+            self.local = get_local_backend(**{k: v for k, v in config.LOCAL_MT.items() if k != 'mode'})
+        self.deadline = None  # 限时翻译的截止时间（time.monotonic()），None为不限时
 
     def translate(self, text: str, language, display=False):
-        # 先过滤是否在词库中
-        glossary_res = self.translate_filter(text, language)
-        if glossary_res:
-            return glossary_res
+        # 先查词库、本次运行已翻译的内容、翻译记忆缓存
+        res = self.lookup(text, language, display)
+        if res is not None:
+            return res
+        if not self.has_time():
+            return self.untranslated(text, language)
 
-        # 构建DeepSeek请求
-        client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # 其他线程、进程正在翻译同一段文本时等待它的结果，不重复请求
+        def request(texts):
+            reply = self.request_shared(texts, [language],
+                                        lambda own: {language: {text: self.translate_one(text, language, display)}})
+            return reply[language]
 
-        messages = [
-            {"role": "system",
-             "content": f"你是一名工业领域翻译工作者，请翻译成{language}，保持专业术语的准确性,只需返回翻译后的文本，不要添加任何额外的解释或注释。"
-                        f"待翻译内容如下：{text}"
-             }]
+        results, shared = self.flight.run({text: (language, self.flight_key(text))}, [text], request)
+        if shared:
+            self.metrics.record('coalesced', shared, language)
+            resolved = self.resolve_coalesced(shared, [language], lambda texts: {
+                text: {language: res} for text, res in request(texts).items()})
+            results.update({text: res[language] for text, res in resolved.items()})
+        return results[text]
 
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            temperature=0.5,
-            stream=False,  # 非流式输出
-        )
-        resp_text = response.choices[0].message.content
+    def translate_one(self, text: str, language, display=False):
+        """请求模型翻译一段文本（已确认词库、缓存都未命中）"""
+        # 长段落按句拆分后并发翻译，再按顺序拼回
+        if len(split_text(text, config.SEGMENT['max_tokens'])) > 1:
+            return self.engine.translate_all([text], language, display)[0]
+
+        if self.use_local(language):
+            return self.local_translate([text], language, display)[text]
+
+        reused, references = self.fuzzy_prepare([text], [language])
+        if text in reused:
+            return reused[text][language]
+
+        # 构建DeepSeek请求：编号、数字等先换成占位符，译文中占位符没有原样保留时不遮盖重新请求
+        masked, values = self.mask(text)
+        for source, source_values in ([(masked, values), (text, [])] if values else [(text, [])]):
+            start = time.perf_counter()
+            try:
+                response = self.chat(self.build_messages(text, language, references[language],
+                                                         source if source_values else None))
+            except Exception as e:
+                if not self.can_fallback(language, e):
+                    raise
+                logger.warning(f"接口不可用{e}，改用本地模型翻译")
+                return self.local_translate([text], language, display)[text]
+            self.metrics.record_response('model', text, language, start, response, self.client.last_retries())
+            reply = response.choices[0].message.content
+            resp_text = unmask_text(reply, source_values)
+            if resp_text is not None:
+                break
+            logger.warning(f"译文中的占位符与原文不一致，不遮盖重新翻译：{text}")
+            self.mask_failed.add(source)
+        self.remember(text, language, resp_text, (source, reply) if source_values else None)
         if display:
             print(text, "-->", resp_text)
         return resp_text
 
-    def translate_filter(self, text: str, language):
+    def translate_stream(self, text: str, language):
         """
-        如果是指定的专有名词，在词库中的，则不再提交deepseek翻译。
+        流式翻译，逐段返回模型输出的文本；词库、缓存、模糊翻译记忆命中时一次返回全部译文。
+        与translate_one相同：编号、数字先换成占位符，输出时逐段换回；还没有输出内容时接口不可用则改用本地模型。
+        记录首字耗时和每秒token数，结束后译文写入缓存（占位符不一致时不写入）。
         """
+        res = self.lookup(text, language)
+        if res is None and self.use_local(language):
+            res = self.local_translate([text], language)[text]
+        references = {language: None}
+        if res is None:
+            reused, references = self.fuzzy_prepare([text], [language])
+            res = reused[text][language] if text in reused else None
+        if res is not None:
+            yield res
+            return
+
+        masked, values = self.mask(text)
+        messages = self.build_messages(text, language, references[language], masked if values else None)
+        pieces = []
         try:
-            glossary_folder = self.glossary_folder
-            # if not os.path.isdir(glossary_folder):
-            #     print(f"词库路径不存在，请检查{glossary_folder}，采用AI翻译")
-            #     return False
+            yield from unmask_stream(self.stream_pieces(messages, text, language, pieces), values)
+        except Exception as e:
+            if pieces or not self.can_fallback(language, e):
+                raise
+            logger.warning(f"接口不可用{e}，改用本地模型翻译")
+            yield self.local_translate([text], language)[text]
+            return
+
+        reply = ''.join(pieces)
+        resp_text = unmask_text(reply, values)
+        if resp_text is None:
+            # 已经输出的内容无法撤回，只是不写入缓存，之后同样的文本不再遮盖
+            logger.warning(f"流式译文中的占位符与原文不一致，不写入缓存：{text}")
+            self.mask_failed.add(masked)
+            return
+        self.remember(text, language, resp_text, (masked, reply) if values else None)
+
+    def stream_pieces(self, messages: list, text: str, language, pieces: list):
+        """发送流式请求，逐段返回模型输出（带占位符）并追加到pieces，结束后记录首字耗时、每秒token数"""
+        start = time.perf_counter()
+        first_token = None
+        usage = None
+        for chunk in self.chat_stream(messages):
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                pieces.append(delta)
+                yield delta
+
+        latency = time.perf_counter() - start
+        first_token = latency if first_token is None else first_token
+        tokens = usage.completion_tokens if usage else len(pieces)
+        generate_time = latency - first_token
+        stats = {
+            "ttft": first_token,
+            "latency": latency,
+            "tokens": tokens,
+            "tokens_per_sec": tokens / generate_time if generate_time > 0 else 0.0,
+            "cached_tokens": cached_tokens(usage),  # 命中接口前缀缓存的输入token，命中时首字耗时应明显降低
+        }
+        self.stream_stats.append(stats)
+        self.metrics.record('stream', text, language, latency, usage.prompt_tokens if usage else 0, tokens,
+                            self.client.last_retries(), stats['cached_tokens'])
+        logger.info(f"流式翻译：首字耗时{stats['ttft']:.2f}s，总耗时{latency:.2f}s，"
+                    f"共{tokens}个token，{stats['tokens_per_sec']:.1f} token/s，前缀缓存命中{stats['cached_tokens']}个输入token")
+
+    def build_messages(self, text: str, language, references: dict = None, masked: str = None):
+        """单条文本翻译的提示词：固定的system前缀，原文（有遮盖时为遮盖后的文本）放在user消息中，术语按原文匹配"""
+        return single_messages(masked or text, language, self.match_terms([text], language), references,
+                               masked is not None)
+
+    def translate_many(self, texts: list, language, display=False) -> list:
+        """
+        批量翻译，返回与texts顺序一致的译文列表。
+        词库、缓存未命中的文本去重后按token预算打包，每批一次请求；空文本原样返回。
+        """
+        results, todo = self.split_cached(texts, language, display)
+
+        for batch in pack_batches(list(todo), config.TRANSLATE_BATCH['max_items'],
+                                  config.TRANSLATE_BATCH['max_tokens']):
+            for text, res in self.translate_batch(batch, language).items():
+                if display:
+                    print(text, "-->", res)
+                for index in todo[text]:
+                    results[index] = res
+        return results
+
+    def split_cached(self, texts: list, language, display=False, count=True):
+        """
+        先用词库和缓存填充译文，返回 (译文列表, 待请求的文本 -> 在texts中的下标列表)
+        空文本原样保留，重复文本只请求一次；count为False时只查不计（见lookup）
+        """
+        results = list(texts)
+        todo = {}
+        for index, text in enumerate(texts):
+            if not text.strip():
+                continue
+            res = self.lookup(text, language, display, count)
+            if res is not None:
+                results[index] = res
+            else:
+                todo.setdefault(text, []).append(index)
+        return results, todo
+
+    def translate_batch(self, batch: list, language) -> dict:
+        """
+        批量翻译，返回 原文 -> 译文；其他线程正在翻译的文本不再放进本批，等待它们的结果
+        """
+        if not self.has_time():
+            return {text: self.degrade(text, language) for text in batch}
+        def request(texts):
+            return self.request_shared(texts, [language], lambda own: {language: self.request_batch(own, language)})[language]
+
+        keys = {text: (language, self.flight_key(text)) for text in batch}
+        results, shared = self.flight.run(keys, batch, request)
+        if shared:
+            self.metrics.record('coalesced', shared, language)
+            resolved = self.resolve_coalesced(shared, [language], lambda texts: {
+                text: {language: res} for text, res in request(texts).items()})
+            results.update({text: res[language] for text, res in resolved.items()})
+        return results
+
+    def request_shared(self, texts: list, languages: list, request) -> dict:
+        """
+        跨进程合并请求：其他进程正在请求的文本等它写入缓存后取用，其余的调用request(原文列表)请求，
+        request返回 语言 -> {原文: 译文}，本函数返回texts全部的 语言 -> {原文: 译文}
+        """
+        if self.shared is None:
+            return request(texts)
+        results, shared = self.shared.run(texts, languages, self.model, PROMPT_VERSION, request,
+                                          lambda text, language: self.stored(text, language)[0])
+        if shared:
+            for language in languages:
+                for text in shared:
+                    self.memo[(language, cache_text(text))] = results[language][text]
+                self.metrics.record('coalesced', shared, language)
+        return results
+
+    def request_batch(self, batch: list, language) -> dict:
+        """
+        一次请求翻译一批文本，返回 原文 -> 译文。
+        返回结果中缺失或格式错误的条目对半拆分后重试，拆到单条时改为单独翻译。
+        """
+        if len(batch) == 1:
+            return {batch[0]: self.translate(batch[0], language)}
+        if self.use_local(language):
+            return self.local_translate(batch, language)
+
+        reused, references = self.fuzzy_prepare(batch, [language])
+        results = {text: translations[language] for text, translations in reused.items()}
+        batch = [text for text in batch if text not in reused]
+        if not batch:
+            return results
+
+        masks = {text: self.mask(text) for text in batch}
+        payload = build_batch_payload(list(dict.fromkeys(masked for masked, _ in masks.values())))
+        messages = batch_messages(json.dumps(payload, ensure_ascii=False), language, self.match_terms(batch, language),
+                                  references[language], any(values for _, values in masks.values()))
+
+        try:
+            start = time.perf_counter()
+            response = self.chat(messages, response_format={"type": "json_object"})
+            self.metrics.record_response('batch', batch, language, start, response, self.client.last_retries())
+            reply = parse_batch_reply(response.choices[0].message.content, payload)
+        except Exception as e:
+            if self.can_fallback(language, e):
+                logger.warning(f"接口不可用{e}，改用本地模型翻译")
+                return self.local_translate(batch, language)
+            if isinstance(e, CircuitOpenError):
+                raise
+            logger.error(f"批量翻译失败{e}，拆分后重试")
+            reply = {}
+
+        missing = []
+        for text in batch:
+            res = self.unmask_reply(text, language, masks[text], payload, reply)
+            if res is not None:
+                results[text] = res
+            else:
+                missing.append(text)
+
+        if missing:
+            logger.warning(f"批量翻译有{len(missing)}/{len(batch)}条缺失或格式错误，拆分后重试")
+            half = (len(missing) + 1) // 2
+            for part in (missing[:half], missing[half:]):
+                if part:
+                    results.update(self.translate_batch(part, language))
+        return results
+
+    def translate_batch_multi(self, batch: list, languages: list) -> dict:
+        """
+        多语言批量翻译，返回 语言 -> {原文: 译文}；其他线程正在翻译的文本不再放进本批，等待它们的结果
+        """
+        if not self.has_time():
+            return {lang: {text: self.degrade(text, lang) for text in batch} for lang in languages}
+
+        def request(texts):
+            reply = self.request_shared(texts, languages, lambda own: self.request_batch_multi(own, languages))
+            return {text: {lang: reply[lang][text] for lang in languages} for text in texts}
+
+        keys = {text: (tuple(languages), self.flight_key(text)) for text in batch}
+        results, shared = self.flight.run(keys, batch, request)
+        if shared:
+            for lang in languages:
+                self.metrics.record('coalesced', shared, lang)
+            results.update(self.resolve_coalesced(shared, languages, request))
+        return {lang: {text: results[text][lang] for text in batch} for lang in languages}
+
+    def request_batch_multi(self, batch: list, languages: list) -> dict:
+        """
+        一次请求把一批文本同时翻译成多种语言，返回 语言 -> {原文: 译文}。
+        解析失败或缺失的条目，按语言分别重新翻译。
+        """
+        if self.local_mode == 'local':
+            # 本地模型一个方向一个模型，按语言分别翻译
+            return {lang: self.translate_batch(batch, lang) for lang in languages}
+
+        reused, references = self.fuzzy_prepare(batch, languages)
+        results = {lang: {text: translations[lang] for text, translations in reused.items()} for lang in languages}
+        batch = [text for text in batch if text not in reused]
+        if not batch:
+            return results
+
+        masks = {text: self.mask(text) for text in batch}
+        payload = build_batch_payload(list(dict.fromkeys(masked for masked, _ in masks.values())))
+        terms = {lang: self.match_terms(batch, lang) for lang in languages}
+        messages = multi_messages(json.dumps(payload, ensure_ascii=False), languages, terms, references,
+                                  any(values for _, values in masks.values()))
+
+        try:
+            start = time.perf_counter()
+            response = self.chat(messages, response_format={"type": "json_object"})
+            self.metrics.record_response('multi', batch, languages, start, response, self.client.last_retries())
+            reply = parse_multi_batch_reply(response.choices[0].message.content, payload, languages)
+        except CircuitOpenError:
+            if self.local_mode != 'fallback':
+                raise
+            # 按语言分别翻译时会改用本地模型
+            reply = {lang: {} for lang in languages}
+        except Exception as e:
+            logger.error(f"多语言批量翻译失败{e}，改为按语言分别翻译")
+            reply = {lang: {} for lang in languages}
 
-            # if language in GLOSSARY['languages']:
-            #     glossary = os.path.join(glossary_folder, GLOSSARY['languages'][language])
-            # else:
-            #     print(f"{language}该语言词库未配置，采用AI翻译。")
-            #     return False
+        for lang in languages:
+            missing = []
+            for text in batch:
+                res = self.unmask_reply(text, lang, masks[text], payload, reply[lang])
+                if res is not None:
+                    results[lang][text] = res
+                else:
+                    missing.append(text)
+            if missing:
+                logger.warning(f"多语言批量翻译中{lang}有{len(missing)}/{len(batch)}条缺失或格式错误，改为单独翻译")
+                results[lang].update(self.translate_batch(missing, lang))
+        return results
 
-            glossary = os.path.join(glossary_folder, config.GLOSSARY['languages'][language])
+    def mask(self, text: str, lookup=False):
+        """
+        遮盖编号、数字、单位，返回 (遮盖后的文本, 占位值列表)；未开启或没有可遮盖内容时占位值为空。
+        本次运行中模型没有保留过占位符的遮盖后文本不再遮盖请求（lookup=True查缓存时仍按遮盖后的文本查）
+        """
+        if not config.MASKING:
+            return text, []
+        masked, values = mask_text(text)
+        if values and not lookup and masked in self.mask_failed:
+            return text, []
+        return masked, values
+
+    def flight_key(self, text: str) -> str:
+        """线程间合并请求的键：遮盖后的文本，只有数字不同的文本同时翻译时只请求一次"""
+        return cache_text(self.mask(text)[0])
+
+    def resolve_coalesced(self, shared: list, languages: list, request) -> dict:
+        """
+        等到其他线程的结果后，占位值不同的文本（等到的是对方数字的译文）按自己的占位值从缓存取译文；
+        取不到的（对方改为不遮盖请求、未翻译等）由本线程请求，到时的标注未翻译。
+        request(原文列表)返回 原文 -> {语言: 译文}，返回需要替换的 原文 -> {语言: 译文}
+        """
+        resolved, retry = {}, []
+        for text in shared:
+            if not self.mask(text, lookup=True)[1]:
+                continue
+            found = {lang: self.stored(text, lang)[0] for lang in languages}
+            if None in found.values():
+                retry.append(text)
+            else:
+                resolved[text] = found
+        if retry and self.has_time():
+            resolved.update(request(retry))
+        elif retry:
+            resolved.update({text: {lang: self.untranslated(text, lang) for lang in languages} for text in retry})
+        return resolved
+
+    def unmask_reply(self, text: str, language, mask: tuple, payload: dict, reply: dict):
+        """
+        从批量应答中取出text的译文并换回占位符，记录到缓存；缺失、格式错误或占位符不一致时返回None
+        payload为 键 -> 遮盖后的文本（相同的只发一次），mask为text的 (遮盖后的文本, 占位值列表)
+        """
+        masked, values = mask
+        key = next(key for key, source in payload.items() if source == masked)
+        res = unmask_text(reply.get(key), values)
+        if res is not None:
+            self.remember(text, language, res, (masked, reply[key]) if values else None)
+        elif values and key in reply:
+            self.mask_failed.add(masked)
+        return res
+
+    def translate_multi(self, text: str, languages: list, display=False) -> dict:
+        """把一段文本同时翻译成多种语言，返回 语言 -> 译文"""
+        results = self.engine.translate_document([text], languages, display)
+        return {lang: results[lang][0] for lang in languages}
+
+    def set_deadline(self, seconds=None):
+        """限时翻译：seconds秒内要写完所有文档，None为不限时"""
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+
+    def time_left(self):
+        """扣除留给生成文档的时间后，还能用于请求模型的秒数；不限时返回None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - config.DEADLINE['reserve'] - time.monotonic()
+
+    def has_time(self) -> bool:
+        """剩余时间是否还够发一次请求（按最近请求耗时的p95估计）"""
+        left = self.time_left()
+        return left is None or left > self.metrics.expected_latency(config.DEADLINE['request_seconds'])
+
+    def degrade(self, text: str, language) -> str:
+        """限时翻译到时：只查词库、缓存，仍未命中的保留原文并标注"""
+        res = self.lookup(text, language)
+        if res is not None:
+            return res
+        return self.untranslated(text, language)
+
+    def untranslated(self, text: str, language) -> str:
+        """未翻译的文本：原文加标注，不写入缓存，下次运行时重新翻译"""
+        self.metrics.record(DEGRADED_PATH, text, language)
+        return config.DEADLINE['marker'] + text
 
-            # if not os.path.isfile(glossary):
-            #     print(f"词库文件不存在，请检查{glossary}，采用AI翻译。")
-            #     return False
+    @staticmethod
+    def is_untranslated(translated_text: str) -> bool:
+        return translated_text.startswith(config.DEADLINE['marker'])
 
-            with open(glossary, "r", encoding="utf-8") as f:
-                dicts = json.load(f)
+    def use_local(self, language) -> bool:
+        """是否全部使用本地模型翻译"""
+        return self.local_mode == 'local' and self.local.supports(language)
 
-            if text not in dicts:
-                text = text.replace(" ", "").replace("　", "")
+    def can_fallback(self, language, error: Exception) -> bool:
+        """接口熔断或连不上（含超时）时，是否可以改用本地模型"""
+        return (self.local_mode == 'fallback' and self.local.supports(language)
+                and isinstance(error, (CircuitOpenError, APIConnectionError)))
 
-            if text in dicts:
-                res = dicts[text]
+    def local_translate(self, texts: list, language, display=False) -> dict:
+        """
+        本地模型翻译，返回 原文 -> 译文
+        译文只记入本次运行，不写入翻译记忆缓存，之后联网时仍以接口的译文为准
+        """
+        start = time.perf_counter()
+        translated = dict(zip(texts, self.local.translate(texts, language)))
+        self.metrics.record('local', texts, language, time.perf_counter() - start)
+        for text, res in translated.items():
+            if res:
+                self.memo[(language, cache_text(text))] = res
+            if display:
+                print(text, "-->", res)
+        return translated
+
+    def chat(self, messages, **kwargs):
+        """发送对话请求"""
+        return self.client.chat(
+            model=self.model,
+            messages=messages,
+            temperature=0.5,
+            stream=False,  # 非流式输出
+            **kwargs
+        )
+
+    def chat_stream(self, messages):
+        """发送流式对话请求，返回逐块输出的迭代器（最后一块带token用量）"""
+        return self.client.chat(
+            model=self.model,
+            messages=messages,
+            temperature=0.5,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+
+    def lookup(self, text: str, language, display=False, count=True):
+        """
+        不请求模型，依次查词库、按规则过滤、查本次运行已翻译的内容、翻译记忆缓存、随安装包分发的翻译记忆，未命中返回None；
+        count为False时只查不计（生成翻译计划、预估时）：不计入命中率和埋点，缓存命中的也不记入本次运行，之后翻译时再计一次
+        """
+        # 先过滤是否在词库中
+        glossary_res = self.translate_filter(text, language, count)
+        if glossary_res:
+            if count:
+                self.metrics.record('glossary', text, language)
+            return glossary_res
+
+        # 文件编号、日期、数字等不需要翻译的原样返回（词库中有的以词库为准）
+        if config.PREFILTER and classify(text, language):
+            if count:
+                self.metrics.record('skip', text, language)
+            return text
+
+        memo_key = (language, cache_text(text))
+        if memo_key in self.memo:
+            if count:
+                self.metrics.record('memo', text, language)
+            return self.memo[memo_key]
+
+        cache_res, path = self.stored(text, language, count)
+        if cache_res is not None and count:
+            self.metrics.record(path, text, language)
+            self.memo[memo_key] = cache_res
+            if display:
+                print(text, "-->", cache_res)
+        return cache_res
+
+    def stored(self, text: str, language, count=True):
+        """
+        查翻译记忆缓存、随安装包分发的翻译记忆，返回 (译文, 'cache'或'bundle')，未命中返回 (None, None)；
+        有可遮盖内容的先按遮盖后的文本查（只有数字不同的文本共用一条），再按原文查（开启遮盖之前缓存的译文）
+        """
+        masked, values = self.mask(text, lookup=True)
+        sources = [(masked, values), (text, [])] if values else [(text, [])]
+        # 多个键只计一次命中或未命中
+        stores = [('cache', self.cache,
+                   lambda source: self.cache.get(source, language, self.model, PROMPT_VERSION, count=False))]
+        if self.bundle is not None:
+            stores.append(('bundle', self.bundle, lambda source: self.bundle.get(source, language, count=False)))
+        for name, store, get in stores:
+            for source, source_values in sources:
+                res = unmask_text(get(source), source_values)
+                if res is not None:
+                    if count:
+                        store.record(True)
+                    return res, name
+            if count:
+                store.record(False)
+        return None, None
+
+    def remember(self, text: str, language, translated_text: str, masked: tuple = None):
+        """
+        记录模型返回的译文：写入本次运行的记录、翻译记忆缓存和模糊翻译记忆；
+        masked为遮盖后请求时的 (遮盖后的原文, 带占位符的译文)，缓存中同时存遮盖后的文本（只有数字不同的共用）
+        和换回原值的完整句段（导出TMX、打包翻译记忆时使用）
+        """
+        if not translated_text:
+            return
+        self.memo[(language, cache_text(text))] = translated_text
+        if masked is not None:
+            self.cache.put(masked[0], language, self.model, PROMPT_VERSION, masked[1])
+        self.cache.put(text, language, self.model, PROMPT_VERSION, translated_text)
+        if self.fuzzy is not None:
+            self.fuzzy.add(text, language, translated_text)
+
+    def flush(self):
+        """把攒着的译文写入翻译记忆缓存，给新译文建模糊翻译记忆的向量"""
+        self.cache.flush()
+        if self.fuzzy is not None:
+            try:
+                self.fuzzy.flush()
+            except Exception as e:
+                logger.error(f"模糊翻译记忆写入失败{e}")
+
+    def fuzzy_prepare(self, batch: list, languages: list):
+        """
+        请求模型前查模糊翻译记忆，返回 (直接复用的 原文 -> {语言: 译文}, 语言 -> {相似原文: 参考译文})；
+        复用的译文由历史译文换数字得到，只记入本次运行，不写入翻译记忆缓存
+        """
+        references = {language: {} for language in languages}
+        if self.fuzzy is None:
+            return {}, references
+        try:
+            reused, matches = self.fuzzy.prepare(batch, languages)
+        except Exception as e:
+            logger.error(f"模糊翻译记忆查询异常{e}，不附加参考译文")
+            return {}, references
+        for text, translations in reused.items():
+            for language, res in translations.items():
+                self.memo[(language, cache_text(text))] = res
+                self.metrics.record('fuzzy', text, language)
+        for language, items in matches.items():
+            for source, target, _ in items.values():
+                references[language][source] = target
+        return reused, references
+
+    def glossary_index(self, language) -> GlossaryIndex:
+        """获取该语言的词库索引（进程内只加载一次，文件变化时自动重载）"""
+        glossary = os.path.join(self.glossary_folder, config.GLOSSARY['languages'][language])
+        return get_glossary_index(glossary)
+
+    def match_terms(self, texts: list, language) -> dict:
+        """找出texts中出现的词库术语，返回 术语 -> 译文，只取命中的部分，不发送整个词库"""
+        terms = {}
+        try:
+            matcher = get_term_matcher(self.glossary_index(language))
+            for text in texts:
+                for term, translation in matcher.match(text).items():
+                    terms.setdefault(term, translation)
+        except Exception as e:
+            logger.error(f"术语匹配异常{e}，不附加术语")
+        return terms
+
+    def translate_filter(self, text: str, language, count=True):
+        """
+        如果是指定的专有名词，在词库中的，则不再提交deepseek翻译。
+        """
+        try:
+            res = self.glossary_index(language).lookup(text, count)
+            if res is not None:
                 print(f"{text} --> {res}")
                 return res
 
@@ -90,6 +666,16 @@ class Translator:
             logger.error(f"词库异常{e}，将采用AI翻译")
             # return False
 
+    def glossary_stats(self):
+        """各语言词库索引的命中/未命中次数"""
+        stats = {}
+        for language in config.GLOSSARY['languages']:
+            try:
+                stats[language] = self.glossary_index(language).stats()
+            except Exception as e:
+                logger.error(f"词库异常{e}")
+        return stats
+
 # 使用示例
 # if __name__ == "__main__":
 #     # input_file = "../../file/1.docx"
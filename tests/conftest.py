@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : conftest.py
+@Author  : Shawn
+@Date    : 2026/10/19 14:00
+@Info    : 测试共用的Translator：临时词库、临时缓存，接口换成返回伪翻译的假客户端，不访问网络
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from modules.cm_sop_translate.config.config import config
+
+LANGUAGES = ('英语', '越南语')
+
+
+class FakeCompletions:
+    """代替openai的chat.completions，按请求的形式（单条、批量JSON、多语言JSON）返回伪翻译，记录收到的请求"""
+
+    def __init__(self):
+        self.requests = []
+        self.delay = 0  # 每次请求的耗时（秒）
+
+    @staticmethod
+    def translate(text, language):
+        """伪翻译：语言名加原文，占位符原样保留"""
+        return f"[{language}] {text}"
+
+    def reply(self, kwargs):
+        system = ''.join(m['content'] for m in kwargs['messages'] if m['role'] == 'system')
+        user = [m['content'] for m in kwargs['messages'] if m['role'] == 'user']
+        # 按在提示词中出现的顺序取目标语言
+        languages = sorted((lang for lang in LANGUAGES if lang in system), key=system.index)
+        if kwargs.get('response_format', {}).get('type') != 'json_object':
+            return self.translate(user[-1], languages[0])
+        payload = json.loads(user[-1])
+        if len(languages) > 1:
+            reply = {key: {lang: self.translate(text, lang) for lang in languages} for key, text in payload.items()}
+        else:
+            reply = {key: self.translate(text, languages[0]) for key, text in payload.items()}
+        return json.dumps(reply, ensure_ascii=False)
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        time.sleep(self.delay)
+        message = SimpleNamespace(content=self.reply(kwargs))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.fixture
+def completions():
+    return FakeCompletions()
+
+
+@pytest.fixture
+def translator(tmp_path, monkeypatch, completions):
+    from modules.cm_sop_translate.translator import Translator
+
+    glossary = {'英语': 'glossary_en.json', '越南语': 'glossary_vi.json'}
+    (tmp_path / 'glossary_en.json').write_text(json.dumps({'文件编号': 'Document No.'}, ensure_ascii=False),
+                                               encoding='utf-8')
+    (tmp_path / 'glossary_vi.json').write_text(json.dumps({'文件编号': 'Số tài liệu'}, ensure_ascii=False),
+                                               encoding='utf-8')
+    monkeypatch.setattr(config, 'GLOSSARY', {'dir': str(tmp_path), 'languages': glossary})
+    monkeypatch.setattr(config, 'TRANSLATION_CACHE', {'path': str(tmp_path / 'cache.db')})
+    monkeypatch.setattr(config, 'TM_BUNDLE', {'path': str(tmp_path / 'tm_bundle.bin')})
+
+    translator = Translator()
+    # 接口客户端进程内共用，只在本次测试中替换
+    monkeypatch.setattr(translator.client, 'client', SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return translator
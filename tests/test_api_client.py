@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_api_client.py
+@Author  : Shawn
+@Date    : 2026/10/19 10:40
+@Info    : 接口客户端：熔断器的状态变化，流式请求读完或出错时才归还限流槽位、记录熔断
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from openai import APIConnectionError
+
+from modules.cm_sop_translate import api_client
+from modules.cm_sop_translate.api_client import ApiClient, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(monkeypatch, failure_threshold=3, reset_timeout=30):
+    clock = FakeClock()
+    monkeypatch.setattr(api_client.time, 'monotonic', clock)
+    return CircuitBreaker(failure_threshold, reset_timeout), clock
+
+
+def test_breaker_opens_after_threshold(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.state == 'closed'
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failures(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    # 连续失败才计数，中间成功一次重新计
+    assert breaker.state == 'closed'
+    assert breaker.failures == 1
+
+
+def test_breaker_half_open_single_probe(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    # 到时后半开，只放行一个试探请求
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+
+def test_breaker_half_open_failure_reopens(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def connection_error():
+    return APIConnectionError(request=None)
+
+
+def make_client(create):
+    """create(**kwargs)返回逐块应答的迭代器"""
+    client = ApiClient('test-key', 'http://127.0.0.1:9', max_retries=2, rate_limit={'initial_concurrency': 4})
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    client.backoff = lambda attempt: 0
+    return client
+
+
+def test_stream_holds_slot_until_exhausted():
+    client = make_client(lambda **kwargs: iter(['a', 'b']))
+    stream = client.chat(messages=[], stream=True)
+    assert next(stream) == 'a'
+    # 还在输出时占着限流槽位
+    assert client.limiter.inflight == 1
+    assert list(stream) == ['b']
+    assert client.limiter.inflight == 0
+    assert client.breaker.failures == 0
+
+
+def test_stream_retries_before_first_chunk():
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise connection_error()
+        return iter(['a'])
+
+    client = make_client(create)
+    assert list(client.chat(messages=[], stream=True)) == ['a']
+    assert len(calls) == 2
+    assert client.retries == 1
+    assert client.limiter.inflight == 0
+    assert client.breaker.state == 'closed'
+
+
+def test_stream_error_after_first_chunk_not_retried():
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+
+        def chunks():
+            yield 'a'
+            raise connection_error()
+        return chunks()
+
+    client = make_client(create)
+    received = []
+    with pytest.raises(APIConnectionError):
+        for chunk in client.chat(messages=[], stream=True):
+            received.append(chunk)
+    # 已经输出的内容无法撤回，不重试，记入熔断
+    assert received == ['a']
+    assert len(calls) == 1
+    assert client.breaker.failures == 1
+    assert client.limiter.inflight == 0
+
+
+def test_stream_closed_early_releases_slot():
+    client = make_client(lambda **kwargs: iter(['a', 'b']))
+    stream = client.chat(messages=[], stream=True)
+    next(stream)
+    stream.close()
+    assert client.limiter.inflight == 0
+    assert client.breaker.failures == 0
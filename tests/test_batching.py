@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_batching.py
+@Author  : Shawn
+@Date    : 2026/10/19 10:20
+@Info    : 批量翻译：按条数和token预算打包、解析模型返回的JSON、按并发数规划批次
+"""
+
+from modules.cm_sop_translate.batching import build_batch_payload, estimate_tokens, pack_batches, parse_batch_reply, \
+    parse_multi_batch_reply
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.engine import AsyncTranslateEngine
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('文件编号') == 4
+    assert estimate_tokens('abcd') == 1
+    assert estimate_tokens('版本V1.0') == 3
+
+
+def test_pack_batches_by_items():
+    texts = [f'第{i}条' for i in range(10)]
+    batches = pack_batches(texts, max_items=4, max_tokens=1000)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    # 保持原有顺序
+    assert [text for batch in batches for text in batch] == texts
+
+
+def test_pack_batches_by_tokens():
+    batches = pack_batches(['一二三', '四五六', '七八九'], max_items=10, max_tokens=6)
+    assert batches == [['一二三', '四五六'], ['七八九']]
+
+
+def test_pack_batches_oversized_text_alone():
+    # 单条超出预算的文本单独成批
+    long_text = '长' * 20
+    assert pack_batches(['短', long_text, '短'], max_items=10, max_tokens=5) == [['短'], [long_text], ['短']]
+    assert pack_batches([]) == []
+
+
+def test_build_batch_payload():
+    assert build_batch_payload(['甲', '乙']) == {'1': '甲', '2': '乙'}
+
+
+def test_parse_batch_reply():
+    payload = build_batch_payload(['甲', '乙', '丙'])
+    content = '{"1": " A ", "2": "", "3": 3, "4": "D"}'
+    # 空值、非字符串、payload中没有的编号都不返回
+    assert parse_batch_reply(content, payload) == {'1': 'A'}
+
+
+def test_parse_batch_reply_code_fence():
+    payload = build_batch_payload(['甲', '乙'])
+    content = '```json\n{"1": "A", "2": "B"}\n```'
+    assert parse_batch_reply(content, payload) == {'1': 'A', '2': 'B'}
+
+
+def test_parse_batch_reply_invalid():
+    payload = build_batch_payload(['甲'])
+    assert parse_batch_reply('', payload) == {}
+    assert parse_batch_reply('not json', payload) == {}
+    assert parse_batch_reply('["A"]', payload) == {}
+
+
+def test_parse_multi_batch_reply():
+    payload = build_batch_payload(['甲', '乙', '丙'])
+    content = '{"1": {"英语": "A", "越南语": "Á"}, "2": {"英语": "B"}, "3": "C"}'
+    # 缺少某种语言的只返回有的语言，值不是对象的整条不返回
+    assert parse_multi_batch_reply(content, payload, ['英语', '越南语']) == {
+        '英语': {'1': 'A', '2': 'B'},
+        '越南语': {'1': 'Á'},
+    }
+
+
+def test_parse_multi_batch_reply_invalid():
+    payload = build_batch_payload(['甲'])
+    empty = {'英语': {}, '越南语': {}}
+    assert parse_multi_batch_reply('', payload, ['英语', '越南语']) == empty
+    assert parse_multi_batch_reply('{"1": ', payload, ['英语', '越南语']) == empty
+    assert parse_multi_batch_reply('```json\n{"1": {"英语": " A "}}\n```', payload, ['英语']) == {'英语': {'1': 'A'}}
+
+
+def test_plan_batches_small_document_not_split(monkeypatch):
+    monkeypatch.setattr(config, 'TRANSLATE_BATCH', {'max_items': 40, 'max_tokens': 1500, 'min_items': 20})
+    engine = AsyncTranslateEngine(translator=None, concurrency=16)
+    texts = [f'第{i}条' for i in range(16)]
+    # 文本少时不拆成一段一个请求
+    assert engine.plan_batches(texts) == [texts]
+
+
+def test_plan_batches_spread_across_slots(monkeypatch):
+    monkeypatch.setattr(config, 'TRANSLATE_BATCH', {'max_items': 40, 'max_tokens': 100000, 'min_items': 20})
+    engine = AsyncTranslateEngine(translator=None, concurrency=4)
+    # 100段：装满40条只有3批，摊到4个并发槽位，每批25条
+    assert [len(batch) for batch in engine.plan_batches([f'第{i}条' for i in range(100)])] == [25, 25, 25, 25]
+    # 1000段：超过max_items×并发数，每批装满40条
+    assert {len(batch) for batch in engine.plan_batches([f'第{i}条' for i in range(1000)])} == {40}
+    # 两种语言时单批条数减半
+    assert {len(batch) for batch in engine.plan_batches([f'第{i}条' for i in range(1000)], 2)} == {20}
+    assert engine.plan_batches([]) == []
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_engine.py
+@Author  : Shawn
+@Date    : 2026/10/19 15:50
+@Info    : 异步翻译引擎：译文按原顺序返回、都已翻译过时不建事件循环、限时翻译到时保留原文并标注
+"""
+
+import time
+
+import pytest
+
+from modules.cm_sop_translate import engine
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.metrics import DEGRADED_PATH
+
+LANGUAGES = ['英语', '越南语']
+TEXTS = ['设备名称', '', '操作步骤', '设备名称', '文件编号', '注意事项']
+GLOSSARY = {'英语': 'Document No.', '越南语': 'Số tài liệu'}
+
+
+def expected(completions, text, language):
+    if not text:
+        return ''
+    if text == '文件编号':
+        return GLOSSARY[language]
+    return completions.translate(text, language)
+
+
+def test_results_in_original_order(translator, completions):
+    document = translator.engine.translate_document(TEXTS, LANGUAGES)
+    assert document == {lang: [expected(completions, text, lang) for text in TEXTS] for lang in LANGUAGES}
+    # 重复文本只请求一次，两种语言在一次请求中同时翻译
+    assert len(completions.requests) == 1
+
+
+def test_no_event_loop_when_nothing_to_request(translator, completions, monkeypatch):
+    first = translator.engine.translate_document(TEXTS, LANGUAGES)
+
+    def not_allowed(coroutine):
+        coroutine.close()
+        raise AssertionError('没有需要请求的文本时不应启动事件循环')
+
+    monkeypatch.setattr(engine.asyncio, 'run', not_allowed)
+    # 逐个段落写入时文本都已翻译过
+    for index, text in enumerate(TEXTS):
+        assert translator.engine.translate_document([text], LANGUAGES) == {
+            lang: [first[lang][index]] for lang in LANGUAGES}
+    assert len(completions.requests) == 1
+
+
+@pytest.fixture
+def no_reserve(monkeypatch):
+    monkeypatch.setitem(config.DEADLINE, 'reserve', 0)
+    monkeypatch.setitem(config.DEADLINE, 'request_seconds', 0.01)
+    return config.DEADLINE['marker']
+
+
+def test_deadline_passed_degrades(translator, completions, no_reserve):
+    translator.set_deadline(0)
+    translator.metrics.begin('a.docx')
+    document = translator.engine.translate_document(TEXTS, ['英语'])
+    assert document['英语'] == [
+        no_reserve + '设备名称', '', no_reserve + '操作步骤', no_reserve + '设备名称', 'Document No.',
+        no_reserve + '注意事项']
+    assert not completions.requests
+    assert sum(record['path'] == DEGRADED_PATH for record in translator.metrics.records) == 3
+    # 未翻译的不写入缓存，下次运行重新翻译
+    assert translator.lookup('设备名称', '英语') is None
+
+
+def test_deadline_during_requests(translator, completions, no_reserve):
+    completions.delay = 1
+    translator.set_deadline(0.2)
+    document = translator.engine.translate_document(TEXTS, ['英语'])
+    # 到时还在进行的请求不再等待，只查词库、缓存
+    assert len(completions.requests) == 1
+    assert document['英语'][4] == 'Document No.'
+    assert all(res.startswith(no_reserve) for res in document['英语'] if res and res != 'Document No.')
+    # 没等到的请求完成后仍写入缓存
+    deadline = time.monotonic() + 5
+    while translator.lookup('设备名称', '英语') is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_fuzzy_tm.py
+@Author  : Shawn
+@Date    : 2026/10/19 14:50
+@Info    : 模糊翻译记忆：只有数字不同的复用译文、相似的作为参考、建向量时不占着查询的锁（用字符计数代替向量模型）
+"""
+
+import threading
+import zlib
+
+import numpy as np
+import pytest
+
+from modules.cm_sop_translate.fuzzy_tm import FuzzyMemory, replace_numbers
+
+
+def char_encoder(texts):
+    """每个字符计入一维的归一化向量，数字都记为同一维：只有数字不同的文本向量相同"""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for char in text:
+            vectors[row, 0 if char.isdigit() else zlib.crc32(char.encode()) % 63 + 1] += 1
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def memory(tmp_path):
+    memory = FuzzyMemory(str(tmp_path / 'fuzzy_index'), threshold=0.8, encoder=char_encoder)
+    memory.add('扭矩设定为12牛米', '英语', 'Set the torque to 12 N·m')
+    memory.add('检查设备运行状态并记录', '英语', 'Check and record the equipment status')
+    memory.flush()
+    return memory
+
+
+def test_replace_numbers():
+    assert replace_numbers('扭矩设定为15牛米', '扭矩设定为12牛米', 'Set the torque to 12 N·m') == \
+           'Set the torque to 15 N·m'
+    assert replace_numbers('扭矩设定为15牛米', '扭矩设定为12牛', 'Set the torque to 12 N·m') is None
+
+
+def test_prepare_reuse_and_reference(memory):
+    reused, references = memory.prepare(['扭矩设定为15牛米', '检查设备运行状态并记录。'], ['英语'])
+    assert reused == {'扭矩设定为15牛米': {'英语': 'Set the torque to 15 N·m'}}
+    source, target, score = references['英语']['检查设备运行状态并记录。']
+    assert target == 'Check and record the equipment status'
+    assert score >= 0.8
+    # 完全相同的由翻译记忆缓存处理
+    assert memory.search(['扭矩设定为12牛米'], ['英语']) == {'英语': {}}
+
+
+def test_search_encodes_without_lock(memory):
+    locked = []
+
+    def try_lock():
+        if memory._lock.acquire(timeout=1):
+            memory._lock.release()
+            locked.append(True)
+        else:
+            locked.append(False)
+
+    def encoder(texts):
+        # 建向量期间其他线程能拿到锁
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return char_encoder(texts)
+
+    memory.encoder = encoder
+    memory.search(['扭矩设定为15牛米'], ['英语'])
+    assert locked == [True]
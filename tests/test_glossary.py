@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_glossary.py
+@Author  : Shawn
+@Date    : 2026/10/19 16:10
+@Info    : 词库索引：规范化的键、补回末尾标点、词库文件变化后自动重载
+"""
+
+import json
+import os
+
+from modules.cm_sop_translate.glossary import GlossaryIndex, normalize_text
+
+
+def write_glossary(path, entries, mtime):
+    path.write_text(json.dumps(entries, ensure_ascii=False), encoding='utf-8')
+    # 文件系统的时间精度可能不够，直接指定mtime
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_normalize_text():
+    assert normalize_text(' 文件　编号： ') == '文件编号'
+    assert normalize_text('ＡＢＣ。') == 'ABC'
+
+
+def test_lookup_normalized(tmp_path):
+    path = tmp_path / 'glossary_en.json'
+    write_glossary(path, {'设备名称': 'Equipment name', '版本：': 'Version:'}, 1_000_000_000)
+    index = GlossaryIndex(str(path))
+    assert index.lookup('设备名称') == 'Equipment name'
+    # 末尾标点补回译文，键本身带标点的原样返回
+    assert index.lookup('设备 名称：') == 'Equipment name:'
+    assert index.lookup('版本') == 'Version:'
+    assert index.lookup('审批') is None
+    assert (index.hits, index.misses) == (3, 1)
+
+
+def test_reload_when_file_changes(tmp_path):
+    path = tmp_path / 'glossary_en.json'
+    write_glossary(path, {'文件编号': 'Document No.'}, 1_000_000_000)
+    index = GlossaryIndex(str(path), check_interval=0)
+    assert index.lookup('审批') is None
+    assert index.version == 1
+
+    write_glossary(path, {'文件编号': 'Doc No.', '审批': 'Approval'}, 2_000_000_000)
+    assert index.lookup('审批') == 'Approval'
+    assert index.lookup('文件编号') == 'Doc No.'
+    assert index.version == 2
+
+    # 文件没有变化时不重新加载
+    index.lookup('审批')
+    assert index.version == 2
+
+
+def test_no_reload_within_check_interval(tmp_path):
+    path = tmp_path / 'glossary_en.json'
+    write_glossary(path, {'文件编号': 'Document No.'}, 1_000_000_000)
+    index = GlossaryIndex(str(path), check_interval=3600)
+    index.lookup('文件编号')
+
+    write_glossary(path, {'文件编号': 'Doc No.'}, 2_000_000_000)
+    assert index.lookup('文件编号') == 'Document No.'
+    index.refresh(force=True)
+    assert index.lookup('文件编号') == 'Doc No.'
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_glossary_mining.py
+@Author  : Shawn
+@Date    : 2026/10/19 16:50
+@Info    : 词库挖掘：从缓存和运行日志中找出候选，生成的diff能直接应用且应用后仍是合法的JSON
+"""
+
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from modules.cm_sop_translate.config.config import config
+from modules.cm_sop_translate.glossary_mining import mine_glossary, propose_glossary
+from modules.cm_sop_translate.metrics import TranslationMetrics
+from modules.cm_sop_translate.tm_cache import TranslationCache
+
+# 手工整理的词库：分组之间有空行
+GLOSSARY_EN = '{\n  "文件编号": "Document No.",\n  "版本": "Version",\n\n  "审批": "Approval"\n}\n'
+
+
+def apply_diff(folder, diff):
+    """在词库目录下用git apply应用diff（与README中的用法相同）"""
+    if shutil.which('git') is None:
+        pytest.skip('需要git')
+    (folder / 'glossary_mining.diff').write_text(diff, encoding='utf-8')
+    subprocess.run(['git', 'apply', 'glossary_mining.diff'], cwd=folder, check=True)
+
+
+@pytest.fixture
+def glossary_dir(tmp_path, monkeypatch):
+    folder = tmp_path / 'config'
+    folder.mkdir()
+    (folder / 'glossary_en.json').write_text(GLOSSARY_EN, encoding='utf-8')
+    (folder / 'glossary_vi.json').write_text('{}\n', encoding='utf-8')
+    monkeypatch.setattr(config, 'GLOSSARY', {'dir': str(folder),
+                                             'languages': {'英语': 'glossary_en.json', '越南语': 'glossary_vi.json'}})
+    return folder
+
+
+@pytest.mark.parametrize('original', [GLOSSARY_EN, '{}\n'])
+def test_propose_glossary_applies(tmp_path, original):
+    path = tmp_path / 'glossary_en.json'
+    path.write_text(original, encoding='utf-8')
+    additions = [('操作步骤', 'Operation steps', 5), ('设备名称', 'Equipment name', 3)]
+    proposed, diff = propose_glossary(str(path), additions)
+
+    apply_diff(tmp_path, diff)
+    applied = path.read_text(encoding='utf-8')
+    assert applied == proposed
+    assert json.loads(applied) == dict(json.loads(original), **{'操作步骤': 'Operation steps',
+                                                                '设备名称': 'Equipment name'})
+    # 已有内容（含分组空行）不变
+    assert applied.startswith(original.rstrip()[:-1].rstrip())
+
+
+def test_mine_glossary(tmp_path, glossary_dir):
+    cache = TranslationCache(str(tmp_path / 'cache.db'))
+    cache.put('操作步骤', '英语', 'deepseek-chat', 3, 'Operation steps')
+    cache.put('文件编号', '英语', 'deepseek-chat', 3, 'Document No.')  # 已在词库中
+    cache.put('检查设备的运行状态并记录在点检表中以备后续追溯', '英语', 'deepseek-chat', 3, 'Check ...')  # 太长
+    cache.close()
+
+    metrics_path = tmp_path / 'translate_metrics.jsonl'
+    for _ in range(3):
+        metrics = TranslationMetrics()
+        metrics.begin('a.docx')
+        metrics.record('batch', ['操作步骤'], '英语', latency=1.0)
+        metrics.record('batch', ['操作步骤', '检查设备的运行状态并记录在点检表中以备后续追溯'], '英语', latency=1.0)
+        metrics.end(str(metrics_path))
+        metrics.summary(str(metrics_path))
+
+    output = tmp_path / 'out'
+    summary = mine_glossary([str(metrics_path)], cache_path=str(tmp_path / 'cache.db'), output_folder=str(output))
+    assert summary['runs'] == 3
+    assert summary['candidates'] == {'英语': 1, '越南语': 0}
+    assert (summary['api_calls'], summary['calls_saved'], summary['segments_saved']) == (6, 3, 6)
+
+    apply_diff(glossary_dir, (output / 'glossary_mining.diff').read_text(encoding='utf-8'))
+    glossary = json.loads((glossary_dir / 'glossary_en.json').read_text(encoding='utf-8'))
+    assert glossary == {'文件编号': 'Document No.', '版本': 'Version', '审批': 'Approval', '操作步骤': 'Operation steps'}
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_hedging.py
+@Author  : Shawn
+@Date    : 2026/10/19 15:30
+@Info    : 对冲请求：对冲次数不超过比例上限、对冲请求先返回时主请求的限流槽位在主请求结束时才归还
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+from modules.cm_sop_translate.api_client import ApiClient
+from modules.cm_sop_translate.hedging import RequestHedger
+
+
+def make_hedger(**options):
+    # 取耗时的最小值作为等待时间，预先放一次耗时，第一个请求就能对冲
+    options = {'quantile': 0, 'min_samples': 1, 'min_delay': 0.01, 'max_workers': 4, **options}
+    hedger = RequestHedger(**options)
+    hedger.latencies.append(0.01)
+    return hedger
+
+
+def slow_send():
+    time.sleep(0.2)
+    return 'ok'
+
+
+def test_hedge_ratio_cap():
+    hedger = make_hedger(max_ratio=0, burst=1)
+    assert hedger.run(slow_send) == 'ok'
+    assert hedger.run(slow_send) == 'ok'
+    # 额外负载上限为0，只允许burst个对冲请求，第二次慢请求不再对冲
+    stats = hedger.stats()
+    assert stats['requests'] == 2
+    assert stats['hedged'] == 1
+    assert stats['skipped'] == 1
+
+
+def test_primary_slot_released_when_primary_finishes():
+    client = ApiClient('key', 'http://127.0.0.1:1', rate_limit={'initial_concurrency': 4},
+                       hedging={'quantile': 0, 'min_samples': 1, 'min_delay': 0.01, 'max_workers': 4})
+    client.hedger.latencies.append(0.01)
+    unblock = threading.Event()
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            # 主请求一直不返回，对冲请求先返回
+            unblock.wait(5)
+            return SimpleNamespace(content='primary')
+        return SimpleNamespace(content='hedge')
+
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    assert client.chat(messages=[]).content == 'hedge'
+    assert client.hedger.wins == 1
+    # 主请求还在进行，仍占着槽位
+    assert client.limiter.inflight == 1
+
+    unblock.set()
+    deadline = time.monotonic() + 5
+    while client.limiter.inflight:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_local_backend.py
+@Author  : Shawn
+@Date    : 2026/10/19 15:10
+@Info    : 本地离线翻译：按长度分桶、带KV缓存的贪心解码（用假的解码器会话代替onnxruntime）
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from modules.cm_sop_translate.local_backend import OnnxSeq2SeqModel, bucket_batches
+
+# 假的解码器依次输出的token，2为结束符
+TOKENS = [3, 4, 2]
+PAST_SHAPE = ['batch_size', 1, 'past_decoder_sequence_length', 1]
+
+
+class FakeDecoder:
+    """present.*为past_key_values.*后接上本步的每个token，下一个token由已解码的长度决定"""
+
+    def __init__(self, with_past=False, without_past=False):
+        self.with_past = with_past  # 有past_key_values输入
+        self.without_past = without_past  # 有不带缓存的分支（合并的解码器两者都有）
+        self.input_lengths = []
+
+    def get_inputs(self):
+        names = ['input_ids', 'encoder_attention_mask']
+        if self.without_past:
+            names.append('encoder_hidden_states')
+        if self.with_past:
+            names += ['past_key_values.0.decoder.key', 'past_key_values.0.encoder.key']
+        if self.with_past and self.without_past:
+            names.append('use_cache_branch')
+        return [SimpleNamespace(name=name, shape=PAST_SHAPE, type='tensor(float)') for name in names]
+
+    def get_outputs(self):
+        names = ['logits', 'present.0.decoder.key']
+        if self.without_past:
+            names.append('present.0.encoder.key')
+        return [SimpleNamespace(name=name) for name in names]
+
+    def run(self, output_names, feed):
+        input_ids = feed['input_ids']
+        batch_size, length = input_ids.shape
+        self.input_lengths.append(length)
+        use_cache = self.with_past and (not self.without_past or bool(feed['use_cache_branch'][0]))
+        if use_cache:
+            past = feed['past_key_values.0.decoder.key']
+            encoder = feed['past_key_values.0.encoder.key']
+            assert encoder.shape == (batch_size, 1, 7, 1)
+        else:
+            past = np.zeros((batch_size, 1, 0, 1), dtype=np.float32)
+            encoder = np.zeros((batch_size, 1, 7, 1), dtype=np.float32)
+        present = np.concatenate([past, np.ones((batch_size, 1, length, 1), dtype=np.float32)], axis=2)
+        logits = np.zeros((batch_size, length, 5), dtype=np.float32)
+        logits[:, -1, TOKENS[min(present.shape[2], len(TOKENS)) - 1]] = 1
+        outputs = [logits, present]
+        if self.without_past:
+            outputs.append(encoder)
+        return outputs
+
+
+def make_model(decoder, decoder_with_past, merged):
+    model = OnnxSeq2SeqModel.__new__(OnnxSeq2SeqModel)
+    model.decoder = decoder
+    model.decoder_with_past = decoder_with_past
+    model.merged = merged
+    model.pad_id = 0
+    model.eos_id = 2
+    model.start_id = 0
+    return model
+
+
+def test_bucket_batches():
+    assert bucket_batches([5, 1, 3, 2], max_batch_size=2) == [[1, 3], [2, 0]]
+    # 条数×最长长度不超过上限
+    assert bucket_batches([4, 4, 4], max_batch_tokens=8) == [[0, 1], [2]]
+
+
+@pytest.mark.parametrize('merged', [False, True])
+def test_greedy_decode_with_past(merged):
+    if merged:
+        decoder = FakeDecoder(with_past=True, without_past=True)
+        model = make_model(decoder, decoder, merged=True)
+        with_past = decoder
+    else:
+        decoder, with_past = FakeDecoder(without_past=True), FakeDecoder(with_past=True)
+        model = make_model(decoder, with_past, merged=False)
+
+    hidden = np.zeros((2, 7, 4), dtype=np.float32)
+    ids = model.greedy_decode(hidden, np.ones((2, 7), dtype=np.int64), max_new_tokens=10)
+    assert ids.tolist() == [[0] + TOKENS] * 2
+    # 第一步之后每步只输入新的token
+    assert decoder.input_lengths[0] == 1
+    assert with_past.input_lengths[-2:] == [1, 1]
+    assert len(decoder.input_lengths) + (0 if merged else len(with_past.input_lengths)) == len(TOKENS)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_main.py
+@Author  : Shawn
+@Date    : 2026/10/19 14:30
+@Info    : 翻译预估（dry run）：不发送请求、不生成文件、不关闭用户已打开的Excel
+"""
+
+import pytest
+
+# 读取Excel文本框需要Windows上的Excel（pywin32）
+pytest.importorskip('pythoncom')
+
+from openpyxl import Workbook
+
+from modules.cm_sop_translate import excel_process, main
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name, values in (('a.xlsx', ['操作步骤', '注意事项', 3]), ('b.xlsx', ['操作步骤', '设备名称', None])):
+        workbook = Workbook()
+        workbook.active.append(values)
+        workbook.save(tmp_path / name)
+    return tmp_path
+
+
+def test_read_excel_texts(folder):
+    assert excel_process.read_excel_texts(str(folder / 'a.xlsx')) == ['操作步骤', '注意事项', '3']
+
+
+def test_excel_dry_run_sends_no_requests(folder, translator, completions, monkeypatch):
+    def not_allowed():
+        raise AssertionError('预估时不能关闭Excel')
+
+    monkeypatch.setattr(main, 'Translator', lambda: translator)
+    monkeypatch.setattr(main, 'ensure_excel_closed', not_allowed)
+    monkeypatch.setattr(excel_process, 'ensure_excel_closed', not_allowed)
+
+    estimate = main.excel_translate(['英语'], str(folder), dry_run=True)
+    assert estimate['files'] == 2
+    assert estimate['unique'] == 4
+    assert estimate['api_calls'] >= 1
+    assert not completions.requests
+    assert not (folder / 'translate_output').exists()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_masking.py
+@Author  : Shawn
+@Date    : 2026/10/19 11:30
+@Info    : 占位符遮盖：遮盖后换回原值、中文日期不遮盖、占位符不一致时返回None、流式输出逐段换回
+"""
+
+import pytest
+
+from modules.cm_sop_translate.masking import is_masked, mask_text, unmask_stream, unmask_text
+
+
+@pytest.mark.parametrize('text, masked, values', [
+    ('按C2GM-Z13-000第3.2条执行，温度控制在25±2℃', '按{1}第{2}条执行，温度控制在{3}',
+     ['C2GM-Z13-000', '3.2', '25±2℃']),
+    ('扭矩10N·m，版本V1.2', '扭矩{1}，版本{2}', ['10N·m', 'V1.2']),
+    ('日期2024-03-05 检查', '日期{1} 检查', ['2024-03-05']),
+    ('详见https://a.b/c', '详见{1}', ['https://a.b/c']),
+])
+def test_mask_round_trip(text, masked, values):
+    assert mask_text(text) == (masked, values)
+    assert unmask_text(masked, values) == text
+
+
+def test_only_digits_differ_share_masked_text():
+    assert mask_text('第3.2条')[0] == mask_text('第4.1条')[0]
+
+
+@pytest.mark.parametrize('text', [
+    '于2024年3月5日生效',
+    '3月5日前完成',
+    '2024 年 3 月',
+])
+def test_cjk_date_not_masked(text):
+    # 中文日期整体保留，由模型按目标语言的格式翻译
+    assert mask_text(text) == (text, [])
+
+
+@pytest.mark.parametrize('text', [
+    'C2GM-Z13-000 V1.2',  # 不含汉字
+    '含{花括号}的3个',
+    '文件编号',
+])
+def test_unchanged(text):
+    assert mask_text(text) == (text, [])
+
+
+def test_unmask_reordered():
+    # 译文中占位符的顺序可以与原文不同
+    assert unmask_text('{2} of {1}', ['A', 'B']) == 'B of A'
+
+
+@pytest.mark.parametrize('translated', [
+    'Execute {1}, temperature {3}',  # 缺少占位符
+    'Execute {1} {1} {2} {3}',  # 占位符重复
+    'Execute {1} {2} {3} {4}',  # 多出的占位符
+    ['Execute {1} {2} {3}'],
+])
+def test_unmask_mismatch(translated):
+    assert unmask_text(translated, ['a', 'b', 'c']) is None
+
+
+def test_unmask_without_values():
+    assert unmask_text('No placeholder', []) == 'No placeholder'
+    assert unmask_text(None, ['a']) is None
+
+
+def test_unmask_stream_split_placeholder():
+    pieces = ['Execute {', '1', '} at {2', '}', ' and {1}.']
+    assert ''.join(unmask_stream(pieces, ['C2GM', '25℃'])) == 'Execute C2GM at 25℃ and C2GM.'
+    # 占位符没输出完之前不输出
+    assert list(unmask_stream(['A {', '1}'], ['x'])) == ['A ', 'x']
+
+
+def test_unmask_stream_passthrough():
+    assert list(unmask_stream(['a {', 'b}'], [])) == ['a {', 'b}']
+    # 编号超出范围的原样输出，末尾没输出完的也输出
+    assert ''.join(unmask_stream(['{3} {1', ''], ['x'])) == '{3} {1'
+
+
+def test_is_masked():
+    assert is_masked('按{1}第{2}条执行')
+    assert not is_masked('按规定执行')
+    assert not is_masked('{花括号}')
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_metrics.py
+@Author  : Shawn
+@Date    : 2026/10/19 16:30
+@Info    : 翻译埋点：按文档汇总路径、命中率、请求次数和token，整次运行的汇总
+"""
+
+import json
+
+from modules.cm_sop_translate.metrics import PLAN_DOCUMENT, TranslationMetrics, aggregate, percentile
+
+
+def test_percentile():
+    assert percentile([], 95) == 0.0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([0, 10], 95) == 9.5
+
+
+def test_aggregate():
+    metrics = TranslationMetrics()
+    metrics.begin('a.docx')
+    metrics.record('glossary', '文件编号', '英语')
+    metrics.record('cache', ['操作步骤', '注意事项'], '英语')
+    metrics.record('batch', ['设备名称', '检查'], '英语', latency=2.0, prompt_tokens=100, completion_tokens=40,
+                   retries=1)
+    metrics.record('model', '点检表', '英语', latency=1.0, prompt_tokens=50, completion_tokens=10)
+    report = aggregate(metrics.records)
+    assert report['segments'] == 6
+    assert report['paths'] == {'glossary': 1, 'cache': 2, 'batch': 2, 'model': 1}
+    assert report['hit_rate'] == 0.5
+    assert report['api_calls'] == 2
+    assert report['api_seconds'] == 3.0
+    assert report['retries'] == 1
+    assert (report['prompt_tokens'], report['completion_tokens']) == (150, 50)
+
+
+def test_records_outside_document_ignored():
+    metrics = TranslationMetrics()
+    metrics.record('cache', '操作步骤', '英语')
+    assert metrics.records == []
+
+
+def test_end_and_summary(tmp_path):
+    output = tmp_path / 'translate_metrics.jsonl'
+    metrics = TranslationMetrics()
+    metrics.begin(PLAN_DOCUMENT)
+    metrics.record('batch', ['操作步骤', '注意事项'], '英语', latency=1.0, prompt_tokens=300, completion_tokens=100)
+    metrics.end(str(output))
+    for document in ('a.docx', 'b.docx'):
+        metrics.begin(document)
+        metrics.record('memo', ['操作步骤', '注意事项'], '英语')
+        report = metrics.end(str(output))
+        assert report['segments'] == 2
+        assert report['hit_rate'] == 1.0
+
+    summary = metrics.summary(str(output))
+    assert summary['segments'] == 6
+    assert summary['api_calls'] == 1
+    assert summary['tokens_per_file'] == {PLAN_DOCUMENT: 400, 'a.docx': 0, 'b.docx': 0}
+    # 统一翻译阶段的token按文件平均
+    assert summary['avg_tokens_per_file'] == 200
+    lines = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert [line['type'] for line in lines] == ['document', 'call', 'document', 'call', 'document', 'call', 'summary']
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_mock_server.py
+@Author  : Shawn
+@Date    : 2026/10/19 17:10
+@Info    : 本地模拟接口：按请求的形式生成确定性的伪翻译（单条、批量JSON、多语言JSON），HTTP应答、流式输出和错误注入
+"""
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from modules.cm_sop_translate.bench.mock_server import MockSettings, build_reply, pseudo_translate, start_server
+from modules.cm_sop_translate.prompts import batch_messages, multi_messages, single_messages
+
+PAYLOAD = json.dumps({"1": "操作步骤", "2": "注意事项"}, ensure_ascii=False)
+
+
+def post(base_url, body):
+    request = urllib.request.Request(f"{base_url}/chat/completions", json.dumps(body).encode('utf-8'),
+                                     {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.read().decode('utf-8')
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(**settings):
+        server, base_url = start_server(settings=MockSettings(latency='fixed', median=0, **settings))
+        servers.append(server)
+        return base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pseudo_translate_deterministic():
+    assert pseudo_translate('操作步骤', '英语') == pseudo_translate('操作步骤', '英语')
+    assert pseudo_translate('操作步骤', '英语').startswith('[英语] ')
+    assert pseudo_translate('操作步骤', '英语') != pseudo_translate('操作步骤', '越南语')
+
+
+def test_build_reply_shapes():
+    single = build_reply({"messages": single_messages('操作步骤', '英语', {})})
+    assert single == pseudo_translate('操作步骤', '英语')
+
+    batch = build_reply({"messages": batch_messages(PAYLOAD, '英语', {}), "response_format": {"type": "json_object"}})
+    assert json.loads(batch) == {"1": pseudo_translate('操作步骤', '英语'), "2": pseudo_translate('注意事项', '英语')}
+
+    multi = build_reply({"messages": multi_messages(PAYLOAD, ['英语', '越南语'], {'英语': {}, '越南语': {}}),
+                         "response_format": {"type": "json_object"}})
+    assert json.loads(multi)["2"] == {"英语": pseudo_translate('注意事项', '英语'),
+                                      "越南语": pseudo_translate('注意事项', '越南语')}
+
+
+def test_completion_and_stats(server):
+    base_url = server()
+    reply = json.loads(post(base_url, {"model": "deepseek-chat", "messages": single_messages('操作步骤', '英语', {})}))
+    assert reply['choices'][0]['message']['content'] == pseudo_translate('操作步骤', '英语')
+    assert reply['usage']['completion_tokens'] > 0
+
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+        stats = json.loads(response.read())
+    assert stats['requests'] == 1
+    assert stats['errors'] == {}
+
+
+def test_stream(server):
+    base_url = server()
+    body = post(base_url, {"model": "deepseek-chat", "stream": True,
+                           "messages": single_messages('操作步骤', '英语', {})})
+    events = [line[len('data: '):] for line in body.splitlines() if line.startswith('data: ')]
+    assert events[-1] == '[DONE]'
+    chunks = [json.loads(event) for event in events[:-1]]
+    content = ''.join(choice['delta']['content'] for chunk in chunks for choice in chunk['choices'])
+    assert content == pseudo_translate('操作步骤', '英语')
+    # 最后一块只有usage
+    assert chunks[-1]['choices'] == [] and chunks[-1]['usage']['prompt_tokens'] > 0
+
+
+@pytest.mark.parametrize('settings, status', [({'error_rate': 1}, 500), ({'rate_limit_rate': 1, 'retry_after': 3}, 429)])
+def test_error_injection(server, settings, status):
+    base_url = server(**settings)
+    with pytest.raises(urllib.error.HTTPError) as error:
+        post(base_url, {"messages": single_messages('操作步骤', '英语', {})})
+    assert error.value.code == status
+    if status == 429:
+        assert error.value.headers['Retry-After'] == '3'
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_plan.py
+@Author  : Shawn
+@Date    : 2026/10/19 14:10
+@Info    : 文件夹级翻译计划：去重统计、预计请求次数与实际发送的一致、生成计划时不计入命中率
+"""
+
+from modules.cm_sop_translate.plan import TranslationPlan
+from modules.cm_sop_translate.translator import PROMPT_VERSION
+
+LANGUAGES = ['英语', '越南语']
+LONG_TEXT = ''.join(f'第{i}步：检查设备的运行状态，确认各项参数正常后记录在点检表中。' for i in range(12))
+
+
+def test_report_dedupe_counts(translator):
+    plan = TranslationPlan(translator, LANGUAGES)
+    plan.add('a.docx', ['操作步骤', '注意事项', ' 操作步骤 ', '文件编号', ''])
+    plan.add('b.xlsx', ['操作步骤', '设备名称', '注意事项'])
+
+    report = plan.report()
+    assert report['files'] == 2
+    # 空文本不计，只有空白不同的算同一段
+    assert report['total'] == 7
+    assert report['unique'] == 4
+    assert report['unique_ratio'] == 4 / 7
+    # 文件编号在词库中，不需要请求
+    assert report['pending'] == {'英语': 3, '越南语': 3}
+
+
+def test_report_matches_requests_sent(translator, completions):
+    plan = TranslationPlan(translator, LANGUAGES)
+    plan.add('a.docx', ['操作步骤', LONG_TEXT, '注意事项'])
+
+    report = plan.report()
+    assert report['long_texts'] == 1
+    assert not completions.requests
+
+    results = plan.execute()
+    assert len(completions.requests) == report['api_calls']
+    assert all(results[lang][1] for lang in LANGUAGES)
+
+
+def test_report_does_not_count_hits(translator):
+    translator.cache.put('操作步骤', '英语', translator.model, PROMPT_VERSION, 'Operation steps')
+    translator.cache.put('操作步骤', '越南语', translator.model, PROMPT_VERSION, 'Các bước thao tác')
+    plan = TranslationPlan(translator, LANGUAGES)
+    plan.add('a.docx', ['操作步骤', '文件编号', '注意事项'])
+
+    plan.report()
+    assert translator.cache.stats()['hits'] == 0
+    assert translator.glossary_index('英语').hits == 0
+    assert not translator.memo
+
+    # 翻译时缓存命中的仍按缓存记，而不是本次运行已翻译的内容
+    translator.metrics.begin('a.docx')
+    plan.execute()
+    paths = [record['path'] for record in translator.metrics.records]
+    assert paths.count('cache') == 2
+    assert paths.count('glossary') == 2
+    assert 'memo' not in paths
+    assert translator.cache.stats()['hits'] == 2
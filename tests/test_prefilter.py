@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_prefilter.py
+@Author  : Shawn
+@Date    : 2026/10/19 11:50
+@Info    : 翻译前的规则过滤：编号、版本号、日期、数字原样返回，缩写、英文只在目标语言为英语时原样返回
+"""
+
+import pytest
+
+from modules.cm_sop_translate.prefilter import classify
+
+
+@pytest.mark.parametrize('text, reason', [
+    ('  ', 'symbol'),
+    ('——', 'symbol'),
+    ('2025-10-18', 'date'),
+    ('V1.0', 'version'),
+    ('25±2℃', 'number'),
+    ('1,000 pcs', 'number'),
+    ('C2GM-Z13-000', 'code'),
+])
+def test_rules_for_all_languages(text, reason):
+    assert classify(text, '英语') == reason
+    assert classify(text, '越南语') == reason
+
+
+@pytest.mark.parametrize('text', ['文件编号', 'C2GM-Z13-000文件', '版本V1.0'])
+def test_han_text_translated(text):
+    assert classify(text, '英语') is None
+
+
+def test_acronym_only_for_english():
+    assert classify('PASS', '英语') == 'acronym'
+    assert classify('ISO 9001', '英语') == 'acronym'
+    # 译成越南语时PASS、OK仍需翻译
+    assert classify('PASS', '越南语') is None
+    assert classify('OK', '越南语') is None
+
+
+def test_target_language():
+    assert classify('Check the torque.', '英语') == 'target_language'
+    assert classify('Check the torque.', '越南语') is None
+    assert classify('Kiểm tra mô-men xoắn', '越南语') == 'target_language'
+    assert classify('Kiểm tra mô-men xoắn', '英语') is None
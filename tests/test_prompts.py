@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_prompts.py
+@Author  : Shawn
+@Date    : 2026/10/19 16:40
+@Info    : 提示词：同一语言、同样的术语在不同批次中得到逐字节相同的system前缀，待翻译的内容只在user消息中
+"""
+
+import json
+
+from modules.cm_sop_translate.prompts import batch_messages, multi_messages, single_messages, terms_prompt
+
+
+def payload(texts):
+    return json.dumps({str(i + 1): text for i, text in enumerate(texts)}, ensure_ascii=False)
+
+
+def test_terms_sorted():
+    assert terms_prompt({}) == ''
+    assert terms_prompt({'版本': 'Version', '文件编号': 'Document No.'}) == \
+           terms_prompt({'文件编号': 'Document No.', '版本': 'Version'})
+
+
+def test_batch_system_prefix_identical():
+    first = batch_messages(payload(['操作步骤', '注意事项']), '英语', {'版本': 'Version', '文件编号': 'Document No.'})
+    second = batch_messages(payload(['设备名称']), '英语', {'文件编号': 'Document No.', '版本': 'Version'})
+    assert first[0]['content'].encode('utf-8') == second[0]['content'].encode('utf-8')
+    assert '操作步骤' not in first[0]['content']
+    assert first[1]['content'] != second[1]['content']
+
+
+def test_single_system_prefix_identical():
+    first = single_messages('操作步骤', '英语', {})
+    second = single_messages('注意事项', '英语', {})
+    assert first[0] == second[0]
+    assert first[1] == {"role": "user", "content": "操作步骤"}
+
+
+def test_multi_system_prefix_identical():
+    terms = {'英语': {'文件编号': 'Document No.'}, '越南语': {'文件编号': 'Số tài liệu'}}
+    first = multi_messages(payload(['操作步骤']), ['英语', '越南语'], terms)
+    second = multi_messages(payload(['设备名称', '注意事项']), ['英语', '越南语'], dict(reversed(terms.items())))
+    assert first[0]['content'].encode('utf-8') == second[0]['content'].encode('utf-8')
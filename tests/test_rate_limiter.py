@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_rate_limiter.py
+@Author  : Shawn
+@Date    : 2026/10/19 11:10
+@Info    : 自适应限流：AIMD调整并发数、Retry-After暂停、对冲请求的try_acquire
+"""
+
+import pytest
+
+from modules.cm_sop_translate import rate_limiter
+from modules.cm_sop_translate.rate_limiter import AdaptiveRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(monkeypatch, **options):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', clock)
+    options = {'rpm': 6000, 'tpm': 10000000, 'initial_concurrency': 8, 'max_concurrency': 16, **options}
+    return AdaptiveRateLimiter(**options), clock
+
+
+def test_additive_increase(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch)
+    started = limiter.acquire()
+    assert limiter.inflight == 1
+    limiter.release(started, latency=1.0)
+    # 每个正常请求增加increase/limit，约一轮（limit个请求）加1
+    assert limiter.limit == pytest.approx(8 + 1 / 8)
+    assert limiter.inflight == 0
+    for _ in range(200):
+        limiter.release(limiter.acquire(), latency=1.0)
+    assert limiter.limit == 16
+    assert limiter.peak == 16
+
+
+def test_slow_latency_decrease(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch, target_latency=30, slow_decrease=0.9)
+    limiter.release(limiter.acquire(), latency=31)
+    assert limiter.limit == pytest.approx(8 * 0.9)
+    assert limiter.slowdowns == 1
+    # 其他错误（latency为None）不调整
+    limiter.release(limiter.acquire())
+    assert limiter.limit == pytest.approx(8 * 0.9)
+
+
+def test_throttle_decreases_once_per_wave(monkeypatch):
+    limiter, clock = make_limiter(monkeypatch, decrease=0.5)
+    first = limiter.acquire()
+    second = limiter.acquire()
+    clock.now += 1
+    limiter.release(first, throttled=True)
+    assert limiter.limit == 4
+    # 同一批放行的请求再遇到429不重复减小
+    limiter.release(second, throttled=True)
+    assert limiter.limit == 4
+    assert limiter.throttles == 2
+    clock.now += 1
+    limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 2
+    assert limiter.low == 2
+
+
+def test_min_concurrency(monkeypatch):
+    limiter, clock = make_limiter(monkeypatch, initial_concurrency=2, min_concurrency=1, decrease=0.5)
+    for _ in range(5):
+        clock.now += 1
+        limiter.release(limiter.acquire(), throttled=True)
+    assert limiter.limit == 1
+    assert limiter.concurrency == 1
+
+
+def test_retry_after_blocks_try_acquire(monkeypatch):
+    limiter, clock = make_limiter(monkeypatch)
+    limiter.release(limiter.acquire(), throttled=True, retry_after=5)
+    assert limiter.try_acquire() is None
+    clock.now += 5
+    assert limiter.try_acquire() == clock.now
+    assert limiter.inflight == 1
+
+
+def test_try_acquire_ignores_concurrency(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch, initial_concurrency=1)
+    limiter.acquire()
+    # 对冲请求不受并发数限制，但计入进行中的请求
+    assert limiter.try_acquire() is not None
+    assert limiter.inflight == 2
+
+
+def test_try_acquire_respects_token_budget(monkeypatch):
+    limiter, _ = make_limiter(monkeypatch, tpm=600, burst_seconds=10)
+    # 每秒10个token，最多攒100个
+    assert limiter.try_acquire(100) is not None
+    assert limiter.try_acquire(10) is None
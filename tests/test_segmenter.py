@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_segmenter.py
+@Author  : Shawn
+@Date    : 2026/10/19 16:20
+@Info    : 长段落分句：分块拼接后与原文一致、每块不超过预算、译文按顺序拼回
+"""
+
+import pytest
+
+from modules.cm_sop_translate.batching import estimate_tokens
+from modules.cm_sop_translate.segmenter import join_chunks, split_text
+
+LONG_TEXT = ''.join(f'第{i}步：检查设备的运行状态，确认各项参数正常后记录在点检表中。' for i in range(12))
+
+
+def test_short_text_unchanged():
+    assert split_text('检查设备的运行状态。', 150) == ['检查设备的运行状态。']
+
+
+@pytest.mark.parametrize('max_tokens', [20, 50, 150])
+def test_split_round_trip(max_tokens):
+    chunks = split_text(LONG_TEXT, max_tokens)
+    assert len(chunks) > 1
+    assert ''.join(chunks) == LONG_TEXT
+    assert all(estimate_tokens(chunk) <= max_tokens for chunk in chunks)
+
+
+def test_split_long_sentence_by_comma():
+    text = '，'.join(['检查设备的运行状态并确认各项参数正常'] * 10) + '。'
+    chunks = split_text(text, 40)
+    assert len(chunks) > 1
+    assert ''.join(chunks) == text
+
+
+def test_split_without_punctuation():
+    # 没有可切分的标点时保持原样，不强行截断
+    text = '检查设备的运行状态' * 40
+    assert split_text(text, 20) == [text]
+
+
+def test_join_chunks():
+    assert join_chunks([' Step 1. ', '', 'Step 2.\n']) == 'Step 1. Step 2.'
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_shared_flight.py
+@Author  : Shawn
+@Date    : 2026/10/19 17:00
+@Info    : 跨进程的请求合并：两个缓存实例（代表两个进程）打开同一个数据库，登记、释放、过期接手，等待对方写入后直接取用
+"""
+
+import threading
+
+import pytest
+
+from modules.cm_sop_translate import tm_cache
+from modules.cm_sop_translate.shared_flight import SharedFlight
+from modules.cm_sop_translate.tm_cache import TranslationCache, cache_key
+
+
+@pytest.fixture
+def handles(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first, second = TranslationCache(path, flush_size=100), TranslationCache(path, flush_size=100)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_claim_and_release(handles):
+    first, second = handles
+    keys = [cache_key('操作步骤', '英语', 'm', 1), cache_key('注意事项', '英语', 'm', 1)]
+    assert first.claim(keys, lease=60) == set(keys)
+    # 对方已登记的键登记不到，本方已登记的续期后仍返回
+    assert second.claim(keys[1:] + [cache_key('设备名称', '英语', 'm', 1)], lease=60) == {
+        cache_key('设备名称', '英语', 'm', 1)}
+    assert first.claim(keys, lease=60) == set(keys)
+    assert second.claimed(keys) == set(keys)
+
+    first.release(keys[:1])
+    assert second.claimed(keys) == set(keys[1:])
+    assert second.claim(keys[:1], lease=60) == set(keys[:1])
+
+
+def test_expired_claim_taken_over(handles, monkeypatch):
+    first, second = handles
+    now = [1000.0]
+    monkeypatch.setattr(tm_cache.time, 'time', lambda: now[0])
+    key = cache_key('操作步骤', '英语', 'm', 1)
+    assert first.claim([key], lease=60) == {key}
+    now[0] += 59
+    assert second.claim([key], lease=60) == set()
+    # 请求方异常退出、登记过期后由其他进程接手
+    now[0] += 2
+    assert second.claimed([key]) == set()
+    assert second.claim([key], lease=60) == {key}
+    assert first.claimed([key]) == {key}
+
+
+def test_release_flushes_pending(handles):
+    first, second = handles
+    key = cache_key('操作步骤', '英语', 'm', 1)
+    first.claim([key], lease=60)
+    first.put('操作步骤', '英语', 'm', 1, 'Operation steps')
+    assert second.get('操作步骤', '英语', 'm', 1) is None
+    # 释放登记前先写入译文，对方看到登记删除时一定能取到
+    first.release([key])
+    assert second.get('操作步骤', '英语', 'm', 1) == 'Operation steps'
+
+
+def test_shared_flight_waits_for_other_process(handles):
+    first, second = handles
+    started = threading.Event()
+    finish = threading.Event()
+    requested = {}
+
+    def request(cache, name):
+        def send(texts):
+            requested[name] = list(texts)
+            started.set()
+            finish.wait(5)
+            for text in texts:
+                cache.put(text, '英语', 'm', 1, f'{name}:{text}')
+            return {'英语': {text: f'{name}:{text}' for text in texts}}
+        return send
+
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(
+        first=SharedFlight(first, poll_interval=0.01).run(['操作步骤', '注意事项'], ['英语'], 'm', 1,
+                                                          request(first, 'first'))))
+    thread.start()
+    assert started.wait(5)
+    started.clear()
+    flight = SharedFlight(second, poll_interval=0.01, max_poll_interval=0.05)
+    threading.Timer(0.1, finish.set).start()
+    reply, shared = flight.run(['注意事项', '设备名称'], ['英语'], 'm', 1, request(second, 'second'))
+    thread.join(5)
+
+    # 对方正在请求的文本等它写入缓存后直接取用，只请求对方没有登记的
+    assert requested == {'first': ['操作步骤', '注意事项'], 'second': ['设备名称']}
+    assert reply == {'英语': {'注意事项': 'first:注意事项', '设备名称': 'second:设备名称'}}
+    assert shared == ['注意事项']
+    assert flight.collapsed == 1
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_singleflight.py
+@Author  : Shawn
+@Date    : 2026/10/19 12:00
+@Info    : 请求合并：同一个键同时只请求一次，其他线程等待共用结果，失败时收到同样的异常
+"""
+
+import threading
+import time
+
+from modules.cm_sop_translate.singleflight import SingleFlight
+
+
+def wait_collapsed(flight, count, timeout=5):
+    deadline = time.monotonic() + timeout
+    while flight.collapsed < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def run_concurrently(flight, request, texts_a, texts_b):
+    """线程A请求中时线程B登记同样的键，返回两个线程的结果"""
+    outcome = {}
+    started = threading.Event()
+
+    def slow_request(texts):
+        started.set()
+        wait_collapsed(flight, 1)
+        return request(texts)
+
+    def run(name, texts, func):
+        try:
+            outcome[name] = flight.run({text: text for text in texts}, texts, func)
+        except Exception as e:
+            outcome[name] = e
+
+    thread_a = threading.Thread(target=run, args=('a', texts_a, slow_request))
+    thread_a.start()
+    started.wait(5)
+    thread_b = threading.Thread(target=run, args=('b', texts_b, request))
+    thread_b.start()
+    thread_a.join(5)
+    thread_b.join(5)
+    return outcome
+
+
+def test_duplicate_keys_requested_once():
+    flight = SingleFlight()
+    requested = []
+
+    def request(texts):
+        requested.append(list(texts))
+        return {text: text.upper() for text in texts}
+
+    outcome = run_concurrently(flight, request, ['a', 'b'], ['b', 'c'])
+    # "b"只由线程A请求，线程B等待共用结果
+    assert sorted(requested) == [['a', 'b'], ['c']]
+    assert outcome['a'] == ({'a': 'A', 'b': 'B'}, [])
+    assert outcome['b'] == ({'c': 'C', 'b': 'B'}, ['b'])
+    assert flight.collapsed == 1
+    assert flight._calls == {}
+
+
+def test_failure_shared_with_waiters():
+    flight = SingleFlight()
+
+    def request(texts):
+        raise RuntimeError('接口异常')
+
+    outcome = run_concurrently(flight, request, ['a'], ['a'])
+    assert isinstance(outcome['a'], RuntimeError)
+    assert outcome['b'] is outcome['a']
+    assert flight._calls == {}
+
+
+def test_same_thread_not_waiting_itself():
+    flight = SingleFlight()
+    owned, waiting = flight.claim(['a', 'a', 'b'])
+    assert (owned, waiting) == (['a', 'b'], {})
+    # 本线程已登记的键再次登记时不等待自己
+    assert flight.claim(['a']) == ([], {})
+    flight.resolve({'a': 'A', 'b': 'B'})
+    assert flight.claim(['a'])[0] == ['a']
+    flight.fail(['a'], RuntimeError())
+    assert flight._calls == {}
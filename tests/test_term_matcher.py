@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_term_matcher.py
+@Author  : Shawn
+@Date    : 2026/10/19 11:00
+@Info    : 术语匹配：最长匹配、重叠术语、最短长度、空白规范化
+"""
+
+from modules.cm_sop_translate.term_matcher import TermMatcher, match_text
+
+
+def test_match_text():
+    assert match_text('文件 编号　Ａ１') == '文件编号A1'
+
+
+def test_longest_match_covers_shorter():
+    matcher = TermMatcher({'编号': 'No.', '文件编号': 'Document No.', '版本': 'Version'})
+    # "编号"被"文件编号"完全覆盖，不返回
+    assert matcher.match('文件编号和版本') == {'文件编号': 'Document No.', '版本': 'Version'}
+    assert matcher.match('物料编号') == {'编号': 'No.'}
+
+
+def test_overlapping_terms_kept_in_order():
+    matcher = TermMatcher({'质量控制': 'quality control', '控制计划': 'control plan'})
+    # 部分重叠（不完全覆盖）的术语都返回，按出现顺序
+    assert list(matcher.match('质量控制计划')) == ['质量控制', '控制计划']
+
+
+def test_find_positions():
+    matcher = TermMatcher({'编号': 'No.', '文件编号': 'Document No.'})
+    assert sorted(matcher.find('文件编号')) == [(0, 4, 1), (2, 4, 0)]
+
+
+def test_min_length_and_empty_translation():
+    matcher = TermMatcher({'料': 'material', '备注': '', '检验': 'inspection'})
+    # 单字术语、没有译文的术语不收录
+    assert matcher.terms == [('检验', 'inspection')]
+    assert matcher.match('来料检验备注') == {'检验': 'inspection'}
+
+
+def test_whitespace_normalized():
+    matcher = TermMatcher({'文件编号': 'Document No.'})
+    assert matcher.match('文件 编号：C2GM') == {'文件编号': 'Document No.'}
+    assert matcher.match('没有术语') == {}
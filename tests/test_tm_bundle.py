@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_tm_bundle.py
+@Author  : Shawn
+@Date    : 2026/10/19 11:20
+@Info    : 翻译记忆导入导出：TMX写出再读回、打包后按原文查询译文、遮盖后翻译的句段也能导出
+"""
+
+import pytest
+
+from modules.cm_sop_translate.masking import is_masked
+from modules.cm_sop_translate.tm_bundle import TranslationBundle, get_translation_bundle, language_name, read_tmx, \
+    unmasked_entries, write_bundle, write_tmx
+
+
+def test_tmx_round_trip(tmp_path):
+    path = str(tmp_path / 'tm.tmx')
+    entries = [
+        ('文件编号', '英语', 'deepseek-chat', 'v3', 'Document No.'),
+        ('温度<25℃ & 湿度"60%"', '越南语', 'deepseek-chat', 'v3', "Nhiệt độ <25℃ & độ ẩm '60%'"),
+        ('首件检验', '英语', 'other-model', 2, 'First article inspection'),
+    ]
+    assert write_tmx(path, entries) == 3
+    # 模型和提示词版本从prop读回，特殊字符转义后原样还原
+    assert list(read_tmx(path, 'default-model', 'v0')) == [
+        (source, language, model, str(prompt_version), target)
+        for source, language, model, prompt_version, target in entries
+    ]
+
+
+def test_read_tmx_defaults_and_languages(tmp_path):
+    path = tmp_path / 'other.tmx'
+    path.write_text('<?xml version="1.0" encoding="UTF-8"?>\n<tmx version="1.4"><header srclang="zh"/><body>'
+                    '<tu><tuv xml:lang="zh-CN"><seg>版本</seg></tuv>'
+                    '<tuv xml:lang="en-US"><seg>Version</seg></tuv>'
+                    '<tuv xml:lang="vi-VN"><seg>Phiên bản</seg></tuv>'
+                    '<tuv xml:lang="ja"><seg>版</seg></tuv></tu>'
+                    '<tu><tuv xml:lang="zh"><seg></seg></tuv><tuv xml:lang="en"><seg>Empty</seg></tuv></tu>'
+                    '</body></tmx>', encoding='utf-8')
+    # 没有prop的用默认值，带地区的代码按主语言匹配，不认识的语言、空原文跳过
+    assert list(read_tmx(str(path), 'default-model', 'v0', chunk_size=16)) == [
+        ('版本', '英语', 'default-model', 'v0', 'Version'),
+        ('版本', '越南语', 'default-model', 'v0', 'Phiên bản'),
+    ]
+    assert language_name('EN-gb') == '英语'
+    assert language_name('ja') is None
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    path = str(tmp_path / 'tm_bundle.bin')
+    count = write_bundle(path, [
+        ('文件编号', '英语', 'File No.'),
+        ('文件编号', '越南语', 'Số tài liệu'),
+        (' 文件编号\n', '英语', 'Document No.'),
+        ('文件  编号', '英语', 'Document number'),
+        ('版本', '英语', ''),
+    ])
+    # 规范化后相同的原文后出现的覆盖先出现的，空译文不打包
+    assert count == 3
+    bundle = TranslationBundle(path)
+    yield bundle
+    bundle.close()
+
+
+def test_bundle_get(bundle):
+    assert bundle.get('文件编号', '英语') == 'Document No.'
+    assert bundle.get('文件 编号', '英语') == 'Document number'
+    assert bundle.get('文件编号 ', '越南语') == 'Số tài liệu'
+    assert bundle.get('文件编号：', '英语') is None
+    assert bundle.get('版本', '英语') is None
+    assert bundle.stats()['hits'] == 3
+    assert bundle.stats()['misses'] == 2
+    assert bundle.stats()['hit_rate'] == 0.6
+
+
+def test_bundle_get_without_count(bundle):
+    assert bundle.get('文件编号', '英语', count=False) == 'Document No.'
+    assert bundle.get('版本', '英语', count=False) is None
+    assert (bundle.hits, bundle.misses) == (0, 0)
+    bundle.record(True)
+    bundle.record(False)
+    assert (bundle.hits, bundle.misses) == (1, 1)
+
+
+def test_empty_bundle(tmp_path):
+    path = str(tmp_path / 'empty.bin')
+    assert write_bundle(path, []) == 0
+    bundle = TranslationBundle(path)
+    assert bundle.get('文件编号', '英语') is None
+    bundle.close()
+
+
+def test_invalid_bundle(tmp_path):
+    path = tmp_path / 'invalid.bin'
+    path.write_bytes(b'not a bundle file')
+    with pytest.raises(ValueError):
+        TranslationBundle(str(path))
+    # 文件不存在或格式不对时不使用
+    assert get_translation_bundle(str(path)) is None
+    assert get_translation_bundle(str(tmp_path / 'missing.bin')) is None
+
+
+def test_export_masked_translation(translator):
+    text = '扭矩设定为12牛米并保持30秒'
+    translated = translator.translate(text, '英语')
+    translator.flush()
+
+    entries = list(translator.cache.entries())
+    assert any(is_masked(entry[0]) for entry in entries)
+    # 带占位符的记录不导出，换回原值的完整句段导出
+    assert [(source, target) for source, _, _, _, target in unmasked_entries(entries)] == [(text, translated)]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@Project : tools
+@File    : test_tm_cache.py
+@Author  : Shawn
+@Date    : 2026/10/19 11:40
+@Info    : 翻译记忆缓存：规范化后的键、批量写入、记录条数与LRU淘汰、导入合并、命中率统计
+"""
+
+import itertools
+
+import pytest
+
+from modules.cm_sop_translate import tm_cache
+from modules.cm_sop_translate.tm_cache import TranslationCache, cache_key, cache_text
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # 每次取时间递增1秒，最近使用时间的先后确定
+    clock = itertools.count(1000)
+    monkeypatch.setattr(tm_cache.time, 'time', lambda: next(clock))
+    cache = TranslationCache(str(tmp_path / 'cache.db'), max_entries=3, flush_size=2)
+    yield cache
+    cache.close()
+
+
+def test_cache_text():
+    assert cache_text(' 文件  编号\n') == '文件 编号'
+    assert cache_text('ＡＢＣ１') == 'ABC1'
+    assert cache_key('文件编号 ', '英语', 'm', 1) == cache_key('文件编号', '英语', 'm', '1')
+    assert cache_key('文件编号：', '英语', 'm', 1) != cache_key('文件编号', '英语', 'm', 1)
+
+
+def test_put_get_pending(cache):
+    cache.put('文件编号', '英语', 'm', 1, 'Document No.')
+    cache.put('版本', '英语', 'm', 1, '')
+    # 未写入数据库前也能命中，空译文不写入
+    assert cache.stats()['pending'] == 1
+    assert cache.get(' 文件编号', '英语', 'm', 1) == 'Document No.'
+    assert cache.get('文件编号', '越南语', 'm', 1) is None
+    assert cache.get('文件编号', '英语', 'm', 2) is None
+    cache.flush()
+    assert cache.get('文件编号', '英语', 'm', 1) == 'Document No.'
+    stats = cache.stats()
+    assert (stats['entries'], stats['pending'], stats['hits'], stats['misses']) == (1, 0, 2, 2)
+
+
+def test_put_updates_existing(cache):
+    cache.put('文件编号', '英语', 'm', 1, 'File No.')
+    cache.flush()
+    cache.put('文件编号', '英语', 'm', 1, 'Document No.')
+    cache.flush()
+    assert cache.get('文件编号', '英语', 'm', 1) == 'Document No.'
+    assert cache.stats()['entries'] == 1
+
+
+def test_evict_least_recently_used(cache):
+    for text in ['甲', '乙', '丙']:
+        cache.put(text, '英语', 'm', 1, text)
+    cache.flush()
+    # 查询过的"甲"最近使用时间更新
+    assert cache.get('甲', '英语', 'm', 1) == '甲'
+    cache.flush()
+    cache.put('丁', '英语', 'm', 1, '丁')
+    cache.flush()
+    assert cache.stats()['entries'] == 3
+    assert cache.get('乙', '英语', 'm', 1) is None
+    assert [entry[0] for entry in cache.entries()] == ['丁', '丙', '甲']
+
+
+def test_merge(cache):
+    cache.put('文件编号', '英语', 'm', 1, 'File No.')
+    entries = [('文件编号', '英语', 'm', 1, 'Document No.'), ('版本', '英语', 'm', 1, 'Version'),
+               ('空', '英语', 'm', 1, '')]
+    # 默认保留本地译文，只新增
+    assert cache.merge(entries) == 1
+    assert cache.get('文件编号', '英语', 'm', 1) == 'File No.'
+    # overwrite时更新译文不同的，相同的不计
+    assert cache.merge(entries, overwrite=True) == 1
+    assert cache.get('文件编号', '英语', 'm', 1) == 'Document No.'
+    assert cache.merge(entries, overwrite=True) == 0
+    assert cache.stats()['entries'] == 2
+
+
+def test_count_false_and_record(cache):
+    cache.put('文件编号', '英语', 'm', 1, 'Document No.')
+    # 一次查找查多个键时只计一次
+    assert cache.get('{1}', '英语', 'm', 1, count=False) is None
+    assert cache.get('文件编号', '英语', 'm', 1, count=False) == 'Document No.'
+    assert (cache.hits, cache.misses) == (0, 0)
+    cache.record(True)
+    assert cache.stats()['hit_rate'] == 1.0
+
+
+def test_count_loaded_on_open(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = TranslationCache(path)
+    cache.merge([('甲', '英语', 'm', 1, 'A'), ('乙', '英语', 'm', 1, 'B')])
+    cache.close()
+    cache = TranslationCache(path)
+    assert cache.stats()['entries'] == 2
+    cache.close()